@@ -0,0 +1,257 @@
+"""
+Read-through cache for Astitva API responses
+
+GET endpoints wrapped with ApiCache.cached() keep their JSON body in a
+TieredCache (an in-process LRU, plus Redis when CACHE_BACKEND is 'redis'),
+keyed by endpoint, path arguments and the normalized query string.
+
+Each endpoint names the tags its response depends on: 'posts' for the post
+listings, 'user:<id>' for a profile, 'user:<id>:posts' for a user's posts and
+'comments:<post_id>' for a thread. Every tag has a version number and an entry
+remembers the versions it was built from. Write endpoints call invalidate() to
+bump the tags they touched, so the next read of every dependent entry misses,
+in all workers when the versions live in the shared tier. Entries also expire
+after their endpoint's TTL (API_CACHE_TTLS), which bounds staleness for changes
+no write endpoint announces, such as view counts and ranking refreshes.
+
+Cached bodies carry a weak ETag (a hash of the body, computed once when the
+entry is built) and a Last-Modified time, and are sent with no-cache so clients
+revalidate. A matching If-None-Match or If-Modified-Since is answered with 304
+from the tag versions and the entry alone, without touching the database or
+serializing anything.
+
+Responses the cache cannot serve (cache disabled, or the shared tier
+unreachable) are validated against the tag versions in the cache_tags table,
+which invalidate() also bumps and every worker reads alike. Their ETag is
+derived from the URL, those versions and the current TTL window, and their
+Last-Modified from the latest bump, so a matching If-None-Match or
+If-Modified-Since gets a 304 after one primary-key lookup, before the view
+runs. Only if that table cannot be read does the ETag fall back to a hash of
+the body built by the view.
+
+With a read replica, an entry is only as fresh as the replica was when it was
+built, so replica lag can keep a write out of an entry until its TTL. Clients
+that wrote recently skip the lookup and rebuild the entry from the primary.
+"""
+
+import functools
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from flask import Response, g, make_response, request
+
+from cache import MISSING, CacheStats
+from models import db, CacheTag
+
+def api_cache_enabled(config):
+    """Whether API_CACHE_ENABLED ('auto', true or false) turns the cache on for this deployment.
+
+    Without a shared tier the tag versions live in each process, so a write would
+    leave every other worker serving stale pages until the TTL. 'auto' then caches
+    only under the single-process development server and tests, and an explicit
+    true is refused when WEB_CONCURRENCY says several workers run.
+    """
+    setting = str(config.get('API_CACHE_ENABLED', 'auto')).lower()
+    if setting in ('false', 'off', '0'):
+        return False
+    if config.get('CACHE_BACKEND') in ('redis', 'fake'):
+        return True
+    if config.get('WEB_CONCURRENCY', 1) > 1:
+        return False
+    return setting in ('true', 'on', '1') or bool(config.get('DEBUG') or config.get('TESTING'))
+
+def body_etag(body):
+    return hashlib.sha1(body.encode()).hexdigest()[:20]
+
+def set_validators(response, etag, modified=None):
+    response.set_etag(etag, weak=True)
+    if modified is not None:
+        response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+    response.cache_control.no_cache = True
+    return response
+
+def conditional_json(body, etag, modified=None):
+    """Response for a prebuilt JSON body, or an empty 304 when the request's validators match it"""
+    response = set_validators(Response(body, mimetype='application/json'), etag, modified)
+    return response.make_conditional(request)
+
+class TagVersions:
+    """A version number per tag, kept in the shared tier when there is one"""
+
+    def __init__(self, shared=None):
+        self.shared = shared
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def get(self, tags):
+        """Current versions of tags, or None if the shared tier cannot be reached"""
+        if self.shared is None:
+            with self._lock:
+                return [self._local.get(tag, 0) for tag in tags]
+        try:
+            keys = [f'tag:{tag}' for tag in tags]
+            versions = self.shared.get_many(keys)
+            if MISSING in versions:
+                # Start unknown tags at the clock, so a tag lost from Redis never
+                # returns to a version an old entry was built from
+                for key, version in zip(keys, versions):
+                    if version is MISSING:
+                        self.shared.add(key, time.time_ns(), ttl=0)
+                versions = self.shared.get_many(keys)
+            return None if MISSING in versions else versions
+        except Exception:
+            return None
+
+    def bump(self, tags):
+        if self.shared is None:
+            with self._lock:
+                for tag in tags:
+                    self._local[tag] = self._local.get(tag, 0) + 1
+            return
+        for tag in tags:
+            try:
+                self.shared.incr(f'tag:{tag}')
+            except Exception:
+                pass  # Entries still expire after their TTL
+
+class DatabaseTagVersions:
+    """Tag versions in the cache_tags table, which every worker sees without a shared tier.
+
+    A version is the time of the tag's last bump in nanoseconds, so it also gives
+    the Last-Modified time of responses built from the tag.
+    """
+
+    def get(self, tags):
+        """Current versions of tags (0 for tags never bumped), or None if the table cannot be read"""
+        try:
+            rows = dict(db.session.execute(
+                db.select(CacheTag.tag, CacheTag.version).where(CacheTag.tag.in_(tags))
+            ).all())
+        except Exception:
+            db.session.rollback()
+            return None
+        return [rows.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        """Set tags to the current time and commit; call after the write itself has committed"""
+        version = time.time_ns()
+        for attempt in range(2):
+            try:
+                for tag in tags:
+                    updated = CacheTag.query.filter_by(tag=tag).update(
+                        {CacheTag.version: version}, synchronize_session=False
+                    )
+                    if not updated:
+                        db.session.add(CacheTag(tag=tag, version=version))
+                db.session.commit()
+                return
+            except Exception:
+                # A concurrent first bump may have inserted the same tag; the retry updates it
+                db.session.rollback()
+
+class ApiCache:
+    """Caches successful JSON responses of GET endpoints, invalidated through tags"""
+
+    def __init__(self, cache, versions, ttls, enabled=True, validators=None):
+        self.cache = cache
+        self.versions = versions
+        self.ttls = ttls
+        self.enabled = enabled
+        self.validators = validators
+        self.stats = {}
+
+    @staticmethod
+    def key(endpoint, view_args, args):
+        """Cache key; query parameters are sorted and blank ones dropped, so equivalent URLs share an entry"""
+        path = ':'.join(str(view_args[name]) for name in sorted(view_args))
+        query = urlencode(sorted((name, value) for name, value in args.items(multi=True) if value != ''))
+        return f'{endpoint}:{path}?{query}'
+
+    def cached(self, endpoint, tags):
+        """Decorator for a GET view; tags(**view_args) lists the tags its response depends on"""
+        stats = self.stats.setdefault(endpoint, CacheStats())
+        ttl = self.ttls[endpoint]
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(**view_args):
+                if not self.enabled:
+                    return self._uncached(endpoint, ttl, tags, view, view_args)
+                versions = self.versions.get(tags(**view_args))
+                if versions is None:
+                    return self._uncached(endpoint, ttl, tags, view, view_args)
+
+                key = self.key(endpoint, view_args, request.args)
+                entry = self.cache.get(key)
+                # A client that just wrote reads the primary (db_routing.py); an entry another
+                # client built from the lagging replica must not hide its own write
+                if entry is not None and entry['versions'] == versions and not g.get('read_your_writes'):
+                    stats.record(True)
+                    return conditional_json(entry['body'], entry['etag'], entry['modified'])
+
+                stats.record(False)
+                response = make_response(view(**view_args))
+                if response.status_code != 200 or not response.is_json:
+                    return response
+
+                body = response.get_data(as_text=True)
+                etag = body_etag(body)
+                # A rebuild that produced the same body keeps its Last-Modified
+                modified = entry['modified'] if entry is not None and entry['etag'] == etag else time.time()
+                self.cache.set(key, {'versions': versions, 'body': body, 'etag': etag, 'modified': modified}, ttl)
+                stats.record_set()
+                return conditional_json(body, etag, modified)
+            return wrapper
+        return decorator
+
+    def _uncached(self, endpoint, ttl, tags, view, view_args):
+        """Answer a revalidation from the database tag versions before running the view"""
+        versions = self.validators.get(tags(**view_args)) if self.validators is not None else None
+        if versions is None:
+            return self._body_validated(view, view_args)
+
+        # Changes no write announces (views, ranking refreshes) show within a TTL, as for cache entries
+        now = time.time()
+        window = now - now % ttl
+        etag = body_etag(f'{self.key(endpoint, view_args, request.args)}|{versions}|{window}')
+        modified = max(max(versions, default=0) / 1e9, window)
+
+        probe = set_validators(Response(mimetype='application/json'), etag, modified).make_conditional(request)
+        if probe.status_code == 304:
+            return probe
+        response = make_response(view(**view_args))
+        if response.status_code != 200 or not response.is_json:
+            return response
+        return set_validators(response, etag, modified)
+
+    @staticmethod
+    def _body_validated(view, view_args):
+        """Run the view and validate the request against its body's ETag (no Last-Modified without versions)"""
+        response = make_response(view(**view_args))
+        if response.status_code != 200 or not response.is_json:
+            return response
+        body = response.get_data(as_text=True)
+        return conditional_json(body, body_etag(body))
+
+    def invalidate(self, *tags):
+        """Bump tags after a write has committed"""
+        tags = [tag for tag in tags if tag]
+        if self.enabled:
+            self.versions.bump(tags)
+        if self.validators is not None:
+            self.validators.bump(tags)
+
+    def to_dict(self):
+        return {
+            'enabled': self.enabled,
+            'endpoints': {
+                endpoint: {**stats.to_dict(), 'ttl': self.ttls[endpoint]}
+                for endpoint, stats in self.stats.items()
+            },
+            'local_entries': len(self.cache.local),
+            'max_local_entries': self.cache.local.max_entries,
+            'shared': self.cache.shared is not None
+        }
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -6,22 +6,46 @@ import os
 import google.generativeai as genai
 from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
-import uuid
 from PIL import Image
-import io
+import time
+import mimetypes
+from sqlalchemy.exc import IntegrityError
+from urllib.parse import urlencode
 
 from config import config
-from models import db, User, Post, Comment, JobPost, PostCategory, UserActivity, Vote, VoteType, Award, AwardType
+from models import db, User, Post, Comment, JobPost, MediaAsset, PostCategory, UserActivity, Vote, Award, AwardType, normalize_location
+from search import post_search, job_search, search_terms, highlight
+from cache import LRUCache, MISSING, RefreshingValue, create_cache, create_shared_tier
+from api_cache import ApiCache, DatabaseTagVersions, TagVersions, api_cache_enabled, body_etag, conditional_json
+from chat import (
+    ChatExecutor, ChatResponseCache, ChatUnavailable, CircuitBreaker,
+    create_chat_model, stream_chat, stream_cached
+)
+from comment_tree import (
+    CommentThread, InvalidContinuationToken, encode_continuation, decode_continuation, reply_order, visible_comments
+)
+import timeline
+from media import MediaProcessor, asset_hash, is_content_addressed, read_manifest, store_upload, upload_id_for
+from static_assets import StaticManifest
+from db_routing import configure_engines, install_replica_routing, install_sqlite_pragmas
+from write_behind import ViewCounter, WriteBehindBuffer, apply_view_deltas, apply_vote_deltas
+from pagination import InvalidCursor, keyset_paginate, offset_cursor_paginate
 
 def create_app(config_name=None):
     if config_name is None:
         config_name = os.environ.get('FLASK_ENV', 'development')
     
-    app = Flask(__name__, static_folder='../dist', static_url_path='')
+    # No built-in static route: its /<path:filename> rule would shadow the SPA fallback below
+    app = Flask(__name__, static_folder=None)
     app.config.from_object(config[config_name])
     
-    # Initialize extensions
+    # Initialize extensions (engine profiles and the optional read replica first, see db_routing.py)
+    configure_engines(app)
     db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engines.values(), app.config['SQLITE_PRAGMAS'])
+    if app.config['REPLICA_DATABASE_URL']:
+        install_replica_routing(app, create_cache(app.config, 'sticky', 65536, app.config['REPLICA_STICKY_SECONDS']))
     CORS(app, origins=app.config['CORS_ORIGINS'])
     
     # Initialize rate limiter
@@ -30,9 +54,13 @@ def create_app(config_name=None):
         app=app,
         default_limits=["100/hour"]
     )
+    # Flask-Limiter only registers itself in app.extensions when enabled, and its
+    # route decorators hold a weak reference, so keep it alive when RATELIMIT_ENABLED=False
+    app.limiter = limiter
     
     # Setup Gemini AI
-    genai.configure(api_key=app.config['GEMINI_API_KEY'])
+    if app.config['CHAT_MODEL_BACKEND'] == 'gemini':
+        genai.configure(api_key=app.config['GEMINI_API_KEY'])
     
     # Create upload directory
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -107,27 +135,139 @@ def create_app(config_name=None):
         )
         return prompt
     
+    chat_cache = None
+    if app.config['CHAT_CACHE_ENABLED']:
+        chat_cache = ChatResponseCache(
+            create_cache(app.config, 'chat', app.config['CHAT_CACHE_MAX_ENTRIES'], app.config['CHAT_CACHE_TTL']),
+            template=build_refined_prompt('{query}'),
+            model_name=f"{app.config['CHAT_MODEL_BACKEND']}:{app.config['CHAT_MODEL_NAME']}"
+        )
+    
+    chat_executor = ChatExecutor(
+        max_workers=app.config['CHAT_MAX_WORKERS'],
+        max_queue=app.config['CHAT_MAX_QUEUE'],
+        timeout=app.config['CHAT_TIMEOUT'],
+        breaker=CircuitBreaker(app.config['CHAT_BREAKER_THRESHOLD'], app.config['CHAT_BREAKER_RESET'])
+    )
+    
+    def chat_unavailable(error):
+        response = jsonify({'error': error.message})
+        response.status_code = error.status
+        if error.retry_after:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response
+    
     def generate_ai_response(user_query: str) -> str:
+        cached = chat_cache.get(user_query) if chat_cache else None
+        if cached is not None:
+            return cached
+        
         try:
-            # Updated model name for current Gemini API
-            model = genai.GenerativeModel('gemini-1.5-flash')
+            model = chat_executor.wrap(create_chat_model(app.config))
             prompt = build_refined_prompt(user_query)
             response = model.generate_content(prompt)
-            return response.text.strip()
+            response_text = response.text.strip()
+        except ChatUnavailable:
+            raise
         except Exception as e:
+            # Error replies are returned to the user but never cached
             return f"I apologize, but I'm having trouble connecting right now. Please try again later. Error: {str(e)}"
+        
+        if chat_cache:
+            chat_cache.set(user_query, response_text)
+        return response_text
+    
+    def serialize_posts(items, viewer_id, serializer):
+        user_votes = Vote.get_post_votes(viewer_id, [item.id for item in items])
+        if serializer == 'orm':
+            return [post.to_dict(user_votes=user_votes) for post in items]
+        now = datetime.now(timezone.utc)
+        return [Post.row_to_dict(row, user_votes, now) for row in items]
+    
+    def paginate_posts(query, page, per_page, viewer_id=None):
+        """Paginate a Post query and serialize the page for listing endpoints.
+        
+        The default 'rows' path selects post and author columns in the page query
+        itself, so no further SQL runs while serializing. Pass ?serializer=orm (or
+        set POST_LISTING_SERIALIZER) to compare against the ORM to_dict path.
+        """
+        serializer = request.args.get('serializer', app.config['POST_LISTING_SERIALIZER'])
+        listing = query if serializer == 'orm' else Post.listing_query(query)
+        posts = listing.paginate(page=page, per_page=per_page, error_out=False)
+        return serialize_posts(posts.items, viewer_id, serializer), posts
+    
+    count_cache = LRUCache(max_entries=2048, default_ttl=app.config['APPROX_COUNT_TTL'])
+    
+    # Read-through cache for GET endpoints; write endpoints invalidate the tags they touch
+    api_cache = ApiCache(
+        create_cache(app.config, 'api', app.config['API_CACHE_MAX_ENTRIES'], max(app.config['API_CACHE_TTLS'].values())),
+        TagVersions(create_shared_tier(app.config, 'api', 0)),
+        app.config['API_CACHE_TTLS'],
+        enabled=api_cache_enabled(app.config),
+        validators=DatabaseTagVersions()
+    )
+    app.extensions['api_cache'] = api_cache
+    if not api_cache.enabled and str(app.config['API_CACHE_ENABLED']).lower() in ('true', 'on', '1'):
+        app.logger.warning("API response cache disabled: WEB_CONCURRENCY > 1 needs CACHE_BACKEND=redis "
+                           "so invalidations reach every worker")
+    
+    def cursor_requested():
+        """Listing endpoints switch to cursor pagination when ?cursor= is present (empty for the first page)"""
+        return 'cursor' in request.args
+    
+    def cursor_pagination(per_page, next_cursor, count_query=None):
+        """Pagination block for cursor mode.
+        
+        No COUNT runs unless the client asks with ?include_total=1; the count is then
+        cached per endpoint and filters for APPROX_COUNT_TTL seconds.
+        """
+        pagination = {
+            'per_page': per_page,
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None
+        }
+        if count_query is not None and request.args.get('include_total', type=int):
+            ignored = ('cursor', 'page', 'per_page', 'include_total', 'serializer')
+            key = request.path + '?' + urlencode(sorted(
+                (name, value) for name, value in request.args.items(multi=True) if name not in ignored
+            ))
+            total = count_cache.get(key)
+            if total is MISSING:
+                total = count_query.order_by(None).count()
+                count_cache.set(key, total)
+            pagination['total'] = total
+            pagination['total_is_approximate'] = True
+        return pagination
+    
+    def cursor_paginate_posts(query, order, per_page, viewer_id=None, key_names=None):
+        """Cursor-mode counterpart of paginate_posts.
+        
+        order is the keyset ordering as (column, descending) pairs ending in a unique
+        column; None pages by an offset cursor (relevance-ranked search).
+        Returns (items, pagination).
+        """
+        serializer = request.args.get('serializer', app.config['POST_LISTING_SERIALIZER'])
+        listing = query if serializer == 'orm' else Post.listing_query(query)
+        cursor = request.args.get('cursor')
+        if order is None:
+            rows, next_cursor = offset_cursor_paginate(listing, cursor, per_page)
+        else:
+            rows, next_cursor = keyset_paginate(listing, order, cursor, per_page, key_names)
+        return serialize_posts(rows, viewer_id, serializer), cursor_pagination(per_page, next_cursor, query)
+    
+    # Frontend Routes - Serve React App from an in-memory index of dist (restart after rebuilding)
+    static_manifest = StaticManifest(os.path.join(app.root_path, '..', 'dist'))
     
-    # Frontend Routes - Serve React App
     @app.route('/')
     def serve_react_app():
-        return send_from_directory(app.static_folder, 'index.html')
+        return serve_static_files('index.html')
     
     @app.route('/<path:path>')
     def serve_static_files(path):
-        if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-            return send_from_directory(app.static_folder, path)
-        else:
-            return send_from_directory(app.static_folder, 'index.html')
+        resolved = None if path.startswith('api/') else static_manifest.resolve(path)
+        if resolved is None:
+            return jsonify({'error': 'Resource not found'}), 404
+        return static_manifest.response(resolved, request)
     
     # Routes
     @app.route('/api/health', methods=['GET'])
@@ -150,17 +290,65 @@ def create_app(config_name=None):
         if len(user_query) > 1000:
             return jsonify({"error": "Query too long. Maximum 1000 characters allowed."}), 400
         
-        response_text = generate_ai_response(user_query)
+        try:
+            response_text = generate_ai_response(user_query)
+        except ChatUnavailable as e:
+            return chat_unavailable(e)
         return jsonify({"response": response_text})
     
+    @app.route('/api/chat/stream', methods=['POST'])
+    @limiter.limit("10/minute")
+    def chat_stream():
+        data = request.get_json()
+        user_query = data.get("query")
+        
+        if not user_query:
+            return jsonify({"error": "No query provided"}), 400
+        
+        if len(user_query) > 1000:
+            return jsonify({"error": "Query too long. Maximum 1000 characters allowed."}), 400
+        
+        cached = chat_cache.get(user_query) if chat_cache else None
+        if cached is not None:
+            stream = stream_cached(cached)
+        else:
+            # Admission happens here, so overload is reported before the stream starts
+            try:
+                model = chat_executor.wrap(create_chat_model(app.config))
+                upstream = model.generate_content(build_refined_prompt(user_query), stream=True)
+            except ChatUnavailable as e:
+                return chat_unavailable(e)
+            stream = stream_chat(
+                upstream,
+                on_complete=(lambda answer: chat_cache.set(user_query, answer)) if chat_cache else None
+            )
+        
+        return Response(
+            stream,
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    @app.route('/api/cache/stats', methods=['GET'])
+    def get_api_cache_stats():
+        return jsonify(api_cache.to_dict())
+    
+    @app.route('/api/chat/stats', methods=['GET'])
+    def chat_stats():
+        return jsonify({
+            'cache': chat_cache.to_dict() if chat_cache else None,
+            'executor': chat_executor.to_dict()
+        })
+    
     @app.route('/api/posts', methods=['GET'])
+    @api_cache.cached('posts', lambda: ['posts'])
     def get_posts():
         try:
             page = request.args.get('page', 1, type=int)
             per_page = min(request.args.get('per_page', 20, type=int), 50)
             category = request.args.get('category')
-            sort_by = request.args.get('sort_by', 'recent')
             search = request.args.get('search')
+            sort_by = request.args.get('sort_by') or ('relevance' if search else 'recent')
             
             query = Post.query.filter_by(is_hidden=False)
             
@@ -171,29 +359,35 @@ def create_app(config_name=None):
                 except ValueError:
                     return jsonify({'error': 'Invalid category'}), 400
             
+            terms = search_terms(search)
             if search:
-                query = query.filter(
-                    db.or_(
-                        Post.title.ilike(f'%{search}%'),
-                        Post.content.ilike(f'%{search}%')
-                    )
-                )
-            
-            if sort_by == 'popular':
+                query, rank = post_search.apply(query, terms)
+            
+            if sort_by == 'relevance' and search:
+                query = query.order_by(rank.asc(), Post.created_at.desc())
+                order = None
+            elif sort_by in ('hot', 'best'):
+                # Precomputed and indexed with is_hidden/category, so no sort step runs
+                column = Post.hot_score if sort_by == 'hot' else Post.best_score
+                query = query.order_by(column.desc(), Post.id.desc())
+                order = [(column, True), (Post.id, True)]
+            elif sort_by == 'popular':
                 query = query.order_by(Post.likes_count.desc())
+                order = [(Post.likes_count, True), (Post.id, True)]
             elif sort_by == 'discussed':
                 query = query.order_by(Post.comments_count.desc())
+                order = [(Post.comments_count, True), (Post.id, True)]
             else:  # recent
                 query = query.order_by(Post.created_at.desc())
+                order = [(Post.created_at, True), (Post.id, True)]
             
-            posts = query.paginate(page=page, per_page=per_page, error_out=False)
-            
-            # Pass user_id for vote status
+            # Viewer's votes are resolved for the whole page in one query
             user_id = request.args.get('user_id')
-            
-            return jsonify({
-                'posts': [post.to_dict(user_id=user_id) for post in posts.items],
-                'pagination': {
+            if cursor_requested():
+                items, pagination = cursor_paginate_posts(query, order, per_page, viewer_id=user_id)
+            else:
+                items, posts = paginate_posts(query, page, per_page, viewer_id=user_id)
+                pagination = {
                     'page': page,
                     'pages': posts.pages,
                     'per_page': per_page,
@@ -201,7 +395,20 @@ def create_app(config_name=None):
                     'has_next': posts.has_next,
                     'has_prev': posts.has_prev
                 }
+            
+            if search:
+                for item in items:
+                    item['highlight'] = {
+                        'title': highlight(item['title'], terms, width=None),
+                        'snippet': highlight(item['content'], terms)
+                    }
+            
+            return jsonify({
+                'posts': items,
+                'pagination': pagination
             })
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': 'Failed to fetch posts'}), 500
     
@@ -230,11 +437,17 @@ def create_app(config_name=None):
                 category=category,
                 user_id=data['user_id'],
                 is_anonymous=data.get('anonymous', False),
-                tags=data.get('tags', [])
+                tags=data.get('tags', []),
+                image_url=data.get('image_url')
             )
+            post.update_rankings()
             
             db.session.add(post)
+            User.adjust_counters(data['user_id'], posts_count=1)
+            MediaAsset.adjust_refs([asset_hash(post.image_url)], 1)
+            timeline.fan_out_post(post, app.config['FEED_FANOUT_MAX_FOLLOWERS'])
             db.session.commit()
+            api_cache.invalidate('posts', f"user:{data['user_id']}", f"user:{data['user_id']}:posts")
             
             # Log activity
             activity = UserActivity(
@@ -254,6 +467,43 @@ def create_app(config_name=None):
             db.session.rollback()
             return jsonify({'error': 'Failed to create post'}), 500
     
+    # With VOTE_INGESTION='buffered' vote counters are written behind the request (see write_behind.py)
+    vote_buffer = None
+    if app.config['VOTE_INGESTION'] == 'buffered':
+        def flush_votes(batch):
+            with app.app_context():
+                updated = apply_vote_deltas(batch)
+                api_cache.invalidate(*{
+                    tag for kind, counters in updated for tag in vote_cache_tags(kind, counters)
+                })
+        vote_buffer = WriteBehindBuffer(
+            flush_votes, app.config['VOTE_FLUSH_INTERVAL'], app.config['VOTE_FLUSH_MAX_PENDING']
+        )
+    app.extensions['vote_buffer'] = vote_buffer
+    
+    def vote_cache_tags(kind, counters):
+        """Cached responses showing a voted item's counts or its author's karma"""
+        if kind == 'post':
+            return ['posts', f'user:{counters.user_id}', f'user:{counters.user_id}:posts']
+        return [f'comments:{counters.post_id}', f'user:{counters.user_id}']
+    
+    def buffer_vote(kind, model, target_id, user_vote, deltas):
+        """Commit a recorded vote, queue its counter deltas and predict the counts; None if the target does not exist"""
+        stored = db.session.execute(
+            db.select(model.upvotes, model.downvotes).where(model.id == target_id)
+        ).first()
+        if stored is None:
+            db.session.rollback()
+            return None
+        db.session.commit()
+        
+        key = (kind, target_id)
+        vote_buffer.add(key, deltas)
+        pending = vote_buffer.pending(key)
+        upvotes = (stored.upvotes or 0) + pending['upvotes']
+        downvotes = (stored.downvotes or 0) + pending['downvotes']
+        return {'user_vote': user_vote, 'upvotes': upvotes, 'downvotes': downvotes, 'score': upvotes - downvotes}
+    
     @app.route('/api/posts/<post_id>/vote', methods=['POST'])
     @limiter.limit("60/minute")
     def vote_post(post_id):
@@ -268,61 +518,34 @@ def create_app(config_name=None):
             if vote_type not in ['upvote', 'downvote', 'remove']:
                 return jsonify({'error': 'Invalid vote type'}), 400
             
-            post = Post.query.get_or_404(post_id)
-            user = User.query.get_or_404(user_id)
-            
-            # Check existing vote
-            existing_vote = Vote.query.filter_by(user_id=user_id, post_id=post_id).first()
-            
-            if vote_type == 'remove' or (existing_vote and existing_vote.vote_type.value == vote_type):
-                # Remove existing vote
-                if existing_vote:
-                    if existing_vote.vote_type == VoteType.UPVOTE:
-                        post.upvotes = max(0, post.upvotes - 1)
-                    else:
-                        post.downvotes = max(0, post.downvotes - 1)
-                    db.session.delete(existing_vote)
-                    user_vote = None
-                else:
-                    user_vote = None
-            else:
-                # Update existing vote or create new one
-                if existing_vote:
-                    # Change vote type
-                    if existing_vote.vote_type == VoteType.UPVOTE:
-                        post.upvotes = max(0, post.upvotes - 1)
-                        post.downvotes += 1
-                    else:
-                        post.downvotes = max(0, post.downvotes - 1)
-                        post.upvotes += 1
-                    existing_vote.vote_type = VoteType(vote_type)
-                    user_vote = vote_type
-                else:
-                    # Create new vote
-                    new_vote = Vote(
-                        user_id=user_id,
-                        post_id=post_id,
-                        vote_type=VoteType(vote_type)
-                    )
-                    db.session.add(new_vote)
-                    
-                    if vote_type == 'upvote':
-                        post.upvotes += 1
-                    else:
-                        post.downvotes += 1
-                    user_vote = vote_type
-            
-            # Update post score and user karma
-            post.update_score()
-            user.update_karma()
+            recorded = Vote.record(user_id, vote_type, post_id=post_id)
+            if recorded is None:
+                return jsonify({'error': 'User not found'}), 404
+            user_vote, deltas = recorded
+            
+            if vote_buffer is not None:
+                counts = buffer_vote('post', Post, post_id, user_vote, deltas)
+                if counts is None:
+                    return jsonify({'error': 'Post not found'}), 404
+                return jsonify(counts)
+            
+            # Counters and score change in one statement; the author's karma follows the score
+            counters = Post.adjust_counters(post_id, **deltas)
+            if counters is None:
+                db.session.rollback()
+                return jsonify({'error': 'Post not found'}), 404
+            User.apply_karma_delta(
+                counters.user_id, post_delta=deltas.get('upvotes', 0) - deltas.get('downvotes', 0)
+            )
             
             db.session.commit()
+            api_cache.invalidate(*vote_cache_tags('post', counters))
             
             return jsonify({
                 'user_vote': user_vote,
-                'upvotes': post.upvotes,
-                'downvotes': post.downvotes,
-                'score': post.score
+                'upvotes': counters.upvotes,
+                'downvotes': counters.downvotes,
+                'score': counters.score
             })
             
         except Exception as e:
@@ -343,61 +566,34 @@ def create_app(config_name=None):
             if vote_type not in ['upvote', 'downvote', 'remove']:
                 return jsonify({'error': 'Invalid vote type'}), 400
             
-            comment = Comment.query.get_or_404(comment_id)
-            user = User.query.get_or_404(user_id)
-            
-            # Check existing vote
-            existing_vote = Vote.query.filter_by(user_id=user_id, comment_id=comment_id).first()
-            
-            if vote_type == 'remove' or (existing_vote and existing_vote.vote_type.value == vote_type):
-                # Remove existing vote
-                if existing_vote:
-                    if existing_vote.vote_type == VoteType.UPVOTE:
-                        comment.upvotes = max(0, comment.upvotes - 1)
-                    else:
-                        comment.downvotes = max(0, comment.downvotes - 1)
-                    db.session.delete(existing_vote)
-                    user_vote = None
-                else:
-                    user_vote = None
-            else:
-                # Update existing vote or create new one
-                if existing_vote:
-                    # Change vote type
-                    if existing_vote.vote_type == VoteType.UPVOTE:
-                        comment.upvotes = max(0, comment.upvotes - 1)
-                        comment.downvotes += 1
-                    else:
-                        comment.downvotes = max(0, comment.downvotes - 1)
-                        comment.upvotes += 1
-                    existing_vote.vote_type = VoteType(vote_type)
-                    user_vote = vote_type
-                else:
-                    # Create new vote
-                    new_vote = Vote(
-                        user_id=user_id,
-                        comment_id=comment_id,
-                        vote_type=VoteType(vote_type)
-                    )
-                    db.session.add(new_vote)
-                    
-                    if vote_type == 'upvote':
-                        comment.upvotes += 1
-                    else:
-                        comment.downvotes += 1
-                    user_vote = vote_type
-            
-            # Update comment score and user karma
-            comment.update_score()
-            user.update_karma()
+            recorded = Vote.record(user_id, vote_type, comment_id=comment_id)
+            if recorded is None:
+                return jsonify({'error': 'User not found'}), 404
+            user_vote, deltas = recorded
+            
+            if vote_buffer is not None:
+                counts = buffer_vote('comment', Comment, comment_id, user_vote, deltas)
+                if counts is None:
+                    return jsonify({'error': 'Comment not found'}), 404
+                return jsonify(counts)
+            
+            # Counters and score change in one statement; the author's karma follows the score
+            counters = Comment.adjust_counters(comment_id, **deltas)
+            if counters is None:
+                db.session.rollback()
+                return jsonify({'error': 'Comment not found'}), 404
+            User.apply_karma_delta(
+                counters.user_id, comment_delta=deltas.get('upvotes', 0) - deltas.get('downvotes', 0)
+            )
             
             db.session.commit()
+            api_cache.invalidate(*vote_cache_tags('comment', counters))
             
             return jsonify({
                 'user_vote': user_vote,
-                'upvotes': comment.upvotes,
-                'downvotes': comment.downvotes,
-                'score': comment.score
+                'upvotes': counters.upvotes,
+                'downvotes': counters.downvotes,
+                'score': counters.score
             })
             
         except Exception as e:
@@ -405,32 +601,76 @@ def create_app(config_name=None):
             return jsonify({'error': 'Failed to vote on comment'}), 500
     
     @app.route('/api/posts/<post_id>/comments', methods=['GET'])
+    @api_cache.cached('comments', lambda post_id: [f'comments:{post_id}'])
     def get_comments(post_id):
         try:
             page = request.args.get('page', 1, type=int)
             per_page = min(request.args.get('per_page', 20, type=int), 50)
-            
-            comments = Comment.query.filter_by(
-                post_id=post_id,
-                parent_id=None,  # Only top-level comments
-                is_hidden=False
-            ).order_by(Comment.created_at.desc()).paginate(
-                page=page, per_page=per_page, error_out=False
+            depth = min(
+                max(request.args.get('depth', app.config['COMMENT_TREE_DEPTH'], type=int), 1),
+                app.config['COMMENT_TREE_MAX_DEPTH']
             )
-            
-            # Pass user_id for vote status
+            replies_limit = min(
+                max(request.args.get('replies_limit', app.config['COMMENT_TREE_REPLIES_LIMIT'], type=int), 1),
+                50
+            )
+            continuation = request.args.get('continuation')
             user_id = request.args.get('user_id')
             
-            return jsonify({
-                'comments': [comment.to_dict(user_id=user_id) for comment in comments.items],
-                'pagination': {
+            if continuation:
+                # "Load more replies" under a comment, starting where the last response stopped
+                try:
+                    parent_id, offset = decode_continuation(continuation)
+                except InvalidContinuationToken:
+                    return jsonify({'error': 'Invalid continuation token'}), 400
+                
+                parent = Comment.query.filter_by(id=parent_id, post_id=post_id).with_entities(
+                    Comment.replies_count
+                ).first()
+                if parent is None:
+                    return jsonify({'error': 'Comment not found'}), 404
+                
+                window = visible_comments(post_id).filter_by(parent_id=parent_id).options(
+                    db.joinedload(Comment.author)
+                ).order_by(*reply_order()).offset(offset).limit(replies_limit).all()
+                next_offset = offset + len(window)
+                thread = CommentThread.load(window, depth, replies_limit)
+                
+                return jsonify({
+                    'comments': thread.serialize(window, user_id=user_id, depth=depth),
+                    'parent_id': parent_id,
+                    'continuation': encode_continuation(parent_id, next_offset) if next_offset < (parent.replies_count or 0) else None
+                })
+            
+            # Only this page's top-level comments, and the subtrees under them
+            roots = visible_comments(post_id).filter(Comment.parent_id.is_(None))
+            
+            if cursor_requested():
+                window, next_cursor = keyset_paginate(
+                    roots.options(db.joinedload(Comment.author)),
+                    [(Comment.created_at, True), (Comment.id, True)], request.args.get('cursor'), per_page
+                )
+                pagination = cursor_pagination(per_page, next_cursor, roots)
+            else:
+                total = roots.count()
+                window = roots.options(db.joinedload(Comment.author)).order_by(
+                    Comment.created_at.desc(), Comment.id.desc()
+                ).offset((page - 1) * per_page).limit(per_page).all()
+                pagination = {
                     'page': page,
-                    'pages': comments.pages,
+                    'pages': (total + per_page - 1) // per_page,
                     'per_page': per_page,
-                    'total': comments.total
+                    'total': total
                 }
+            thread = CommentThread.load(window, depth, replies_limit)
+            
+            return jsonify({
+                'comments': thread.serialize(window, user_id=user_id, depth=depth),
+                'pagination': pagination
             })
             
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': 'Failed to fetch comments'}), 500
     
@@ -443,22 +683,39 @@ def create_app(config_name=None):
             if not data.get('content') or not data.get('user_id'):
                 return jsonify({'error': 'Content and user_id are required'}), 400
             
-            # Verify post exists
-            post = Post.query.get_or_404(post_id)
+            # Bump the post's comment count; also verifies the post exists
+            counters = Post.adjust_counters(post_id, comments_count=1)
+            if counters is None:
+                db.session.rollback()
+                return jsonify({'error': 'Post not found'}), 404
+            
+            parent_id = data.get('parent_id')
+            if parent_id:
+                # Bump the parent's reply count; also verifies it belongs to this post
+                updated = Comment.query.filter_by(id=parent_id, post_id=post_id).update(
+                    {Comment.replies_count: db.func.coalesce(Comment.replies_count, 0) + 1},
+                    synchronize_session=False
+                )
+                if not updated:
+                    db.session.rollback()
+                    return jsonify({'error': 'Invalid parent comment'}), 400
             
             comment = Comment(
                 content=data['content'],
                 post_id=post_id,
                 user_id=data['user_id'],
-                parent_id=data.get('parent_id')
+                parent_id=parent_id
             )
             
             db.session.add(comment)
             
-            # Update post comments count
-            post.comments_count += 1
+            # Update author comment count
+            User.adjust_counters(data['user_id'], comments_count=1)
             
             db.session.commit()
+            api_cache.invalidate(
+                'posts', f'comments:{post_id}', f"user:{data['user_id']}", f'user:{counters.user_id}:posts'
+            )
             
             return jsonify({
                 'message': 'Comment created successfully',
@@ -470,48 +727,135 @@ def create_app(config_name=None):
             return jsonify({'error': 'Failed to create comment'}), 500
     
     @app.route('/api/jobs', methods=['GET'])
+    @api_cache.cached('jobs', lambda: ['jobs'])
     def get_jobs():
         try:
             page = request.args.get('page', 1, type=int)
             per_page = min(request.args.get('per_page', 20, type=int), 50)
-            location = request.args.get('location')
+            location = normalize_location(request.args.get('location'))
             job_type = request.args.get('job_type')
+            experience_level = request.args.get('experience_level')
             search = request.args.get('search')
             
             query = JobPost.query.filter_by(is_active=True)
             
-            if location:
-                query = query.filter(JobPost.location.ilike(f'%{location}%'))
+            terms = search_terms(search)
+            if search:
+                query, rank = job_search.apply(query, terms)
+            
+            def summarize():
+                # One aggregate pass over the searched set feeds every facet and the total.
+                # Each facet ignores its own filter so the client can offer alternatives.
+                groups = query.with_entities(
+                    JobPost.job_type,
+                    JobPost.experience_level,
+                    JobPost.location_key,
+                    db.func.min(JobPost.location),
+                    db.func.count()
+                ).group_by(JobPost.job_type, JobPost.experience_level, JobPost.location_key).all()
+                
+                def matches(group, skip=None):
+                    group_type, group_level, group_location = group[:3]
+                    return (
+                        (skip == 'job_type' or not job_type or group_type == job_type) and
+                        (skip == 'experience_level' or not experience_level or group_level == experience_level) and
+                        (skip == 'location' or not location or (group_location or '').startswith(location))
+                    )
+                
+                facets = {'job_type': {}, 'experience_level': {}, 'location': {}}
+                location_labels = {}
+                for group in groups:
+                    group_type, group_level, group_location, label, count = group
+                    for name, value in (('job_type', group_type), ('experience_level', group_level), ('location', group_location)):
+                        if value and matches(group, skip=name):
+                            facets[name][value] = facets[name].get(value, 0) + count
+                    if group_location:
+                        location_labels.setdefault(group_location, label)
+                total = sum(group[4] for group in groups if matches(group))
+                
+                def facet_list(name):
+                    return [
+                        {'value': value, 'count': count, **({'label': location_labels[value]} if name == 'location' else {})}
+                        for value, count in sorted(facets[name].items(), key=lambda item: (-item[1], item[0]))
+                    ]
+                
+                return {name: facet_list(name) for name in facets}, total
+            
+            # Cursor pages after the first skip the aggregate; the client keeps the first page's facets
+            cursor = request.args.get('cursor')
+            facets, total = summarize() if not (cursor_requested() and cursor) else (None, None)
             
+            if location:
+                # Prefix range on the normalized key so the index can be used
+                query = query.filter(JobPost.location_key >= location, JobPost.location_key < location + '\uffff')
             if job_type:
                 query = query.filter_by(job_type=job_type)
+            if experience_level:
+                query = query.filter_by(experience_level=experience_level)
             
-            if search:
-                query = query.filter(
-                    db.or_(
-                        JobPost.title.ilike(f'%{search}%'),
-                        JobPost.company.ilike(f'%{search}%'),
-                        JobPost.description.ilike(f'%{search}%')
+            if cursor_requested():
+                if search:
+                    jobs, next_cursor = offset_cursor_paginate(
+                        query.order_by(rank.asc(), JobPost.created_at.desc()), cursor, per_page
                     )
-                )
-            
-            jobs = query.order_by(JobPost.created_at.desc()).paginate(
-                page=page, per_page=per_page, error_out=False
-            )
-            
-            return jsonify({
-                'jobs': [job.to_dict() for job in jobs.items],
-                'pagination': {
+                else:
+                    jobs, next_cursor = keyset_paginate(
+                        query, [(JobPost.created_at, True), (JobPost.id, True)], cursor, per_page
+                    )
+                pagination = cursor_pagination(per_page, next_cursor)
+                if total is not None:
+                    pagination['total'] = total
+            else:
+                if search:
+                    query = query.order_by(rank.asc(), JobPost.created_at.desc())
+                else:
+                    query = query.order_by(JobPost.created_at.desc())
+                
+                jobs = query.limit(per_page).offset((page - 1) * per_page).all()
+                pagination = {
                     'page': page,
-                    'pages': jobs.pages,
+                    'pages': (total + per_page - 1) // per_page,
                     'per_page': per_page,
-                    'total': jobs.total
+                    'total': total
                 }
-            })
             
+            response = {
+                'jobs': [job.to_dict() for job in jobs],
+                'pagination': pagination
+            }
+            if facets is not None:
+                response['facets'] = facets
+            return jsonify(response)
+            
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': 'Failed to fetch jobs'}), 500
     
+    def flush_views(batch):
+        with app.app_context():
+            apply_view_deltas(batch)
+    
+    # Views cost a memory increment; deduplicated per viewer and written in batches (see write_behind.py)
+    view_counter = ViewCounter(
+        WriteBehindBuffer(flush_views, app.config['VIEW_FLUSH_INTERVAL'], app.config['VIEW_FLUSH_MAX_PENDING']),
+        window=app.config['VIEW_DEDUPE_WINDOW'],
+        max_viewers=app.config['VIEW_DEDUPE_MAX_ENTRIES']
+    )
+    app.extensions['view_counter'] = view_counter
+    
+    @app.route('/api/posts/<post_id>/view', methods=['POST'])
+    @limiter.limit("120/minute")
+    def record_post_view(post_id):
+        try:
+            data = request.get_json(silent=True) or {}
+            viewer = data.get('user_id') or f"{request.remote_addr}|{request.headers.get('User-Agent', '')}"
+            counted = view_counter.record(post_id, viewer)
+            return jsonify({'counted': counted}), 202
+            
+        except Exception as e:
+            return jsonify({'error': 'Failed to record view'}), 500
+    
     @app.route('/api/posts/<post_id>/award', methods=['POST'])
     @limiter.limit("10/minute")
     def award_post(post_id):
@@ -527,35 +871,39 @@ def create_app(config_name=None):
             if award_type not in [award.value for award in AwardType]:
                 return jsonify({'error': 'Invalid award type'}), 400
             
-            post = Post.query.get_or_404(post_id)
-            giver = User.query.get_or_404(giver_id)
+            giver_username = db.session.query(User.username).filter_by(id=giver_id).scalar()
+            if giver_username is None:
+                return jsonify({'error': 'User not found'}), 404
+            
+            # Update counts, each in a single statement
+            counters = Post.adjust_counters(post_id, awards_count=1)
+            if counters is None:
+                db.session.rollback()
+                return jsonify({'error': 'Post not found'}), 404
+            User.adjust_counters(giver_id, awards_given=1)
+            User.adjust_counters(counters.user_id, awards_received=1)
             
             # Create award
             award = Award(
                 giver_id=giver_id,
-                receiver_id=post.user_id,
+                receiver_id=counters.user_id,
                 post_id=post_id,
                 award_type=AwardType(award_type),
                 message=message
             )
             
             db.session.add(award)
-            
-            # Update counts
-            post.awards_count += 1
-            giver.awards_given += 1
-            
-            if post.author:
-                post.author.awards_received += 1
-            
             db.session.commit()
+            api_cache.invalidate(
+                'posts', f'user:{giver_id}', f'user:{counters.user_id}', f'user:{counters.user_id}:posts'
+            )
             
             return jsonify({
                 'message': 'Award given successfully',
                 'award': {
                     'type': award_type,
                     'message': message,
-                    'giver': giver.username
+                    'giver': giver_username
                 }
             }), 201
             
@@ -564,6 +912,7 @@ def create_app(config_name=None):
             return jsonify({'error': 'Failed to give award'}), 500
     
     @app.route('/api/users/<user_id>', methods=['GET'])
+    @api_cache.cached('user_profile', lambda user_id: [f'user:{user_id}'])
     def get_user_profile(user_id):
         try:
             user = User.query.get_or_404(user_id)
@@ -583,6 +932,7 @@ def create_app(config_name=None):
             return jsonify({'error': 'Failed to fetch user profile'}), 500
     
     @app.route('/api/users/<user_id>/posts', methods=['GET'])
+    @api_cache.cached('user_posts', lambda user_id: [f'user:{user_id}', f'user:{user_id}:posts'])
     def get_user_posts(user_id):
         try:
             page = request.args.get('page', 1, type=int)
@@ -595,23 +945,33 @@ def create_app(config_name=None):
             if not user.profile_public and requesting_user_id != user_id:
                 return jsonify({'error': 'Profile is private'}), 403
             
-            posts = Post.query.filter_by(
+            query = Post.query.filter_by(
                 user_id=user_id,
                 is_hidden=False
-            ).order_by(Post.created_at.desc()).paginate(
-                page=page, per_page=per_page, error_out=False
-            )
+            ).order_by(Post.created_at.desc())
             
-            return jsonify({
-                'posts': [post.to_dict(user_id=requesting_user_id) for post in posts.items],
-                'pagination': {
+            if cursor_requested():
+                items, pagination = cursor_paginate_posts(
+                    query, [(Post.created_at, True), (Post.id, True)], per_page, viewer_id=requesting_user_id
+                )
+                # The author's visible post count is kept on the user row
+                pagination['total'] = user.posts_count or 0
+            else:
+                items, posts = paginate_posts(query, page, per_page, viewer_id=requesting_user_id)
+                pagination = {
                     'page': page,
                     'pages': posts.pages,
                     'per_page': per_page,
                     'total': posts.total
                 }
+            
+            return jsonify({
+                'posts': items,
+                'pagination': pagination
             })
             
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': 'Failed to fetch user posts'}), 500
     
@@ -628,20 +988,31 @@ def create_app(config_name=None):
             user_to_follow = User.query.get_or_404(user_id)
             follower = User.query.get_or_404(follower_id)
             
-            if user_to_follow in follower.followed:
+            if follower.is_following(user_id):
                 follower.followed.remove(user_to_follow)
                 following = False
+                timeline.prune(follower_id, user_id)
             else:
                 follower.followed.append(user_to_follow)
                 following = True
+                timeline.backfill(
+                    follower_id, user_id,
+                    app.config['FEED_FANOUT_MAX_FOLLOWERS'], app.config['FEED_BACKFILL_POSTS']
+                )
+            
+            # Keep the denormalized counters in the same transaction
+            delta = 1 if following else -1
+            User.adjust_counters(user_id, followers_count=delta)
+            User.adjust_counters(follower_id, following_count=delta)
+            counts = {
+                'followers_count': user_to_follow.followers_count,
+                'following_count': follower.following_count
+            }
             
             db.session.commit()
+            api_cache.invalidate(f'user:{user_id}', f'user:{follower_id}')
             
-            return jsonify({
-                'following': following,
-                'followers_count': user_to_follow.followers.count(),
-                'following_count': follower.followed.count()
-            })
+            return jsonify({'following': following, **counts})
             
         except Exception as e:
             db.session.rollback()
@@ -655,35 +1026,31 @@ def create_app(config_name=None):
             
             user = User.query.get_or_404(user_id)
             
-            # Get posts from followed users and user's preferred categories
-            followed_user_ids = [u.id for u in user.followed]
-            followed_user_ids.append(user_id)  # Include user's own posts
-            
-            query = Post.query.filter(
-                Post.user_id.in_(followed_user_ids),
-                Post.is_hidden == False
-            )
+            # Posts fanned out to the user's timeline, plus any merged at read time
+            query, order = timeline.feed_query(user, app.config['FEED_FANOUT_MAX_FOLLOWERS'])
             
-            # Filter by preferred categories if set
-            if user.preferred_categories:
-                query = query.filter(
-                    Post.category.in_([PostCategory(cat) for cat in user.preferred_categories])
+            if cursor_requested():
+                items, pagination = cursor_paginate_posts(
+                    query, order, per_page, viewer_id=user_id, key_names=('created_at', 'id')
                 )
-            
-            posts = query.order_by(Post.created_at.desc()).paginate(
-                page=page, per_page=per_page, error_out=False
-            )
-            
-            return jsonify({
-                'posts': [post.to_dict(user_id=user_id) for post in posts.items],
-                'pagination': {
+            else:
+                items, posts = paginate_posts(
+                    query.order_by(*[column.desc() for column, _ in order]), page, per_page, viewer_id=user_id
+                )
+                pagination = {
                     'page': page,
                     'pages': posts.pages,
                     'per_page': per_page,
                     'total': posts.total
                 }
+            
+            return jsonify({
+                'posts': items,
+                'pagination': pagination
             })
             
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': 'Failed to fetch user feed'}), 500
     
@@ -712,6 +1079,8 @@ def create_app(config_name=None):
                 existing_user.last_seen = datetime.now(timezone.utc)
                 
                 db.session.commit()
+                # Names and avatars also appear on the user's posts in every listing
+                api_cache.invalidate('posts', f'user:{existing_user.id}', f'user:{existing_user.id}:posts')
                 
                 return jsonify({
                     'message': 'User updated successfully',
@@ -742,6 +1111,16 @@ def create_app(config_name=None):
             db.session.rollback()
             return jsonify({'error': 'Failed to sync user'}), 500
     
+    media = MediaProcessor(
+        app.config['UPLOAD_FOLDER'],
+        mode=app.config['MEDIA_PROCESSING'],
+        max_workers=app.config['MEDIA_WORKERS'],
+        pending_timeout=app.config['MEDIA_PENDING_TIMEOUT']
+    )
+    
+    def upload_url(filename):
+        return f'/api/uploads/{filename}'
+    
     @app.route('/api/upload', methods=['POST'])
     @limiter.limit("5/minute")
     def upload_file():
@@ -754,63 +1133,159 @@ def create_app(config_name=None):
                 return jsonify({'error': 'No file selected'}), 400
             
             if file and allowed_file(file.filename):
-                # Generate unique filename
-                filename = f"{uuid.uuid4()}.{file.filename.rsplit('.', 1)[1].lower()}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                folder = app.config['UPLOAD_FOLDER']
+                extension = file.filename.rsplit('.', 1)[1].lower()
                 
-                # Process image
-                if file.content_type.startswith('image/'):
-                    image = Image.open(file.stream)
-                    # Resize if too large
-                    if image.width > 1200 or image.height > 1200:
-                        image.thumbnail((1200, 1200), Image.Resampling.LANCZOS)
-                    
-                    # Convert to RGB if needed
-                    if image.mode in ('RGBA', 'P'):
-                        image = image.convert('RGB')
-                    
-                    image.save(filepath, 'JPEG', quality=85, optimize=True)
+                # Stored under the hash of its bytes; a repeat upload reuses the stored file and renditions
+                content_hash, filename, size = store_upload(file.stream, folder, extension)
+                asset = db.session.get(MediaAsset, content_hash)
+                duplicate = asset is not None
+                
+                if duplicate:
+                    if asset.original != filename:
+                        os.remove(os.path.join(folder, filename))  # Same bytes under another extension
+                    asset.last_uploaded_at = datetime.now(timezone.utc)
+                    db.session.commit()
                 else:
-                    file.save(filepath)
+                    is_image = file.content_type.startswith('image/')
+                    if is_image:
+                        # Only the header is parsed here; decoding and resizing happen in the media pool
+                        try:
+                            with Image.open(os.path.join(folder, filename)):
+                                pass
+                        except Exception:
+                            os.remove(os.path.join(folder, filename))
+                            return jsonify({'error': 'Invalid image file'}), 400
+                    
+                    asset = MediaAsset(
+                        content_hash=content_hash,
+                        original=filename,
+                        content_type=file.content_type,
+                        size_bytes=size,
+                        is_image=is_image
+                    )
+                    db.session.add(asset)
+                    try:
+                        db.session.commit()
+                    except IntegrityError:
+                        # The same bytes were stored by a concurrent upload
+                        db.session.rollback()
+                        asset = db.session.get(MediaAsset, content_hash)
+                        duplicate = True
+                
+                if not asset.is_image:
+                    return jsonify({
+                        'message': 'File uploaded successfully',
+                        'filename': asset.original,
+                        'url': upload_url(asset.original),
+                        'duplicate': duplicate
+                    }), 201
+                
+                # New uploads are queued; a duplicate only if its renditions failed or stalled
+                media.ensure(content_hash, asset.original)
+                manifest = read_manifest(folder, content_hash, upload_url)
+                full = manifest['renditions']['full']['jpeg']
                 
                 return jsonify({
                     'message': 'File uploaded successfully',
-                    'filename': filename,
-                    'url': f'/api/uploads/{filename}'
+                    'filename': full.rsplit('/', 1)[1],
+                    'url': full,
+                    'manifest': manifest,
+                    'duplicate': duplicate
                 }), 201
             
             return jsonify({'error': 'Invalid file type'}), 400
             
         except Exception as e:
+            db.session.rollback()
             return jsonify({'error': 'Failed to upload file'}), 500
     
+    @app.route('/api/uploads/<upload_id>/manifest')
+    def upload_manifest(upload_id):
+        manifest = read_manifest(app.config['UPLOAD_FOLDER'], secure_filename(upload_id), upload_url)
+        if manifest is None:
+            return jsonify({'error': 'Upload not found'}), 404
+        return jsonify(manifest)
+    
     @app.route('/api/uploads/<filename>')
     def uploaded_file(filename):
+        """Serve an upload.
+        
+        Content-addressed files never change, so they are cached for a year as
+        immutable with the filename as a strong ETag. With MEDIA_SERVE_MODE='accel'
+        the bytes are sent by the front proxy (X-Accel-Redirect) instead of Flask.
+        """
         try:
-            return send_file(
-                os.path.join(app.config['UPLOAD_FOLDER'], filename),
-                as_attachment=False
-            )
+            folder = app.config['UPLOAD_FOLDER']
+            filename = secure_filename(filename)
+            immutable = is_content_addressed(filename)
+            
+            if not os.path.exists(os.path.join(folder, filename)):
+                upload_id = upload_id_for(filename)
+                manifest = read_manifest(folder, upload_id, upload_url) if upload_id else None
+                if manifest is None:
+                    return jsonify({'error': 'File not found'}), 404
+                # Rendition not generated yet: serve the original meanwhile, without caching it under this URL
+                filename = manifest['original'].rsplit('/', 1)[1]
+                immutable = False
+            
+            if app.config['MEDIA_SERVE_MODE'] == 'accel':
+                response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+                response.headers['X-Accel-Redirect'] = app.config['MEDIA_ACCEL_PREFIX'] + filename
+                if immutable:
+                    # Revalidations are answered here without involving the proxy's file read
+                    response.set_etag(filename)
+                    response.make_conditional(request)
+                    if response.status_code == 304:
+                        del response.headers['X-Accel-Redirect']
+            else:
+                # Handles If-None-Match/If-Modified-Since (304) and Range (206)
+                response = send_file(
+                    os.path.join(folder, filename),
+                    as_attachment=False,
+                    conditional=True,
+                    etag=filename if immutable else True,
+                    max_age=31536000 if immutable else None
+                )
+            
+            if immutable:
+                response.cache_control.public = True
+                response.cache_control.max_age = 31536000
+                response.cache_control.immutable = True
+            else:
+                response.cache_control.no_cache = True
+            return response
         except Exception as e:
             return jsonify({'error': 'File not found'}), 404
     
-    @app.route('/api/stats', methods=['GET'])
-    def get_platform_stats():
-        try:
-            stats = {
+    def compute_platform_stats():
+        """Platform totals as (JSON body, ETag, modified); posts per category come from one GROUP BY"""
+        with app.app_context():
+            categories = dict(
+                db.session.query(Post.category, db.func.count())
+                .filter(Post.is_hidden == False)
+                .group_by(Post.category)
+                .all()
+            )
+            body = app.json.dumps({
                 'total_users': User.query.count(),
-                'total_posts': Post.query.filter_by(is_hidden=False).count(),
+                'total_posts': sum(categories.values()),
                 'total_comments': Comment.query.filter_by(is_hidden=False).count(),
                 'total_jobs': JobPost.query.filter_by(is_active=True).count(),
-                'categories': {}
-            }
-            
-            # Get posts by category
-            for category in PostCategory:
-                count = Post.query.filter_by(category=category, is_hidden=False).count()
-                stats['categories'][category.value] = count
-            
-            return jsonify(stats)
+                'categories': {category.value: categories.get(category, 0) for category in PostCategory}
+            })
+        etag = body_etag(body)
+        previous = platform_stats.value
+        unchanged = previous is not MISSING and previous[1] == etag
+        return body, etag, previous[2] if unchanged else time.time()
+    
+    # Served from memory; recomputed in the background at most every STATS_CACHE_TTL seconds
+    platform_stats = RefreshingValue(compute_platform_stats, app.config['STATS_CACHE_TTL'])
+    
+    @app.route('/api/stats', methods=['GET'])
+    def get_platform_stats():
+        try:
+            return conditional_json(*platform_stats.get())
             
         except Exception as e:
             return jsonify({'error': 'Failed to fetch stats'}), 500
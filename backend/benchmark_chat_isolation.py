@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Chat isolation demo for Astitva
+
+Starts the app on a local port with a deliberately slow fake chat model, floods
+/api/chat, and measures /api/health and /api/posts latency while the flood is
+in progress. Excess chat requests should be rejected immediately (503 with
+Retry-After) and the other endpoints should keep their normal latency.
+
+Usage:
+    python benchmark_chat_isolation.py [concurrent_chats]
+"""
+
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# Add the current directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('CHAT_MODEL_BACKEND', 'fake')
+os.environ.setdefault('CHAT_FAKE_DELAY', '5')
+os.environ.setdefault('CHAT_MAX_WORKERS', '2')
+os.environ.setdefault('CHAT_MAX_QUEUE', '2')
+os.environ.setdefault('CHAT_TIMEOUT', '3')
+os.environ.setdefault('CHAT_CACHE_ENABLED', 'false')
+
+import requests
+from werkzeug.serving import make_server
+
+from config import Config
+Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tempfile.mktemp(suffix='.db')}"
+Config.API_CACHE_ENABLED = False  # /api/posts must reach the database, not the response cache
+
+from app import create_app
+from models import db
+
+def timed_get(url, samples):
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        requests.get(url, timeout=30)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    concurrent_chats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    base = f'http://127.0.0.1:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    baseline_health = timed_get(f'{base}/api/health', 20)
+    baseline_posts = timed_get(f'{base}/api/posts', 20)
+
+    results = []
+    def chat(i):
+        start = time.perf_counter()
+        response = requests.post(f'{base}/api/chat', json={'query': f'question {i}'}, timeout=60)
+        results.append((response.status_code, response.headers.get('Retry-After'), (time.perf_counter() - start) * 1000))
+
+    threads = [threading.Thread(target=chat, args=(i,)) for i in range(concurrent_chats)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+
+    loaded_health = timed_get(f'{base}/api/health', 20)
+    loaded_posts = timed_get(f'{base}/api/posts', 20)
+
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    print(f"💬 {concurrent_chats} concurrent chats against a {os.environ['CHAT_FAKE_DELAY']}s fake model "
+          f"(workers={os.environ['CHAT_MAX_WORKERS']}, queue={os.environ['CHAT_MAX_QUEUE']}, "
+          f"timeout={os.environ['CHAT_TIMEOUT']}s)")
+    for status, count in sorted(Counter(status for status, _, _ in results).items()):
+        latencies = [ms for s, _, ms in results if s == status]
+        retry = {r for s, r, _ in results if s == status and r}
+        print(f"   HTTP {status}: {count} requests, median {statistics.median(latencies):.0f} ms"
+              + (f", Retry-After {sorted(retry)}" if retry else ''))
+    print("\n📊 Median latency (ms)      idle   during chat flood")
+    print(f"   /api/health          {baseline_health:8.1f} {loaded_health:10.1f}")
+    print(f"   /api/posts           {baseline_posts:8.1f} {loaded_posts:10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Concurrent counter load test for Astitva
+
+Starts the app on a local port and has many users vote on, comment on and
+award the same post (and vote on the same comment) at once. Afterwards every
+denormalized counter is compared with the rows it counts; with SQL-side
+increments none of them may have lost an update. Requests the database
+rejects under lock contention are retried, as a client would.
+
+Usage:
+    python benchmark_counter_concurrency.py [users]
+    VOTE_INGESTION=buffered python benchmark_counter_concurrency.py [users]
+"""
+
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# Add the current directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from werkzeug.serving import make_server
+
+from config import Config
+Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tempfile.mktemp(suffix='.db')}"
+Config.RATELIMIT_ENABLED = False
+
+from app import create_app
+from models import db, User, Post, Comment, Vote, VoteType, Award, PostCategory
+
+MAX_ATTEMPTS = 10
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        people = [
+            User(clerk_id=f'load{i}', username=f'load{i}', email=f'load{i}@example.com',
+                 first_name='Load', last_name='Test')
+            for i in range(users + 1)
+        ]
+        db.session.add_all(people)
+        db.session.flush()
+        author, voters = people[0].id, [user.id for user in people[1:]]
+        post = Post(title='Popular post', content='Everyone is here', category=PostCategory.CAREER,
+                    user_id=author, comments_count=1)
+        db.session.add(post)
+        db.session.flush()
+        comment = Comment(content='Popular comment', post_id=post.id, user_id=author)
+        db.session.add(comment)
+        db.session.commit()
+        post_id, comment_id = post.id, comment.id
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    base = f'http://127.0.0.1:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    statuses = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def send(path, payload):
+        for _ in range(MAX_ATTEMPTS):
+            start = time.perf_counter()
+            response = requests.post(f'{base}{path}', json=payload, timeout=60)
+            with lock:
+                statuses[response.status_code] += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code < 500:
+                return
+            time.sleep(0.01)
+
+    def act(i, user_id):
+        send(f'/api/posts/{post_id}/vote', {'user_id': user_id, 'vote_type': 'upvote'})
+        send(f'/api/comments/{comment_id}/vote', {'user_id': user_id, 'vote_type': 'downvote'})
+        send(f'/api/posts/{post_id}/comments', {'user_id': user_id, 'content': f'Comment {i}'})
+        send(f'/api/posts/{post_id}/award', {'user_id': user_id, 'award_type': 'helpful'})
+        if i % 2:
+            send(f'/api/posts/{post_id}/vote', {'user_id': user_id, 'vote_type': 'downvote'})
+        if i % 5 == 0:
+            send(f'/api/comments/{comment_id}/vote', {'user_id': user_id, 'vote_type': 'remove'})
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=act, args=(i, user_id)) for i, user_id in enumerate(voters)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    vote_buffer = app.extensions['vote_buffer']
+    if vote_buffer is not None:
+        vote_buffer.flush()  # Buffered vote counters are compared once written
+
+    with app.app_context():
+        post = db.session.get(Post, post_id)
+        comment = db.session.get(Comment, comment_id)
+        author_user = db.session.get(User, author)
+
+        def votes(vote_type, **target):
+            return Vote.query.filter_by(vote_type=vote_type, **target).count()
+
+        post_up, post_down = votes(VoteType.UPVOTE, post_id=post_id), votes(VoteType.DOWNVOTE, post_id=post_id)
+        comment_up, comment_down = votes(VoteType.UPVOTE, comment_id=comment_id), votes(VoteType.DOWNVOTE, comment_id=comment_id)
+        checks = [
+            ('post upvotes', post.upvotes, post_up),
+            ('post downvotes', post.downvotes, post_down),
+            ('post score', post.score, post_up - post_down),
+            ('post comments_count', post.comments_count, Comment.query.filter_by(post_id=post_id).count()),
+            ('post awards_count', post.awards_count, Award.query.filter_by(post_id=post_id).count()),
+            ('comment downvotes', comment.downvotes, comment_down),
+            ('comment score', comment.score, comment_up - comment_down),
+            ('author awards_received', author_user.awards_received, Award.query.filter_by(receiver_id=author).count()),
+            ('author karma', author_user.karma_score, post.score + comment.score),
+            ('awards_given (all voters)',
+             db.session.query(db.func.sum(User.awards_given)).filter(User.id.in_(voters)).scalar(),
+             Award.query.filter(Award.giver_id.in_(voters)).count()),
+        ]
+
+    print(f"🗳️  {users} users, {sum(statuses.values())} requests in {elapsed:.1f}s "
+          f"({sum(statuses.values()) / elapsed:.0f}/s, median {statistics.median(latencies):.0f} ms, "
+          f"vote ingestion: {app.config['VOTE_INGESTION']})")
+    for status, count in sorted(statuses.items()):
+        print(f"   HTTP {status}: {count}")
+
+    print("\n📊 Counter        stored    actual")
+    failed = False
+    for name, stored, actual in checks:
+        ok = stored == actual
+        failed = failed or not ok
+        print(f"   {'✅' if ok else '❌'} {name:<28} {stored:>6} {actual:>8}")
+
+    if failed:
+        print("\n❌ Lost updates detected")
+        sys.exit(1)
+    print("\n🎉 No lost updates")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Search latency benchmark for /api/posts
+
+Builds throwaway SQLite databases with synthetic posts and compares the
+full-text search path against the old ILIKE scan.
+
+Usage:
+    python benchmark_search.py                  # 10k, 100k and 1M posts
+    python benchmark_search.py 10000 100000     # custom sizes
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Add the current directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+QUERIES = ['salary negotiation', 'posh complaint', 'menstrual health', 'scholar', 'zzyzx']
+TOPIC_WORDS = [
+    'salary', 'negotiation', 'posh', 'complaint', 'menstrual', 'health', 'scholarship',
+    'career', 'interview', 'safety', 'legal', 'rights', 'finance', 'budget', 'mentor'
+]
+FILLER_WORDS = [f'word{i}' for i in range(5000)]
+
+def random_text(rng, length):
+    words = [rng.choice(FILLER_WORDS) for _ in range(length)]
+    if rng.random() < 0.05:
+        words[rng.randrange(length)] = rng.choice(TOPIC_WORDS)
+    return ' '.join(words)
+
+def time_request(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return statistics.median(timings)
+
+def benchmark(size, repeat=5):
+    from config import Config
+    db_path = tempfile.mktemp(suffix='.db')
+    Config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+    Config.RATELIMIT_ENABLED = False
+    Config.API_CACHE_ENABLED = False  # Repeated searches would otherwise time response cache hits
+
+    from app import create_app
+    from models import db, User, Post, PostCategory
+
+    app = create_app()
+    rng = random.Random(size)
+
+    with app.app_context():
+        db.create_all()
+        author = User(clerk_id='bench', username='bench', email='bench@example.com',
+                      first_name='Bench', last_name='User')
+        db.session.add(author)
+        db.session.commit()
+
+        print(f"📝 Inserting {size:,} posts...")
+        now = datetime.now(timezone.utc)
+        categories = list(PostCategory)
+        for offset in range(0, size, 10000):
+            db.session.execute(db.insert(Post), [
+                {
+                    'id': str(uuid.uuid4()),
+                    'title': random_text(rng, 8),
+                    'content': random_text(rng, 60),
+                    'category': rng.choice(categories),
+                    'user_id': author.id,
+                    'is_hidden': False,
+                    'created_at': now,
+                    'updated_at': now
+                }
+                for _ in range(min(10000, size - offset))
+            ])
+            db.session.commit()
+
+    client = app.test_client()
+    results = []
+    for search in QUERIES:
+        fts_ms = time_request(client, f'/api/posts?search={search}', repeat)
+
+        with app.app_context():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                Post.query.filter_by(is_hidden=False).filter(db.or_(
+                    Post.title.ilike(f'%{search}%'), Post.content.ilike(f'%{search}%')
+                )).order_by(Post.created_at.desc()).paginate(page=1, per_page=20, error_out=False)
+            like_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        results.append((search, fts_ms, like_ms))
+
+    os.remove(db_path)
+    return results
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+
+    report = []
+    for size in sizes:
+        for search, fts_ms, like_ms in benchmark(size):
+            report.append((size, search, fts_ms, like_ms))
+
+    print("\n📊 Search latency (median ms)")
+    print(f"{'posts':>10}  {'query':<20} {'full-text API':>14} {'ILIKE page':>12}")
+    for size, search, fts_ms, like_ms in report:
+        print(f"{size:>10,}  {search:<20} {fts_ms:>14.1f} {like_ms:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Caching primitives for Astitva
+
+LRUCache is a bounded, thread-safe in-process cache with per-entry TTLs.
+RedisCache is an optional shared tier so several workers see the same entries;
+CACHE_BACKEND='fake' backs it with InMemoryRedis, an in-process stand-in for
+tests and development. TieredCache puts the two together and keeps hit/miss
+statistics.
+RefreshingValue serves one computed value stale-while-revalidate.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def record_set(self):
+        with self._lock:
+            self.sets += 1
+
+    def to_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'sets': self.sets,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+        }
+
+class LRUCache:
+    """In-process cache bounded to max_entries, evicting the least recently used entry"""
+
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        """Store value only if key is absent or expired; returns whether it was stored"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def _put(self, key, value, ttl):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisCache:
+    """Shared cache tier in Redis; values are stored as JSON"""
+
+    def __init__(self, url, prefix='astitva:', default_ttl=300, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key, default=MISSING):
+        raw = self.client.get(self.prefix + key)
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+    def get_many(self, keys):
+        raws = self.client.mget([self.prefix + key for key in keys])
+        return [MISSING if raw is None else json.loads(raw) for raw in raws]
+
+    def add(self, key, value, ttl=None):
+        """Store value only if key is absent; returns whether it was stored"""
+        ttl = self.default_ttl if ttl is None else ttl
+        return bool(self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None, nx=True))
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+class InMemoryRedis:
+    """The subset of the redis client used by RedisCache, kept in process memory"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return None if entry is None else entry[0]
+
+    def mget(self, keys):
+        with self._lock:
+            return [entry[0] if entry else None for entry in map(self._live, keys)]
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            if isinstance(value, str):
+                value = value.encode()
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+            return True
+
+    def incr(self, key):
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[0]) + 1 if entry else 1
+            self._data[key] = (str(value).encode(), entry[1] if entry else None)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+# One fake "server" per process, shared by every cache created with CACHE_BACKEND='fake'
+FAKE_REDIS = InMemoryRedis()
+
+class TieredCache:
+    """Local LRU tier in front of an optional shared tier.
+
+    Shared-tier errors are treated as misses so an unavailable Redis never
+    breaks the request that is using the cache.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self.stats = CacheStats()
+
+    def get(self, key, default=None):
+        value = self.local.get(key)
+        if value is MISSING and self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception:
+                value = MISSING
+            if value is not MISSING:
+                self.local.set(key, value)
+        self.stats.record(value is not MISSING)
+        return default if value is MISSING else value
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, ttl)
+            except Exception:
+                pass
+        self.stats.record_set()
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            try:
+                self.shared.delete(key)
+            except Exception:
+                pass
+
+    def to_dict(self):
+        return {
+            **self.stats.to_dict(),
+            'local_entries': len(self.local),
+            'max_local_entries': self.local.max_entries,
+            'shared': self.shared is not None
+        }
+
+class RefreshingValue:
+    """A computed value kept in memory and recomputed in the background once older than ttl.
+
+    Only the very first get() waits for compute(); after that callers always get
+    the current value immediately, while at most one background thread refreshes
+    it. If a refresh fails the old value keeps being served and the refresh is
+    retried after another ttl.
+    """
+
+    def __init__(self, compute, ttl):
+        self.compute = compute
+        self.ttl = ttl
+        self.value = MISSING
+        self.computed_at = None
+        self.refreshing = False
+        self._lock = threading.Lock()
+        self._first = threading.Lock()
+
+    def get(self):
+        if self.value is MISSING:
+            with self._first:
+                if self.value is MISSING:
+                    self._store(self.compute())
+            return self.value
+
+        with self._lock:
+            stale = time.monotonic() - self.computed_at >= self.ttl
+            start = stale and not self.refreshing
+            if start:
+                self.refreshing = True
+        if start:
+            threading.Thread(target=self._refresh, daemon=True).start()
+        return self.value
+
+    def _store(self, value):
+        with self._lock:
+            self.value = value
+            self.computed_at = time.monotonic()
+
+    def _refresh(self):
+        try:
+            self._store(self.compute())
+        except Exception:
+            with self._lock:
+                self.computed_at = time.monotonic()
+        finally:
+            with self._lock:
+                self.refreshing = False
+
+    def age(self):
+        return None if self.computed_at is None else time.monotonic() - self.computed_at
+
+def create_shared_tier(config, prefix, ttl):
+    """RedisCache for CACHE_BACKEND 'redis' (or 'fake', in process), else None"""
+    backend = config.get('CACHE_BACKEND')
+    if backend == 'redis':
+        return RedisCache(config['REDIS_URL'], prefix=f'astitva:{prefix}:', default_ttl=ttl)
+    if backend == 'fake':
+        return RedisCache(None, prefix=f'astitva:{prefix}:', default_ttl=ttl, client=FAKE_REDIS)
+    return None
+
+def create_cache(config, prefix, max_entries, ttl):
+    """TieredCache with a shared tier when CACHE_BACKEND is 'redis' (or 'fake')"""
+    return TieredCache(LRUCache(max_entries=max_entries, default_ttl=ttl), create_shared_tier(config, prefix, ttl))
@@ -0,0 +1,379 @@
+"""
+Sakhi chat model access for Astitva
+
+Wraps the Gemini model behind a small factory so the chat endpoints can run
+against a local fake model offline, and provides the server-sent-event stream
+used by POST /api/chat/stream. Model calls run on a dedicated bounded thread
+pool with deadlines, queue backpressure and a circuit breaker, so a slow or
+failing upstream cannot occupy every web worker.
+"""
+
+import hashlib
+import json
+import math
+import queue
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import google.generativeai as genai
+
+FAKE_REPLY = (
+    "Namaste! 🌸 I'm Sakhi, running in offline mode. "
+    "For emergencies in India you can call the Women Helpline at 181 or the police at 112. "
+    "How else can I support you today?"
+)
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+class FakeStream:
+    """Iterator of chunks mimicking a streamed Gemini response"""
+
+    def __init__(self, chunks, chunk_delay):
+        self._chunks = iter(chunks)
+        self.chunk_delay = chunk_delay
+        self.cancelled = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.cancelled:
+            raise StopIteration
+        chunk = next(self._chunks)
+        time.sleep(self.chunk_delay)
+        return chunk
+
+    def cancel(self):
+        self.cancelled = True
+
+class FakeGenerativeModel:
+    """Offline stand-in for genai.GenerativeModel (CHAT_MODEL_BACKEND=fake)"""
+
+    def __init__(self, delay=0.0, chunk_delay=0.05, reply=FAKE_REPLY):
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.reply = reply
+
+    def generate_content(self, prompt, stream=False):
+        time.sleep(self.delay)
+        if stream:
+            words = self.reply.split(' ')
+            chunks = [FakeChunk(word + ('' if i == len(words) - 1 else ' ')) for i, word in enumerate(words)]
+            return FakeStream(chunks, self.chunk_delay)
+        return FakeChunk(self.reply)
+
+def create_chat_model(config):
+    """Build the model configured by CHAT_MODEL_BACKEND"""
+    if config['CHAT_MODEL_BACKEND'] == 'fake':
+        return FakeGenerativeModel(delay=config['CHAT_FAKE_DELAY'], chunk_delay=config['CHAT_FAKE_CHUNK_DELAY'])
+    return genai.GenerativeModel(config['CHAT_MODEL_NAME'])
+
+def normalize_query(query):
+    """Fold case, width and punctuation so trivially different phrasings share a cache entry"""
+    query = unicodedata.normalize('NFKC', query).casefold()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', query).split())
+
+class ChatResponseCache:
+    """Successful answers keyed by normalized query and a hash of the prompt template.
+
+    Changing the template (or the model) changes every key, so stale answers are
+    never served after a prompt update.
+    """
+
+    def __init__(self, cache, template, model_name=''):
+        self.cache = cache
+        self.template_hash = hashlib.sha256(f'{model_name}\n{template}'.encode()).hexdigest()[:16]
+
+    def key(self, query):
+        return hashlib.sha256(f'{self.template_hash}:{normalize_query(query)}'.encode()).hexdigest()
+
+    def get(self, query):
+        return self.cache.get(self.key(query))
+
+    def set(self, query, answer):
+        if answer:
+            self.cache.set(self.key(query), answer)
+
+    def to_dict(self):
+        return {'template_hash': self.template_hash, **self.cache.to_dict()}
+
+def cancel_stream(response):
+    """Stop an upstream streamed generation (gRPC call for Gemini, flag for the fake)"""
+    for target in (getattr(response, '_iterator', None), response):
+        cancel = getattr(target, 'cancel', None)
+        if callable(cancel):
+            cancel()
+            return
+
+def sse_event(data, event=None):
+    payload = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+def stream_cached(answer):
+    """SSE stream for an answer served from the response cache"""
+    yield sse_event({'token': answer})
+    yield sse_event({
+        'response': answer,
+        'chunks': 1,
+        'cached': True,
+        'time_to_first_token_ms': 0,
+        'total_ms': 0
+    }, event='done')
+
+def stream_chat(response, on_complete=None):
+    """Yield SSE chunks for a streamed answer, ending with a 'done' summary event.
+
+    response is the result of generate_content(prompt, stream=True). If the client
+    disconnects, the WSGI server closes this generator and the upstream iterator
+    is cancelled instead of generating the rest of the answer. on_complete
+    receives the full text of a successfully finished answer.
+    """
+    started = time.perf_counter()
+    first_token_at = None
+    parts = []
+    completed = False
+
+    try:
+        for chunk in response:
+            text = getattr(chunk, 'text', '')
+            if not text:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(text)
+            yield sse_event({'token': text})
+
+        completed = True
+        finished = time.perf_counter()
+        answer = ''.join(parts).strip()
+        if on_complete is not None:
+            on_complete(answer)
+        yield sse_event({
+            'response': answer,
+            'chunks': len(parts),
+            'time_to_first_token_ms': round(((first_token_at or finished) - started) * 1000),
+            'total_ms': round((finished - started) * 1000)
+        }, event='done')
+    except Exception as e:
+        completed = True
+        yield sse_event({
+            'error': "I apologize, but I'm having trouble connecting right now. Please try again later.",
+            'detail': str(e)
+        }, event='error')
+    finally:
+        if not completed:
+            cancel_stream(response)
+
+class ChatUnavailable(Exception):
+    """Raised instead of calling the model when it is overloaded, failing or too slow"""
+
+    def __init__(self, message, status=503, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Opens after consecutive failures and fails fast until reset_timeout has passed.
+
+    After the timeout a single trial call is let through (half-open); its outcome
+    closes the breaker again or restarts the timeout.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def release(self):
+        """Give back a trial whose call ended without an outcome, so the next call can try"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0
+        return max(math.ceil(self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+
+class ExecutorStream:
+    """Chunks produced on a pool thread, read by the request thread with an idle deadline"""
+
+    def __init__(self, chunks, cancelled, timeout, breaker):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self.timeout = timeout
+        self.breaker = breaker
+
+    def __iter__(self):
+        while True:
+            try:
+                kind, value = self._chunks.get(timeout=self.timeout)
+            except queue.Empty:
+                self.cancel()
+                self.breaker.record_failure()
+                raise ChatUnavailable('The assistant took too long to respond.', status=504)
+            if kind == 'chunk':
+                yield value
+            elif kind == 'error':
+                raise value
+            else:
+                return
+
+    def cancel(self):
+        self._cancelled.set()
+
+class ChatExecutor:
+    """Dedicated bounded pool for model calls.
+
+    At most max_workers calls run at once and max_queue more may wait; beyond
+    that requests are rejected immediately with a Retry-After derived from the
+    queue depth and recent call latency.
+    """
+
+    def __init__(self, max_workers=4, max_queue=8, timeout=30, breaker=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.in_flight = 0
+        self.avg_latency = float(timeout) / 4
+        self.rejected = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sakhi-chat')
+        self._lock = threading.Lock()
+
+    def wrap(self, model):
+        return ExecutorModel(self, model)
+
+    def retry_after(self):
+        waves = self.in_flight / self.max_workers
+        return max(math.ceil(waves * self.avg_latency), 1)
+
+    def _admit(self):
+        # Capacity first: a half-open breaker hands out its single trial in allow(),
+        # which must not be spent on a call that is then turned away as busy
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ChatUnavailable(
+                    'The assistant is busy right now. Please try again shortly.',
+                    retry_after=self.retry_after()
+                )
+            self.in_flight += 1
+        if not self.breaker.allow():
+            with self._lock:
+                self.in_flight -= 1
+            raise ChatUnavailable(
+                'The assistant is temporarily unavailable. Please try again shortly.',
+                retry_after=self.breaker.retry_after()
+            )
+
+    def _run(self, fn):
+        """Runs on a pool thread; frees the slot only when the upstream call really ends"""
+        started = time.monotonic()
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.avg_latency = 0.8 * self.avg_latency + 0.2 * (time.monotonic() - started)
+
+    def call(self, fn):
+        """Run fn on the pool and wait for it up to the deadline"""
+        self._admit()
+        future = self._pool.submit(self._run, fn)
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.breaker.record_failure()
+            raise ChatUnavailable('The assistant took too long to respond.', status=504)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def stream(self, start):
+        """Run a streaming call on the pool; chunks are handed over through a queue"""
+        self._admit()
+        chunks = queue.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            response = None
+            try:
+                response = start()
+                for chunk in response:
+                    if cancelled.is_set():
+                        cancel_stream(response)
+                        self.breaker.release()  # Abandoned, neither a success nor a failure
+                        return
+                    chunks.put(('chunk', chunk))
+                self.breaker.record_success()
+                chunks.put(('end', None))
+            except Exception as e:
+                self.breaker.record_failure()
+                chunks.put(('error', e))
+
+        self._pool.submit(self._run, produce)
+        return ExecutorStream(chunks, cancelled, self.timeout, self.breaker)
+
+    def to_dict(self):
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'rejected': self.rejected,
+            'avg_latency_ms': round(self.avg_latency * 1000),
+            'breaker': self.breaker.state
+        }
+
+class ExecutorModel:
+    """Model proxy whose generate_content runs on a ChatExecutor"""
+
+    def __init__(self, executor, model):
+        self.executor = executor
+        self.model = model
+
+    def generate_content(self, prompt, stream=False):
+        if stream:
+            return self.executor.stream(lambda: self.model.generate_content(prompt, stream=True))
+        return self.executor.call(lambda: self.model.generate_content(prompt))
@@ -0,0 +1,107 @@
+"""
+Threaded comment loading for Astitva
+
+Only the comments a response shows are loaded. The page of top-level comments
+(or of replies, for a continuation) is paged in SQL, then its subtree is loaded
+one level at a time down to the depth limit, with one query per level for the
+best replies_limit replies of every parent. How many replies a comment has is
+read from its replies_count column, so announcing the rest in more_replies
+costs no COUNT. Branches that are cut off by the depth or per-node reply limit
+carry a continuation token that the client sends back to load more replies.
+"""
+
+import base64
+import json
+
+from models import db, Comment, Vote
+
+class InvalidContinuationToken(ValueError):
+    pass
+
+def encode_continuation(parent_id, offset):
+    payload = json.dumps({'p': parent_id, 'o': offset}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_continuation(token):
+    """Return (parent_id, offset) from a token produced by encode_continuation"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(payload['p']), max(int(payload['o']), 0)
+    except Exception:
+        raise InvalidContinuationToken('Invalid continuation token')
+
+def visible_comments(post_id):
+    return Comment.query.filter_by(post_id=post_id, is_hidden=False)
+
+def reply_order():
+    """Replies are ranked by score, newest first among equals"""
+    return (db.func.coalesce(Comment.score, 0).desc(), Comment.created_at.desc(), Comment.id.desc())
+
+class CommentThread:
+    """A window of sibling comments with their replies, down to a depth limit"""
+
+    def __init__(self):
+        self.children = {}
+
+    @classmethod
+    def load(cls, comments, depth, replies_limit):
+        """Load the subtrees of comments; depth counts the comments themselves as level 1"""
+        thread = cls()
+        level = comments
+        for _ in range(depth - 1):
+            parent_ids = [comment.id for comment in level if comment.replies_count]
+            if not parent_ids:
+                break
+            level = thread._load_replies(parent_ids, replies_limit)
+        return thread
+
+    def _load_replies(self, parent_ids, limit):
+        """The first limit replies of each parent, in one windowed query"""
+        rank = db.func.row_number().over(partition_by=Comment.parent_id, order_by=reply_order()).label('rank')
+        ranked = db.select(Comment.id, rank).where(
+            Comment.parent_id.in_(parent_ids),
+            Comment.is_hidden == False
+        ).subquery()
+        rows = db.session.query(Comment, ranked.c.rank).options(db.joinedload(Comment.author)).join(
+            ranked, ranked.c.id == Comment.id
+        ).filter(ranked.c.rank <= limit).all()
+        # At most limit rows per parent; ordering them here spares the database a sort
+        replies = [reply for reply, _ in sorted(rows, key=lambda row: row[1])]
+        for reply in replies:
+            self.children.setdefault(reply.parent_id, []).append(reply)
+        return replies
+
+    def replies_to(self, parent_id):
+        return self.children.get(parent_id, [])
+
+    def serialize(self, comments, user_id=None, depth=2):
+        """Serialize a list of sibling comments with their loaded subtrees.
+
+        The viewer's votes for every comment in the output are resolved with one query.
+        """
+        shown = []
+        self._collect(comments, depth, shown)
+        user_votes = Vote.get_comment_votes(user_id, [c.id for c in shown])
+        return [self._serialize(c, depth, user_votes) for c in comments]
+
+    def _collect(self, comments, depth, shown):
+        for comment in comments:
+            shown.append(comment)
+            if depth > 1:
+                self._collect(self.replies_to(comment.id), depth - 1, shown)
+
+    def _serialize(self, comment, depth, user_votes):
+        data = comment.to_dict(include_replies=False, user_votes=user_votes)
+
+        shown = self.replies_to(comment.id) if depth > 1 else []
+        if shown:
+            data['replies'] = [self._serialize(c, depth - 1, user_votes) for c in shown]
+
+        remaining = (comment.replies_count or 0) - len(shown)
+        if remaining > 0:
+            data['more_replies'] = {
+                'count': remaining,
+                'continuation': encode_continuation(comment.id, len(shown))
+            }
+        return data
@@ -17,6 +17,56 @@ class Config:
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Read replica for the SELECTs of GET requests (see db_routing.py); unset to read from the primary
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    if REPLICA_DATABASE_URL and REPLICA_DATABASE_URL.startswith('postgres://'):
+        REPLICA_DATABASE_URL = REPLICA_DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+    # A client that wrote keeps reading from the primary this long, to see its own writes despite replica lag
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    
+    # Engine profiles per backend: SQLite files are local, server databases get a sized, pinged, recycled pool
+    DB_ENGINE_PROFILES = {
+        'sqlite': {
+            'query_cache_size': int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 500))
+        },
+        'server': {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            'query_cache_size': int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 500))
+        }
+    }
+    # Applied to every new SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    }
+    
+    # Post listings serialize from joined row tuples ('rows') or ORM instances ('orm')
+    POST_LISTING_SERIALIZER = os.environ.get('POST_LISTING_SERIALIZER', 'rows')
+    
+    # Ranking refresh (maintenance.py refresh-rankings): posts younger than this many days, 0 for all
+    RANKING_REFRESH_DAYS = int(os.environ.get('RANKING_REFRESH_DAYS', 30))
+    
+    # Home timelines: authors above this follower count are merged at read time instead of fanned out
+    FEED_FANOUT_MAX_FOLLOWERS = int(os.environ.get('FEED_FANOUT_MAX_FOLLOWERS', 10000))
+    FEED_TIMELINE_MAX_ENTRIES = int(os.environ.get('FEED_TIMELINE_MAX_ENTRIES', 1000))
+    FEED_BACKFILL_POSTS = 50
+    
+    # /api/stats payload is recomputed in the background at most this often (seconds)
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 60))
+    
+    # Cursor pagination: seconds an ?include_total=1 count is reused
+    APPROX_COUNT_TTL = int(os.environ.get('APPROX_COUNT_TTL', 300))
+    
+    # Comment threads (levels include the top-level comment)
+    COMMENT_TREE_DEPTH = 2
+    COMMENT_TREE_MAX_DEPTH = 10
+    COMMENT_TREE_REPLIES_LIMIT = 10
+    
     # JWT Configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or SECRET_KEY
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
@@ -25,6 +75,23 @@ class Config:
     # Redis Configuration
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
+    # Cache backend for shared caches: 'memory' (per process), 'redis', or 'fake' (in-process stand-in for Redis)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    
+    # API response cache for GET endpoints, invalidated by writes (see api_cache.py); TTLs in seconds.
+    # 'auto' caches only where an invalidation reaches every worker (see api_cache_enabled)
+    API_CACHE_ENABLED = os.environ.get('API_CACHE_ENABLED', 'auto').lower()
+    # Worker processes serving the app (gunicorn also reads it as its default -w)
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+    API_CACHE_MAX_ENTRIES = int(os.environ.get('API_CACHE_MAX_ENTRIES', 5000))
+    API_CACHE_TTLS = {
+        'posts': 30,
+        'comments': 30,
+        'user_posts': 60,
+        'user_profile': 120,
+        'jobs': 300,
+    }
+    
     # Rate Limiting
     RATELIMIT_STORAGE_URL = REDIS_URL
     RATELIMIT_DEFAULT = "100/hour"
@@ -34,11 +101,50 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     
-    # AI Configuration
+    # Image renditions: 'pool' (background worker processes) or 'inline' (in the request)
+    MEDIA_PROCESSING = os.environ.get('MEDIA_PROCESSING', 'pool')
+    MEDIA_WORKERS = int(os.environ['MEDIA_WORKERS']) if os.environ.get('MEDIA_WORKERS') else None  # None: one per core
+    MEDIA_PENDING_TIMEOUT = int(os.environ.get('MEDIA_PENDING_TIMEOUT', 600))  # Seconds before a repeat upload requeues 'pending' work
+    UPLOAD_GC_GRACE_HOURS = 24  # maintenance.py gc-uploads keeps unreferenced uploads this long
+    
+    # Serving uploads: 'local' (Flask sends the file) or 'accel' (X-Accel-Redirect to MEDIA_ACCEL_PREFIX
+    # on the front proxy, e.g. an nginx `internal` location aliased to UPLOAD_FOLDER)
+    MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'local')
+    MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/_uploads/')
+    
+    # Vote ingestion: 'direct' (counters updated in the request) or 'buffered' (summed in memory and
+    # written every VOTE_FLUSH_INTERVAL seconds, or once VOTE_FLUSH_MAX_PENDING items are waiting)
+    VOTE_INGESTION = os.environ.get('VOTE_INGESTION', 'direct')
+    VOTE_FLUSH_INTERVAL = float(os.environ.get('VOTE_FLUSH_INTERVAL', 1.0))
+    VOTE_FLUSH_MAX_PENDING = int(os.environ.get('VOTE_FLUSH_MAX_PENDING', 1000))
+    
+    # Post views are counted once per viewer per VIEW_DEDUPE_WINDOW seconds and written every VIEW_FLUSH_INTERVAL
+    VIEW_DEDUPE_WINDOW = int(os.environ.get('VIEW_DEDUPE_WINDOW', 30 * 60))
+    VIEW_DEDUPE_MAX_ENTRIES = int(os.environ.get('VIEW_DEDUPE_MAX_ENTRIES', 100000))
+    VIEW_FLUSH_INTERVAL = float(os.environ.get('VIEW_FLUSH_INTERVAL', 10))
+    VIEW_FLUSH_MAX_PENDING = int(os.environ.get('VIEW_FLUSH_MAX_PENDING', 5000))
+    
+    # AI Configuration ('fake' runs a local stand-in model for offline development and tests)
+    CHAT_MODEL_BACKEND = os.environ.get('CHAT_MODEL_BACKEND', 'gemini')
+    CHAT_MODEL_NAME = os.environ.get('CHAT_MODEL_NAME', 'gemini-1.5-flash')
+    CHAT_FAKE_DELAY = float(os.environ.get('CHAT_FAKE_DELAY', 0))
+    CHAT_FAKE_CHUNK_DELAY = float(os.environ.get('CHAT_FAKE_CHUNK_DELAY', 0.05))
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
-    if not GEMINI_API_KEY:
+    if not GEMINI_API_KEY and CHAT_MODEL_BACKEND == 'gemini':
         raise ValueError("GEMINI_API_KEY environment variable is required")
     
+    # Chat model calls run on a dedicated bounded pool (per worker process)
+    CHAT_MAX_WORKERS = int(os.environ.get('CHAT_MAX_WORKERS', 4))
+    CHAT_MAX_QUEUE = int(os.environ.get('CHAT_MAX_QUEUE', 8))
+    CHAT_TIMEOUT = float(os.environ.get('CHAT_TIMEOUT', 30))
+    CHAT_BREAKER_THRESHOLD = int(os.environ.get('CHAT_BREAKER_THRESHOLD', 5))
+    CHAT_BREAKER_RESET = float(os.environ.get('CHAT_BREAKER_RESET', 30))
+    
+    # Chat answer cache (shared across workers when CACHE_BACKEND is 'redis')
+    CHAT_CACHE_ENABLED = os.environ.get('CHAT_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    CHAT_CACHE_TTL = int(os.environ.get('CHAT_CACHE_TTL', 6 * 60 * 60))
+    CHAT_CACHE_MAX_ENTRIES = int(os.environ.get('CHAT_CACHE_MAX_ENTRIES', 1000))
+    
     # Email Configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
@@ -0,0 +1,103 @@
+"""
+Database engines and read-replica routing for Astitva
+
+engine_options() picks the engine profile for a database URL from
+DB_ENGINE_PROFILES: SQLite files keep SQLAlchemy's own pooling, server
+databases get a pool that is sized, pinged before use and recycled before the
+server drops idle connections. Every new SQLite connection also gets the
+SQLITE_PRAGMAS (WAL journal, synchronous=NORMAL, memory-mapped reads), and
+builds without SQLite's math functions get Python's sqrt and power, which the
+ranking expressions in ranking.py use.
+
+With REPLICA_DATABASE_URL set, the replica is registered as the 'replica' bind
+and RoutingSession sends the SELECTs of GET and HEAD requests there. Writes,
+flushes, SELECT ... FOR UPDATE, other request methods, background threads and
+offline commands all use the primary. Once a request from a client commits, that
+client (by remote address) reads from the primary for REPLICA_STICKY_SECONDS,
+so it sees its own writes however far the replica lags; the marks live in the
+shared cache tier when there is one, so every worker honours them.
+"""
+
+import math
+
+from flask import g, has_app_context, has_request_context, request
+from flask_limiter.util import get_remote_address
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND = 'replica'
+SAFE_METHODS = ('GET', 'HEAD')
+
+def engine_options(url, config):
+    """Engine options for a database URL, from the profile of its backend"""
+    profile = 'sqlite' if make_url(url).get_backend_name() == 'sqlite' else 'server'
+    return dict(config['DB_ENGINE_PROFILES'][profile])
+
+def configure_engines(app):
+    """Set engine options and the replica bind; call before db.init_app(app)"""
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config['SQLALCHEMY_DATABASE_URI'], config),
+        **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    if config.get('REPLICA_DATABASE_URL'):
+        config['SQLALCHEMY_BINDS'] = {
+            **config.get('SQLALCHEMY_BINDS', {}),
+            REPLICA_BIND: {'url': config['REPLICA_DATABASE_URL'], **engine_options(config['REPLICA_DATABASE_URL'], config)}
+        }
+
+def install_sqlite_pragmas(engines, pragmas):
+    """Run PRAGMA statements on every new connection of the SQLite engines, and add missing math functions"""
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        try:
+            cursor.execute('SELECT sqrt(1), power(1, 1)')
+        except Exception:
+            dbapi_connection.create_function('sqrt', 1, math.sqrt, deterministic=True)
+            dbapi_connection.create_function('power', 2, math.pow, deterministic=True)
+        cursor.close()
+
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', set_pragmas)
+
+class RoutingSession(Session):
+    """Session that reads from the replica bind during GET and HEAD requests"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and reads_from_replica()
+                and getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _mark_write(session):
+    if has_request_context():
+        g.db_wrote = True
+
+def reads_from_replica():
+    return has_app_context() and g.get('db_replica', False)
+
+def install_replica_routing(app, sticky):
+    """Route GET and HEAD reads to the replica bind; `sticky` is a cache holding recent writers"""
+    ttl = app.config['REPLICA_STICKY_SECONDS']
+
+    @app.before_request
+    def choose_database():
+        if request.method not in SAFE_METHODS:
+            return
+        if sticky.get(get_remote_address()) is not None:
+            g.read_your_writes = True  # ApiCache serves these clients fresh bodies
+        else:
+            g.db_replica = True
+
+    @app.after_request
+    def remember_writer(response):
+        if g.get('db_wrote') and ttl > 0:
+            sticky.set(get_remote_address(), True, ttl)
+        return response
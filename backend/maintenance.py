@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Offline maintenance commands for Astitva
+
+Usage:
+    python maintenance.py reconcile-karma
+    python maintenance.py reconcile-votes
+    python maintenance.py repair-counters
+    python maintenance.py repair-reply-counts
+    python maintenance.py rebuild-search-index
+    python maintenance.py refresh-rankings
+    python maintenance.py prune-timelines
+    python maintenance.py rebuild-timelines
+    python maintenance.py gc-uploads
+    python maintenance.py sync-replica
+"""
+
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from flask import current_app
+
+# Add the current directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db, User, Post, Comment, Vote, VoteType, MediaAsset, user_followers
+from search import SEARCH_INDEXES
+from ranking import hot_scores, best_scores
+from timeline import trim_timelines, rebuild_timelines
+from media import asset_files, asset_hash
+from db_routing import REPLICA_BIND
+
+def reconcile_karma():
+    """Recompute every user's karma from post and comment scores with one grouped aggregate query"""
+    content = db.union_all(
+        db.select(
+            Post.user_id.label('user_id'),
+            db.func.coalesce(Post.score, 0).label('post_score'),
+            db.literal(0).label('comment_score')
+        ),
+        db.select(
+            Comment.user_id,
+            db.literal(0),
+            db.func.coalesce(Comment.score, 0)
+        )
+    ).subquery()
+
+    totals = db.session.execute(
+        db.select(
+            content.c.user_id,
+            db.func.sum(content.c.post_score),
+            db.func.sum(content.c.comment_score)
+        ).group_by(content.c.user_id)
+    ).all()
+
+    # Users without content fall back to zero, everyone else gets their aggregate
+    db.session.execute(db.update(User).values(post_karma=0, comment_karma=0, karma_score=0))
+    if totals:
+        db.session.execute(db.update(User), [
+            {
+                'id': user_id,
+                'post_karma': post_karma,
+                'comment_karma': comment_karma,
+                'karma_score': post_karma + comment_karma
+            }
+            for user_id, post_karma, comment_karma in totals
+        ])
+
+    db.session.commit()
+    print(f"✅ Reconciled karma for {len(totals)} users with content")
+
+def reconcile_vote_counts():
+    """Recount post and comment votes from the Vote rows, then reconcile karma from the corrected scores.
+
+    Buffered vote deltas (VOTE_INGESTION=buffered) that were never flushed, e.g.
+    because a worker crashed, leave counters that no longer match the stored
+    votes. One correlated UPDATE per table rewrites only the drifted rows, with
+    their rankings; updated_at is kept, as a recount is not an edit. Run it while
+    no worker holds pending deltas, or those votes are counted twice.
+    """
+    repaired = {}
+    for model, target in ((Post, Vote.post_id), (Comment, Vote.comment_id)):
+        def tally(vote_type):
+            return db.select(db.func.count()).where(target == model.id, Vote.vote_type == vote_type).scalar_subquery()
+
+        upvotes, downvotes = tally(VoteType.UPVOTE), tally(VoteType.DOWNVOTE)
+        values = {'upvotes': upvotes, 'downvotes': downvotes, 'score': upvotes - downvotes, 'updated_at': model.updated_at}
+        if model is Post:
+            values.update(Post.ranking_updates(values))
+        repaired[model.__tablename__] = db.session.execute(
+            db.update(model).where(db.or_(
+                db.func.coalesce(model.upvotes, 0) != upvotes,
+                db.func.coalesce(model.downvotes, 0) != downvotes
+            )).values(values)
+        ).rowcount
+
+    db.session.commit()
+    print(f"✅ Recounted votes for {repaired['posts']} posts and {repaired['comments']} comments")
+    reconcile_karma()
+
+def repair_social_counters():
+    """Rebuild followers/following/posts/comments counters on every user from grouped aggregates"""
+    aggregates = {
+        'followers_count': db.select(
+            user_followers.c.followed_id, db.func.count()
+        ).group_by(user_followers.c.followed_id),
+        'following_count': db.select(
+            user_followers.c.follower_id, db.func.count()
+        ).group_by(user_followers.c.follower_id),
+        'posts_count': db.select(
+            Post.user_id, db.func.count()
+        ).where(Post.is_hidden == False).group_by(Post.user_id),
+        'comments_count': db.select(
+            Comment.user_id, db.func.count()
+        ).where(db.or_(Comment.is_deleted == False, Comment.is_deleted.is_(None))).group_by(Comment.user_id),
+    }
+
+    counters = {}
+    for column, query in aggregates.items():
+        for user_id, count in db.session.execute(query):
+            counters.setdefault(user_id, {})[column] = count
+
+    db.session.execute(db.update(User).values(**{column: 0 for column in aggregates}))
+    if counters:
+        db.session.execute(db.update(User), [
+            {'id': user_id, **values} for user_id, values in counters.items()
+        ])
+
+    db.session.commit()
+    print(f"✅ Repaired social counters for {len(counters)} users")
+
+def repair_reply_counts():
+    """Recount every comment's visible direct replies with one grouped aggregate query"""
+    counts = db.session.execute(
+        db.select(Comment.parent_id, db.func.count()).where(
+            Comment.parent_id.isnot(None),
+            db.or_(Comment.is_hidden == False, Comment.is_hidden.is_(None))
+        ).group_by(Comment.parent_id)
+    ).all()
+
+    db.session.execute(db.update(Comment).values(replies_count=0))
+    if counts:
+        db.session.execute(db.update(Comment), [
+            {'id': parent_id, 'replies_count': count} for parent_id, count in counts
+        ])
+
+    db.session.commit()
+    print(f"✅ Repaired reply counts for {len(counts)} comments with replies")
+
+def rebuild_search_index():
+    """Recreate full-text indexes and repopulate them from the source tables (e.g. after a VACUUM)"""
+    with db.engine.begin() as connection:
+        for index in SEARCH_INDEXES:
+            index.install(connection)
+            index.rebuild(connection)
+    print(f"✅ Rebuilt {len(SEARCH_INDEXES)} search indexes")
+
+def naive_utc(value):
+    """SQLite hands back naive UTC datetimes, PostgreSQL aware ones; numpy wants naive"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def refresh_rankings(window_days=None, batch_size=5000):
+    """Recompute hot and best scores in vectorized batches so hot scores decay without activity.
+
+    Only visible posts created in the last RANKING_REFRESH_DAYS days are refreshed
+    (0 or window_days=0 refreshes every post); older hot scores are already close
+    to zero and no longer move the ranking. Run it periodically, e.g. from cron.
+    """
+    if window_days is None:
+        window_days = current_app.config['RANKING_REFRESH_DAYS']
+    now = datetime.now(timezone.utc)
+
+    query = db.select(
+        Post.id, Post.upvotes, Post.downvotes, Post.comments_count, Post.awards_count,
+        Post.created_at, Post.updated_at
+    ).where(Post.is_hidden == False).order_by(Post.id).limit(batch_size)
+    if window_days:
+        query = query.where(Post.created_at >= now - timedelta(days=window_days))
+
+    refreshed, last_id = 0, None
+    while True:
+        rows = db.session.execute(query if last_id is None else query.where(Post.id > last_id)).all()
+        if not rows:
+            break
+        ids, upvotes, downvotes, comments, awards, created, updated = zip(*rows)
+
+        def counts(values):
+            return np.array([value or 0 for value in values], dtype=float)
+
+        created_at = np.array([naive_utc(value or now) for value in created], dtype='datetime64[us]')
+        age_hours = (np.datetime64(naive_utc(now), 'us') - created_at) / np.timedelta64(1, 'h')
+
+        up, down = counts(upvotes), counts(downvotes)
+        hot = hot_scores(up, down, counts(comments), counts(awards), age_hours)
+        best = best_scores(up, down)
+
+        # updated_at is passed through unchanged so a ranking refresh is not an edit
+        db.session.execute(db.update(Post), [
+            {'id': ids[i], 'hot_score': float(hot[i]), 'best_score': float(best[i]), 'updated_at': updated[i]}
+            for i in range(len(ids))
+        ])
+        db.session.commit()
+        refreshed += len(ids)
+        last_id = ids[-1]
+
+    print(f"✅ Refreshed rankings for {refreshed} posts")
+
+def prune_timelines():
+    """Trim every home timeline to FEED_TIMELINE_MAX_ENTRIES entries"""
+    removed = trim_timelines(current_app.config['FEED_TIMELINE_MAX_ENTRIES'])
+    db.session.commit()
+    print(f"✅ Removed {removed} old timeline entries")
+
+def rebuild_home_timelines():
+    """Recreate every home timeline from follows and posts (e.g. after changing FEED_FANOUT_MAX_FOLLOWERS)"""
+    rebuild_timelines(
+        current_app.config['FEED_FANOUT_MAX_FOLLOWERS'],
+        current_app.config['FEED_TIMELINE_MAX_ENTRIES']
+    )
+    db.session.commit()
+    print("✅ Rebuilt home timelines")
+
+def gc_uploads(grace_hours=None):
+    """Recount upload references and delete uploads that no post or profile uses.
+
+    Uploads seen within the last UPLOAD_GC_GRACE_HOURS are kept, since they may
+    be about to be attached to a post.
+    """
+    config = current_app.config
+    grace_hours = config['UPLOAD_GC_GRACE_HOURS'] if grace_hours is None else grace_hours
+    folder = config['UPLOAD_FOLDER']
+
+    references = Counter()
+    for (url,) in db.session.execute(db.select(Post.image_url).where(Post.image_url.isnot(None))):
+        references[asset_hash(url)] += 1
+    for (url,) in db.session.execute(db.select(User.avatar_url).where(User.avatar_url.isnot(None))):
+        references[asset_hash(url)] += 1
+
+    stored = set(db.session.execute(db.select(MediaAsset.content_hash)).scalars())
+    db.session.execute(db.update(MediaAsset).values(ref_count=0))
+    counted = [{'content_hash': content_hash, 'ref_count': count} for content_hash, count in references.items() if content_hash in stored]
+    if counted:
+        db.session.execute(db.update(MediaAsset), counted)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    orphans = MediaAsset.query.filter(MediaAsset.ref_count == 0, MediaAsset.last_uploaded_at < cutoff).all()
+    freed = 0
+    for asset in orphans:
+        for filename in asset_files(asset.content_hash, asset.original):
+            path = os.path.join(folder, filename)
+            if os.path.exists(path):
+                freed += os.path.getsize(path)
+                os.remove(path)
+        db.session.delete(asset)
+    db.session.commit()
+
+    # Temporary files left behind by interrupted uploads
+    for filename in os.listdir(folder):
+        path = os.path.join(folder, filename)
+        if filename.endswith('.tmp') and os.path.getmtime(path) < time.time() - grace_hours * 3600:
+            os.remove(path)
+
+    print(f"✅ Removed {len(orphans)} unreferenced uploads ({freed / 1024 / 1024:.1f} MB)")
+
+def sync_replica():
+    """Copy the primary SQLite database over the replica file, standing in for replication when testing locally"""
+    replica = db.engines.get(REPLICA_BIND)
+    primary = db.engines[None]
+    if replica is None:
+        print("❌ REPLICA_DATABASE_URL is not set")
+        return
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        print("❌ sync-replica only copies SQLite files; server databases replicate themselves")
+        return
+
+    source, target = primary.raw_connection(), replica.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        source.close()
+        target.close()
+    print(f"✅ Copied {primary.url.database} to {replica.url.database}")
+
+COMMANDS = {
+    'reconcile-karma': reconcile_karma,
+    'reconcile-votes': reconcile_vote_counts,
+    'repair-counters': repair_social_counters,
+    'repair-reply-counts': repair_reply_counts,
+    'rebuild-search-index': rebuild_search_index,
+    'refresh-rankings': refresh_rankings,
+    'prune-timelines': prune_timelines,
+    'rebuild-timelines': rebuild_home_timelines,
+    'gc-uploads': gc_uploads,
+    'sync-replica': sync_replica,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Astitva maintenance commands')
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        COMMANDS[args.command]()
+
+if __name__ == "__main__":
+    main()
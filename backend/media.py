@@ -0,0 +1,213 @@
+"""
+Image renditions for Astitva uploads
+
+An upload is written to UPLOAD_FOLDER as-is and answered straight away with a
+manifest of rendition URLs in 'pending' state. A process pool then decodes the
+original once and writes a thumbnail, medium and full size, each as JPEG and
+WebP, followed by a <upload_id>.json manifest marking the upload 'ready'.
+Until a rendition exists its URL serves the original file. A repeat upload
+queues the work again if the manifest says 'failed', or has said 'pending' for
+longer than MEDIA_PENDING_TIMEOUT (the worker died or the server restarted).
+
+Files are named by the SHA-256 of their bytes, so uploading the same file again
+reuses the stored original and its renditions without any image work. Each
+file has a MediaAsset row whose ref_count tracks the posts and profiles using
+it; `python maintenance.py gc-uploads` removes unreferenced files.
+
+MEDIA_PROCESSING='inline' renders in the request instead (tests, development).
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+RENDITIONS = {
+    'thumb': 160,
+    'medium': 640,
+    'full': 1200,
+}
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+
+RENDITION_RE = re.compile(r'^(?P<upload_id>[\w-]+)_(?P<rendition>[a-z]+)\.(?:jpg|webp)$')
+CONTENT_ADDRESSED_RE = re.compile(r'^[0-9a-f]{64}(?:_[a-z]+)?\.\w+$')
+ASSET_URL_RE = re.compile(r'/api/uploads/(?P<content_hash>[0-9a-f]{64})(?:_[a-z]+)?\.\w+$')
+
+def rendition_filename(upload_id, rendition, image_format):
+    return f"{upload_id}_{rendition}.{FORMATS[image_format][0]}"
+
+def manifest_filename(upload_id):
+    return f"{upload_id}.json"
+
+def upload_id_for(filename):
+    """The upload a rendition filename belongs to, or None"""
+    match = RENDITION_RE.match(filename)
+    return match.group('upload_id') if match else None
+
+def is_content_addressed(filename):
+    """Whether the bytes behind this filename can never change (original or rendition of a hashed upload)"""
+    return bool(CONTENT_ADDRESSED_RE.match(filename))
+
+def asset_hash(url):
+    """Content hash of the stored upload a URL points at, or None"""
+    match = ASSET_URL_RE.search(url or '')
+    return match.group('content_hash') if match else None
+
+def store_upload(stream, folder, extension, chunk_size=1024 * 1024):
+    """Save an upload under the SHA-256 of its bytes.
+
+    Returns (content_hash, filename, size). The file is hashed while it is
+    written to a temporary name; identical bytes end up at the same path.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(folder, f".{uuid.uuid4()}.upload.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+
+        content_hash = digest.hexdigest()
+        filename = f"{content_hash}.{extension}"
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        return content_hash, filename, size
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def asset_files(content_hash, original):
+    """Every file belonging to a stored upload, whether or not it exists yet"""
+    return [original, manifest_filename(content_hash)] + [
+        rendition_filename(content_hash, name, image_format) for name in RENDITIONS for image_format in FORMATS
+    ]
+
+def build_manifest(upload_id, original, url_for, status, sizes=None):
+    sizes = sizes or {}
+    return {
+        'id': upload_id,
+        'status': status,
+        'original': url_for(original),
+        'renditions': {
+            name: {
+                **{image_format: url_for(rendition_filename(upload_id, name, image_format)) for image_format in FORMATS},
+                **({'width': sizes[name][0], 'height': sizes[name][1]} if name in sizes else {})
+            }
+            for name in RENDITIONS
+        }
+    }
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)  # Readers never see a half-written manifest
+
+def render_renditions(folder, upload_id, original):
+    """Write every rendition of folder/original and then its manifest; runs in a worker process.
+
+    Returns {rendition: (width, height)}.
+    """
+    manifest_path = os.path.join(folder, manifest_filename(upload_id))
+    try:
+        with Image.open(os.path.join(folder, original)) as source:
+            image = ImageOps.exif_transpose(source)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+
+            sizes = {}
+            # Largest first, so each smaller size is resampled from the previous one
+            for name, edge in sorted(RENDITIONS.items(), key=lambda item: -item[1]):
+                if image.width > edge or image.height > edge:
+                    image = image.copy()
+                    image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+                sizes[name] = image.size
+                for image_format, (extension, options) in FORMATS.items():
+                    path = os.path.join(folder, rendition_filename(upload_id, name, image_format))
+                    image.save(f"{path}.tmp", image_format.upper(), **options)
+                    os.replace(f"{path}.tmp", path)
+
+        _write_json(manifest_path, {'status': 'ready', 'original': original, 'sizes': sizes})
+        return sizes
+    except Exception as e:
+        _write_json(manifest_path, {'status': 'failed', 'original': original, 'error': str(e)})
+        raise
+
+def manifest_status(folder, upload_id):
+    """(status, seconds since the manifest was written) of an upload, or (None, None) if it has no manifest"""
+    path = os.path.join(folder, manifest_filename(upload_id))
+    try:
+        with open(path) as f:
+            status = json.load(f)['status']
+        return status, time.time() - os.path.getmtime(path)
+    except (FileNotFoundError, ValueError, KeyError):
+        return None, None
+
+def read_manifest(folder, upload_id, url_for):
+    """Manifest for an upload from its status file, or None if unknown"""
+    try:
+        with open(os.path.join(folder, manifest_filename(upload_id))) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return build_manifest(upload_id, state['original'], url_for, state['status'], state.get('sizes'))
+
+class MediaProcessor:
+    """Queues rendition work on a process pool, or runs it inline"""
+
+    def __init__(self, folder, mode='pool', max_workers=None, pending_timeout=600):
+        self.folder = folder
+        self.mode = mode
+        self.max_workers = max_workers
+        self.pending_timeout = pending_timeout
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # spawn keeps worker processes free of the web server's threads and sockets
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    def submit(self, upload_id, original):
+        """Start rendering; the manifest file records the outcome"""
+        _write_json(
+            os.path.join(self.folder, manifest_filename(upload_id)),
+            {'status': 'pending', 'original': original}
+        )
+        if self.mode == 'inline':
+            try:
+                render_renditions(self.folder, upload_id, original)
+            except Exception:
+                pass  # Recorded as 'failed' in the manifest
+            return
+        self.pool.submit(render_renditions, self.folder, upload_id, original)
+
+    def ensure(self, upload_id, original):
+        """Submit rendering unless the upload is ready or recently queued; returns whether it was submitted"""
+        status, age = manifest_status(self.folder, upload_id)
+        if status == 'ready' or (status == 'pending' and age < self.pending_timeout):
+            return False
+        self.submit(upload_id, original)
+        return True
@@ -19,7 +19,7 @@ from sqlalchemy import text
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app
-from models import db, User, Post, Comment, Vote, Award, VoteType, AwardType
+from models import db, User, Post, Comment, Vote, Award, VoteType, AwardType, JobPost, normalize_location
 
 def migrate_database():
     """Run database migrations to add new features"""
@@ -47,7 +47,11 @@ def migrate_database():
                 "ALTER TABLE users ADD COLUMN notification_settings JSON",
                 "ALTER TABLE users ADD COLUMN display_name VARCHAR(100)",
                 "ALTER TABLE users ADD COLUMN is_moderator BOOLEAN DEFAULT FALSE",
-                "ALTER TABLE users ADD COLUMN show_karma BOOLEAN DEFAULT TRUE"
+                "ALTER TABLE users ADD COLUMN show_karma BOOLEAN DEFAULT TRUE",
+                "ALTER TABLE users ADD COLUMN followers_count INTEGER DEFAULT 0",
+                "ALTER TABLE users ADD COLUMN following_count INTEGER DEFAULT 0",
+                "ALTER TABLE users ADD COLUMN posts_count INTEGER DEFAULT 0",
+                "ALTER TABLE users ADD COLUMN comments_count INTEGER DEFAULT 0"
             ]
             
             # Add new columns to posts table
@@ -61,7 +65,9 @@ def migrate_database():
                 "ALTER TABLE posts ADD COLUMN is_pinned BOOLEAN DEFAULT FALSE",
                 "ALTER TABLE posts ADD COLUMN is_featured BOOLEAN DEFAULT FALSE",
                 "ALTER TABLE posts ADD COLUMN quality_score REAL DEFAULT 0.0",
-                "ALTER TABLE posts ADD COLUMN is_locked BOOLEAN DEFAULT FALSE"
+                "ALTER TABLE posts ADD COLUMN is_locked BOOLEAN DEFAULT FALSE",
+                "ALTER TABLE posts ADD COLUMN hot_score REAL DEFAULT 0.0",
+                "ALTER TABLE posts ADD COLUMN best_score REAL DEFAULT 0.0"
             ]
             
             # Add new columns to comments table
@@ -71,11 +77,17 @@ def migrate_database():
                 "ALTER TABLE comments ADD COLUMN score INTEGER DEFAULT 0",
                 "ALTER TABLE comments ADD COLUMN is_edited BOOLEAN DEFAULT FALSE",
                 "ALTER TABLE comments ADD COLUMN edit_count INTEGER DEFAULT 0",
-                "ALTER TABLE comments ADD COLUMN is_deleted BOOLEAN DEFAULT FALSE"
+                "ALTER TABLE comments ADD COLUMN is_deleted BOOLEAN DEFAULT FALSE",
+                "ALTER TABLE comments ADD COLUMN replies_count INTEGER DEFAULT 0"
+            ]
+            
+            # Add new columns to job_posts table
+            job_columns = [
+                "ALTER TABLE job_posts ADD COLUMN location_key VARCHAR(100)"
             ]
             
             # Execute column additions (ignore errors if columns already exist)
-            all_columns = user_columns + post_columns + comment_columns
+            all_columns = user_columns + post_columns + comment_columns + job_columns
             
             for sql in all_columns:
                 try:
@@ -87,6 +99,39 @@ def migrate_database():
                     else:
                         print(f"❌ Error adding column: {e}")
             
+            # Indexes on existing tables (create_all only adds them for new tables)
+            indexes = [
+                "CREATE INDEX IF NOT EXISTS ix_job_posts_location_key ON job_posts (location_key)",
+                "CREATE INDEX IF NOT EXISTS ix_job_posts_facets ON job_posts (is_active, job_type, experience_level, location_key)",
+                "CREATE INDEX IF NOT EXISTS ix_posts_hot ON posts (is_hidden, hot_score, id)",
+                "CREATE INDEX IF NOT EXISTS ix_posts_category_hot ON posts (is_hidden, category, hot_score, id)",
+                "CREATE INDEX IF NOT EXISTS ix_posts_best ON posts (is_hidden, best_score, id)",
+                "CREATE INDEX IF NOT EXISTS ix_posts_category_best ON posts (is_hidden, category, best_score, id)",
+                "CREATE INDEX IF NOT EXISTS ix_posts_recent ON posts (is_hidden, created_at, id)",
+                "CREATE INDEX IF NOT EXISTS ix_posts_category_recent ON posts (is_hidden, category, created_at, id)",
+                "CREATE INDEX IF NOT EXISTS ix_posts_user_recent ON posts (user_id, is_hidden, created_at, id)",
+                "CREATE INDEX IF NOT EXISTS ix_comments_tree ON comments (post_id, parent_id, is_hidden, created_at, id)",
+                "CREATE INDEX IF NOT EXISTS ix_job_posts_recent ON job_posts (is_active, created_at, id)",
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_votes_user_post ON votes (user_id, post_id) WHERE post_id IS NOT NULL",
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_votes_user_comment ON votes (user_id, comment_id) WHERE comment_id IS NOT NULL"
+            ]
+            for sql in indexes:
+                db.session.execute(text(sql))
+                print(f"✅ Index ready: {sql.split(' ON ')[0].split()[-1]}")
+            
+            # Single-column indexes now covered by the composites above, and the
+            # thread index that ix_comments_tree replaced
+            for name in ['ix_posts_user_id', 'ix_comments_post_id', 'ix_comments_thread']:
+                db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+                print(f"✅ Dropped redundant index: {name}")
+            
+            # The partial unique indexes replace the vote unique constraints (SQLite
+            # cannot drop a table constraint, so there the old ones stay)
+            if db.engine.dialect.name == 'postgresql':
+                for name in ['unique_post_vote', 'unique_comment_vote']:
+                    db.session.execute(text(f"ALTER TABLE votes DROP CONSTRAINT IF EXISTS {name}"))
+                    print(f"✅ Dropped constraint: {name}")
+            
             # Commit the changes
             db.session.commit()
             
@@ -111,8 +156,28 @@ def migrate_database():
                 comment.update_score()
                 print(f"Updated score for comment: {comment.content[:30]}...")
             
+            # Backfill normalized job locations
+            jobs = JobPost.query.all()
+            for job in jobs:
+                job.location_key = normalize_location(job.location)
+            print(f"Updated location keys for {len(jobs)} jobs")
+            
+            # Backfill denormalized reply counts
+            from maintenance import repair_reply_counts
+            repair_reply_counts()
+            
             db.session.commit()
             
+            # Backfill denormalized social counters
+            from maintenance import repair_social_counters, refresh_rankings, rebuild_home_timelines
+            repair_social_counters()
+            
+            # Backfill ranking scores for every post
+            refresh_rankings(window_days=0)
+            
+            # Fill home timelines from existing follows
+            rebuild_home_timelines()
+            
             print("✅ Database migration completed successfully!")
             print(f"📈 Updated {len(users)} users, {len(posts)} posts, and {len(comments)} comments")
             
@@ -3,8 +3,33 @@ from datetime import datetime, timezone
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 from enum import Enum
+import re
 
-db = SQLAlchemy()
+from ranking import hot_score, best_score, quality_score, hot_score_sql, best_score_sql, quality_score_sql
+from db_routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def utcnow():
+    """Column default evaluated per row (datetime.now() as a default would be fixed at import)"""
+    return datetime.now(timezone.utc)
+
+def counter_updates(model, deltas):
+    """SET values adding signed deltas to counter columns, re-deriving score in the same statement when votes change"""
+    values = {name: db.func.coalesce(getattr(model, name), 0) + delta for name, delta in deltas.items()}
+    if 'upvotes' in deltas or 'downvotes' in deltas:
+        values['score'] = (
+            db.func.coalesce(model.upvotes, 0) + deltas.get('upvotes', 0)
+            - db.func.coalesce(model.downvotes, 0) - deltas.get('downvotes', 0)
+        )
+    return values
+
+def normalize_location(location):
+    """Normalized key for grouping and prefix-filtering locations ('  Mumbai ,India' -> 'mumbai, india')"""
+    if not location:
+        return None
+    parts = [re.sub(r'[^\w\s]', '', part).split() for part in location.lower().split(',')]
+    return ', '.join(' '.join(words) for words in parts if words) or None
 
 # Association Tables for Many-to-Many relationships
 user_followers = db.Table('user_followers',
@@ -32,7 +57,7 @@ post_awards = db.Table('post_awards',
     db.Column('user_id', db.String(36), db.ForeignKey('users.id'), primary_key=True),
     db.Column('post_id', db.String(36), db.ForeignKey('posts.id'), primary_key=True),
     db.Column('award_type', db.String(50), nullable=False),
-    db.Column('awarded_at', db.DateTime(timezone=True), default=datetime.now(timezone.utc))
+    db.Column('awarded_at', db.DateTime(timezone=True), default=utcnow)
 )
 
 class UserStatus(Enum):
@@ -86,6 +111,12 @@ class User(db.Model):
     awards_given = db.Column(db.Integer, default=0)
     awards_received = db.Column(db.Integer, default=0)
     
+    # Denormalized social counters, maintained by the write paths
+    followers_count = db.Column(db.Integer, default=0)
+    following_count = db.Column(db.Integer, default=0)
+    posts_count = db.Column(db.Integer, default=0)  # Visible (non-hidden) posts
+    comments_count = db.Column(db.Integer, default=0)  # Non-deleted comments
+    
     # User preferences
     preferred_categories = db.Column(db.JSON)  # Array of preferred categories
     notification_settings = db.Column(db.JSON)  # Notification preferences
@@ -104,9 +135,9 @@ class User(db.Model):
     show_karma = db.Column(db.Boolean, default=True)
     
     # Timestamps
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
-    last_seen = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), default=utcnow)
+    updated_at = db.Column(db.DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+    last_seen = db.Column(db.DateTime(timezone=True), default=utcnow)
     
     # Relationships
     posts = db.relationship('Post', backref='author', lazy='dynamic', cascade='all, delete-orphan')
@@ -130,11 +161,44 @@ class User(db.Model):
         return f'<User {self.username}>'
     
     def update_karma(self):
-        """Update user's karma based on their posts and comments"""
-        self.post_karma = sum(post.score for post in self.posts)
-        self.comment_karma = sum(comment.score for comment in self.comments)
+        """Recompute user's karma from their posts and comments (votes apply deltas via apply_karma_delta)"""
+        self.post_karma = db.session.query(db.func.coalesce(db.func.sum(Post.score), 0)).filter(
+            Post.user_id == self.id
+        ).scalar()
+        self.comment_karma = db.session.query(db.func.coalesce(db.func.sum(Comment.score), 0)).filter(
+            Comment.user_id == self.id
+        ).scalar()
         self.karma_score = self.post_karma + self.comment_karma
     
+    @staticmethod
+    def adjust_counters(user_id, **deltas):
+        """Add signed deltas to counter columns with a single UPDATE in the current transaction"""
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        User.query.filter_by(id=user_id).update({
+            getattr(User, name): db.func.coalesce(getattr(User, name), 0) + delta
+            for name, delta in deltas.items()
+        }, synchronize_session='fetch')
+    
+    @staticmethod
+    def apply_karma_delta(user_id, post_delta=0, comment_delta=0):
+        """Apply signed karma deltas to a content author inside the current transaction"""
+        User.adjust_counters(
+            user_id,
+            post_karma=post_delta,
+            comment_karma=comment_delta,
+            karma_score=post_delta + comment_delta
+        )
+    
+    def is_following(self, user_id):
+        return db.session.query(
+            db.exists().where(
+                user_followers.c.follower_id == self.id,
+                user_followers.c.followed_id == user_id
+            )
+        ).scalar()
+    
     def to_dict(self, include_private=False):
         data = {
             'id': self.id,
@@ -149,10 +213,10 @@ class User(db.Model):
             'is_verified': self.is_verified,
             'is_moderator': self.is_moderator,
             'created_at': self.created_at.isoformat(),
-            'followers_count': self.followers.count(),
-            'following_count': self.followed.count(),
-            'posts_count': self.posts.count(),
-            'comments_count': self.comments.count(),
+            'followers_count': self.followers_count or 0,
+            'following_count': self.following_count or 0,
+            'posts_count': self.posts_count or 0,
+            'comments_count': self.comments_count or 0,
         }
         
         if self.show_karma:
@@ -187,7 +251,7 @@ class Post(db.Model):
     post_type = db.Column(db.String(20), default='text')  # text, link, image
     
     # Author info
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)  # Indexed by ix_posts_user_recent
     is_anonymous = db.Column(db.Boolean, default=False)
     
     # Reddit-like scoring
@@ -206,6 +270,8 @@ class Post(db.Model):
     is_pinned = db.Column(db.Boolean, default=False)
     is_featured = db.Column(db.Boolean, default=False)
     quality_score = db.Column(db.Float, default=0.0)  # Algorithm-based quality score
+    hot_score = db.Column(db.Float, default=0.0)  # Time-decayed engagement, see ranking.py
+    best_score = db.Column(db.Float, default=0.0)  # Wilson lower bound of the upvote ratio
     
     # Moderation
     is_reported = db.Column(db.Boolean, default=False)
@@ -214,14 +280,26 @@ class Post(db.Model):
     report_count = db.Column(db.Integer, default=0)
     
     # Timestamps
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc), index=True)
-    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), default=utcnow, index=True)
+    updated_at = db.Column(db.DateTime(timezone=True), default=utcnow, onupdate=utcnow)
     
     # Relationships
     comments = db.relationship('Comment', backref='post', lazy='dynamic', cascade='all, delete-orphan')
     reports = db.relationship('PostReport', backref='post', lazy='dynamic', cascade='all, delete-orphan')
     votes = db.relationship('Vote', backref='post', lazy='dynamic', cascade='all, delete-orphan')
     
+    # Listings are read straight off these indexes (id breaks ties for cursors);
+    # run tests/test_query_plans.py after changing a listing query
+    __table_args__ = (
+        db.Index('ix_posts_hot', 'is_hidden', 'hot_score', 'id'),
+        db.Index('ix_posts_category_hot', 'is_hidden', 'category', 'hot_score', 'id'),
+        db.Index('ix_posts_best', 'is_hidden', 'best_score', 'id'),
+        db.Index('ix_posts_category_best', 'is_hidden', 'category', 'best_score', 'id'),
+        db.Index('ix_posts_recent', 'is_hidden', 'created_at', 'id'),
+        db.Index('ix_posts_category_recent', 'is_hidden', 'category', 'created_at', 'id'),
+        db.Index('ix_posts_user_recent', 'user_id', 'is_hidden', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Post {self.title[:50]}...>'
     
@@ -230,8 +308,67 @@ class Post(db.Model):
         self.score = self.upvotes - self.downvotes
         # Update quality score based on engagement
         if self.views_count > 0:
-            engagement_rate = (self.upvotes + self.comments_count) / self.views_count
-            self.quality_score = min(engagement_rate * 100, 100.0)
+            self.quality_score = quality_score(self.upvotes, self.comments_count, self.views_count)
+        self.update_rankings()
+    
+    def update_rankings(self, now=None):
+        """Recompute hot_score and best_score from the post's current counters"""
+        self.hot_score = hot_score(
+            self.upvotes, self.downvotes, self.comments_count, self.awards_count, self.created_at, now
+        )
+        self.best_score = best_score(self.upvotes, self.downvotes)
+    
+    @staticmethod
+    def adjust_counters(post_id, now=None, **deltas):
+        """Add signed deltas to the post's counters and re-derive its rankings with one UPDATE ... RETURNING.
+
+        Concurrent calls never lose increments: the counters are only ever read
+        back from the statement that changed them, and the rankings are computed
+        in SQL from the same new values. Returns the updated counters (with
+        user_id), or None if the post does not exist.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        columns = (
+            Post.user_id, Post.upvotes, Post.downvotes, Post.score, Post.comments_count,
+            Post.awards_count, Post.views_count, Post.created_at
+        )
+        if not deltas:
+            return db.session.execute(db.select(*columns).where(Post.id == post_id)).first()
+
+        values = counter_updates(Post, deltas)
+        values.update(Post.ranking_updates(values, now))
+        return db.session.execute(
+            db.update(Post).where(Post.id == post_id).values(values).returning(*columns)
+        ).first()
+    
+    @staticmethod
+    def ranking_updates(counters, now=None):
+        """SET values re-deriving the rankings in SQL from new counter expressions (unlisted counters are unchanged).
+
+        SET expressions see the old row, so the rankings must be built from the
+        expressions that assign the new counters, not from the columns.
+        """
+        new = {
+            name: counters.get(name, db.func.coalesce(getattr(Post, name), 0))
+            for name in ('upvotes', 'downvotes', 'comments_count', 'awards_count', 'views_count')
+        }
+        return {
+            'hot_score': hot_score_sql(
+                new['upvotes'], new['downvotes'], new['comments_count'], new['awards_count'], Post.created_at, now
+            ),
+            'best_score': best_score_sql(new['upvotes'], new['downvotes']),
+            'quality_score': db.case(
+                (new['views_count'] > 0, quality_score_sql(new['upvotes'], new['comments_count'], new['views_count'])),
+                else_=Post.quality_score
+            )
+        }
+    
+    def set_hidden(self, hidden):
+        """Hide or unhide the post, keeping the author's visible post count in step"""
+        if bool(self.is_hidden) == bool(hidden):
+            return
+        self.is_hidden = hidden
+        User.adjust_counters(self.user_id, posts_count=-1 if hidden else 1)
     
     def get_user_vote(self, user_id):
         """Get user's vote on this post"""
@@ -240,7 +377,7 @@ class Post(db.Model):
         vote = Vote.query.filter_by(user_id=user_id, post_id=self.id).first()
         return vote.vote_type.value if vote else None
     
-    def to_dict(self, user_id=None):
+    def to_dict(self, user_id=None, user_votes=None):
         try:
             if not self.is_anonymous and self.author:
                 author_data = {
@@ -255,59 +392,109 @@ class Post(db.Model):
                     'karma_score': self.author.karma_score if self.author.show_karma else None
                 }
             else:
-                author_data = {
-                    'username': f'Anonymous_{self.id[:8]}',
-                    'display_name': f'Anonymous_{self.id[:8]}',
-                    'is_verified': False,
-                    'is_moderator': False
-                }
+                author_data = Post.anonymous_author(self.id)
         except Exception:
-            author_data = {
-                'username': f'Anonymous_{self.id[:8]}',
-                'display_name': f'Anonymous_{self.id[:8]}',
-                'is_verified': False,
-                'is_moderator': False
-            }
+            author_data = Post.anonymous_author(self.id)
         
+        user_vote = user_votes.get(self.id) if user_votes is not None else self.get_user_vote(user_id)
+        return Post.serialize(self, author_data, user_vote, self.get_time_ago())
+    
+    @staticmethod
+    def anonymous_author(post_id):
+        return {
+            'username': f'Anonymous_{post_id[:8]}',
+            'display_name': f'Anonymous_{post_id[:8]}',
+            'is_verified': False,
+            'is_moderator': False
+        }
+    
+    @staticmethod
+    def serialize(post, author_data, user_vote, time_ago):
+        """Build the API payload from a Post instance or a listing row"""
         # Get awards summary
         awards_summary = {}
-        if self.awards_count > 0:
+        if post.awards_count > 0:
             # This would be populated by actual award data
-            awards_summary = {'total': self.awards_count}
+            awards_summary = {'total': post.awards_count}
             
         return {
-            'id': self.id,
-            'title': self.title,
-            'content': self.content,
-            'category': self.category.value,
-            'tags': self.tags or [],
-            'image_url': self.image_url,
-            'link_url': self.link_url,
-            'post_type': self.post_type,
+            'id': post.id,
+            'title': post.title,
+            'content': post.content,
+            'category': post.category.value,
+            'tags': post.tags or [],
+            'image_url': post.image_url,
+            'link_url': post.link_url,
+            'post_type': post.post_type,
             'author': author_data,
-            'is_anonymous': self.is_anonymous,
-            'upvotes': self.upvotes,
-            'downvotes': self.downvotes,
-            'score': self.score,
-            'views_count': self.views_count,
-            'comments_count': self.comments_count,
-            'shares_count': self.shares_count,
-            'awards_count': self.awards_count,
+            'is_anonymous': post.is_anonymous,
+            'upvotes': post.upvotes,
+            'downvotes': post.downvotes,
+            'score': post.score,
+            'views_count': post.views_count,
+            'comments_count': post.comments_count,
+            'shares_count': post.shares_count,
+            'awards_count': post.awards_count,
             'awards': awards_summary,
-            'is_pinned': self.is_pinned,
-            'is_featured': self.is_featured,
-            'is_locked': self.is_locked,
-            'quality_score': self.quality_score,
-            'user_vote': self.get_user_vote(user_id),
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'time_ago': self.get_time_ago()
+            'is_pinned': post.is_pinned,
+            'is_featured': post.is_featured,
+            'is_locked': post.is_locked,
+            'quality_score': post.quality_score,
+            'user_vote': user_vote,
+            'created_at': post.created_at.isoformat(),
+            'updated_at': post.updated_at.isoformat(),
+            'time_ago': time_ago
         }
     
+    @classmethod
+    def listing_query(cls, query):
+        """Turn a filtered/ordered Post query into a plain-row query with the author joined in"""
+        return query.outerjoin(User, cls.user_id == User.id).with_entities(
+            cls.id, cls.title, cls.content, cls.category, cls.tags, cls.image_url,
+            cls.link_url, cls.post_type, cls.is_anonymous, cls.upvotes, cls.downvotes,
+            cls.score, cls.views_count, cls.comments_count, cls.shares_count,
+            cls.awards_count, cls.is_pinned, cls.is_featured, cls.is_locked,
+            cls.quality_score, cls.hot_score, cls.best_score, cls.likes_count, cls.created_at, cls.updated_at,
+            User.id.label('author_id'),
+            User.username.label('author_username'),
+            User.display_name.label('author_display_name'),
+            User.first_name.label('author_first_name'),
+            User.last_name.label('author_last_name'),
+            User.is_verified.label('author_is_verified'),
+            User.is_moderator.label('author_is_moderator'),
+            User.avatar_url.label('author_avatar_url'),
+            User.karma_score.label('author_karma_score'),
+            User.show_karma.label('author_show_karma')
+        )
+    
+    @staticmethod
+    def row_to_dict(row, user_votes=None, now=None):
+        """Serialize a row from listing_query without touching the session"""
+        if not row.is_anonymous and row.author_id:
+            author_data = {
+                'id': row.author_id,
+                'username': row.author_username,
+                'display_name': row.author_display_name or row.author_username,
+                'first_name': row.author_first_name,
+                'last_name': row.author_last_name,
+                'is_verified': row.author_is_verified,
+                'is_moderator': row.author_is_moderator,
+                'avatar_url': row.author_avatar_url,
+                'karma_score': row.author_karma_score if row.author_show_karma else None
+            }
+        else:
+            author_data = Post.anonymous_author(row.id)
+        
+        user_vote = user_votes.get(row.id) if user_votes else None
+        return Post.serialize(row, author_data, user_vote, Post.format_time_ago(row.created_at, now))
+    
     def get_time_ago(self):
+        return Post.format_time_ago(self.created_at)
+    
+    @staticmethod
+    def format_time_ago(created_at, now=None):
         try:
-            now = datetime.now(timezone.utc)
-            created_at = self.created_at
+            now = now or datetime.now(timezone.utc)
             if created_at.tzinfo is None:
                 created_at = created_at.replace(tzinfo=timezone.utc)
             
@@ -337,7 +524,7 @@ class Comment(db.Model):
     content = db.Column(db.Text, nullable=False)
     
     # Relationships
-    post_id = db.Column(db.String(36), db.ForeignKey('posts.id'), nullable=False, index=True)
+    post_id = db.Column(db.String(36), db.ForeignKey('posts.id'), nullable=False)  # Indexed by ix_comments_tree
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
     parent_id = db.Column(db.String(36), db.ForeignKey('comments.id'), index=True)
     
@@ -349,6 +536,9 @@ class Comment(db.Model):
     # Legacy engagement
     likes_count = db.Column(db.Integer, default=0)
     
+    # Denormalized number of visible direct replies, maintained on insert and by set_hidden
+    replies_count = db.Column(db.Integer, default=0)
+    
     # Content features
     is_edited = db.Column(db.Boolean, default=False)
     edit_count = db.Column(db.Integer, default=0)
@@ -359,13 +549,19 @@ class Comment(db.Model):
     is_deleted = db.Column(db.Boolean, default=False)
     
     # Timestamps
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), default=utcnow)
+    updated_at = db.Column(db.DateTime(timezone=True), default=utcnow, onupdate=utcnow)
     
     # Self-referential relationship for nested comments
     replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]), lazy='dynamic')
     votes = db.relationship('Vote', backref='comment', lazy='dynamic', cascade='all, delete-orphan')
     
+    # A post's top-level comments (parent_id IS NULL) are paged newest first off this
+    # index; with parent_id ahead of the sort columns the seek skips every reply
+    __table_args__ = (
+        db.Index('ix_comments_tree', 'post_id', 'parent_id', 'is_hidden', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Comment {self.content[:30]}...>'
     
@@ -373,6 +569,35 @@ class Comment(db.Model):
         """Update comment score based on votes"""
         self.score = self.upvotes - self.downvotes
     
+    @staticmethod
+    def adjust_counters(comment_id, **deltas):
+        """Add signed deltas to the comment's counters with one UPDATE ... RETURNING.
+
+        Returns the updated counters (with user_id and post_id), or None if the comment does not exist.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        columns = (Comment.user_id, Comment.post_id, Comment.upvotes, Comment.downvotes, Comment.score)
+        if not deltas:
+            return db.session.execute(db.select(*columns).where(Comment.id == comment_id)).first()
+        return db.session.execute(
+            db.update(Comment).where(Comment.id == comment_id).values(counter_updates(Comment, deltas)).returning(*columns)
+        ).first()
+    
+    def set_hidden(self, hidden):
+        """Hide or unhide the comment, keeping its parent's visible reply count in step"""
+        if bool(self.is_hidden) == bool(hidden):
+            return
+        self.is_hidden = hidden
+        if self.parent_id:
+            Comment.adjust_counters(self.parent_id, replies_count=-1 if hidden else 1)
+    
+    def mark_deleted(self):
+        """Soft-delete the comment, keeping the author's comment count in step"""
+        if self.is_deleted:
+            return
+        self.is_deleted = True
+        User.adjust_counters(self.user_id, comments_count=-1)
+    
     def get_user_vote(self, user_id):
         """Get user's vote on this comment"""
         if not user_id:
@@ -380,7 +605,7 @@ class Comment(db.Model):
         vote = Vote.query.filter_by(user_id=user_id, comment_id=self.id).first()
         return vote.vote_type.value if vote else None
     
-    def to_dict(self, user_id=None, include_replies=True):
+    def to_dict(self, user_id=None, include_replies=True, user_votes=None):
         try:
             author_data = {
                 'id': self.author.id,
@@ -408,15 +633,15 @@ class Comment(db.Model):
             'score': self.score,
             'is_edited': self.is_edited,
             'edit_count': self.edit_count,
-            'user_vote': self.get_user_vote(user_id),
+            'user_vote': user_votes.get(self.id) if user_votes is not None else self.get_user_vote(user_id),
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'time_ago': self.get_time_ago(),
-            'replies_count': self.replies.count()
+            'replies_count': self.replies_count or 0
         }
         
-        if include_replies and self.replies.count() > 0:
-            data['replies'] = [reply.to_dict(user_id, include_replies=False) 
+        if include_replies and self.replies_count:
+            data['replies'] = [reply.to_dict(user_id, include_replies=False, user_votes=user_votes) 
                              for reply in self.replies.order_by(Comment.score.desc())]
         
         return data
@@ -454,13 +679,77 @@ class Vote(db.Model):
     comment_id = db.Column(db.String(36), db.ForeignKey('comments.id'), nullable=True, index=True)
     vote_type = db.Column(db.Enum(VoteType), nullable=False)
     
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), default=utcnow)
     
-    # Ensure a user can only vote once per post/comment
+    # Ensure a user can only vote once per post/comment; partial, so the rows for
+    # the other kind of target (NULL there) stay out of each index
     __table_args__ = (
-        db.UniqueConstraint('user_id', 'post_id', name='unique_post_vote'),
-        db.UniqueConstraint('user_id', 'comment_id', name='unique_comment_vote'),
+        db.Index('ix_votes_user_post', 'user_id', 'post_id', unique=True,
+                 sqlite_where=db.text('post_id IS NOT NULL'), postgresql_where=db.text('post_id IS NOT NULL')),
+        db.Index('ix_votes_user_comment', 'user_id', 'comment_id', unique=True,
+                 sqlite_where=db.text('comment_id IS NOT NULL'), postgresql_where=db.text('comment_id IS NOT NULL')),
     )
+    
+    @staticmethod
+    def record(user_id, vote_type, **target):
+        """Apply a vote request ('upvote', 'downvote' or 'remove') to a user's vote on post_id= or comment_id=.
+
+        Repeating the current vote removes it. Returns (user_vote, deltas), where
+        deltas are the changes to the target's upvotes and downvotes, or None if
+        the user does not exist. The previous vote is taken from the DELETE that
+        removes it, so of two racing toggles only one sees (and undoes) it; a
+        racing duplicate insert fails on the unique index.
+        """
+        (column, target_id), = target.items()
+        removed = db.session.execute(
+            db.delete(Vote).where(Vote.user_id == user_id, getattr(Vote, column) == target_id)
+            .returning(Vote.id, Vote.vote_type, Vote.created_at)
+        ).first()
+
+        counter = {VoteType.UPVOTE: 'upvotes', VoteType.DOWNVOTE: 'downvotes'}
+        deltas = {counter[removed.vote_type]: -1} if removed else {}
+        if vote_type == 'remove' or (removed and removed.vote_type.value == vote_type):
+            if removed is None and not db.session.execute(db.select(User.id).where(User.id == user_id)).first():
+                return None
+            return None, deltas
+
+        # A changed vote keeps its id and age; the SELECT inserts nothing for an unknown user
+        new = VoteType(vote_type)
+        inserted = db.session.execute(
+            db.insert(Vote).from_select(
+                ['id', 'user_id', column, 'vote_type', 'created_at'],
+                db.select(
+                    db.literal(removed.id if removed else str(uuid.uuid4())), User.id, db.literal(target_id),
+                    db.literal(new, Vote.vote_type.type), db.literal(removed.created_at if removed else utcnow(), Vote.created_at.type)
+                ).where(User.id == user_id)
+            )
+        )
+        if inserted.rowcount == 0:
+            return None
+        deltas[counter[new]] = 1
+        return vote_type, deltas
+    
+    @staticmethod
+    def get_post_votes(user_id, post_ids):
+        """Map post id -> vote type for a user's votes on a page of posts (single IN query)"""
+        if not user_id or not post_ids:
+            return {}
+        rows = db.session.query(Vote.post_id, Vote.vote_type).filter(
+            Vote.user_id == user_id,
+            Vote.post_id.in_(post_ids)
+        ).all()
+        return {post_id: vote_type.value for post_id, vote_type in rows}
+    
+    @staticmethod
+    def get_comment_votes(user_id, comment_ids):
+        """Map comment id -> vote type for a user's votes on a set of comments (single IN query)"""
+        if not user_id or not comment_ids:
+            return {}
+        rows = db.session.query(Vote.comment_id, Vote.vote_type).filter(
+            Vote.user_id == user_id,
+            Vote.comment_id.in_(comment_ids)
+        ).all()
+        return {comment_id: vote_type.value for comment_id, vote_type in rows}
 
 class Award(db.Model):
     __tablename__ = 'awards'
@@ -473,7 +762,7 @@ class Award(db.Model):
     award_type = db.Column(db.Enum(AwardType), nullable=False)
     message = db.Column(db.Text)  # Optional message from giver
     
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), default=utcnow)
     
     giver = db.relationship('User', foreign_keys=[giver_id], backref='awards_given_list')
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='awards_received_list')
@@ -490,7 +779,7 @@ class PostReport(db.Model):
     description = db.Column(db.Text)
     status = db.Column(db.String(20), default='pending')
     
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), default=utcnow)
     
     reporter = db.relationship('User', backref='reports_made')
 
@@ -502,10 +791,58 @@ class UserActivity(db.Model):
     activity_type = db.Column(db.String(50), nullable=False)
     activity_data = db.Column(db.JSON)
     
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc), index=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=utcnow, index=True)
     
     user = db.relationship('User', backref='activities')
 
+class MediaAsset(db.Model):
+    """An uploaded file stored under the SHA-256 of its bytes (see media.py)"""
+    __tablename__ = 'media_assets'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)
+    original = db.Column(db.String(80), nullable=False)  # Filename in UPLOAD_FOLDER
+    content_type = db.Column(db.String(100))
+    size_bytes = db.Column(db.Integer)
+    is_image = db.Column(db.Boolean, default=False)
+    ref_count = db.Column(db.Integer, default=0)  # Posts and profiles using this upload
+    
+    created_at = db.Column(db.DateTime(timezone=True), default=utcnow)
+    last_uploaded_at = db.Column(db.DateTime(timezone=True), default=utcnow)  # Starts the gc grace period
+    
+    @staticmethod
+    def adjust_refs(content_hashes, delta):
+        """Add delta to the reference count of each asset (unknown hashes are ignored)"""
+        content_hashes = [content_hash for content_hash in content_hashes if content_hash]
+        if not content_hashes:
+            return
+        MediaAsset.query.filter(MediaAsset.content_hash.in_(content_hashes)).update(
+            {MediaAsset.ref_count: db.func.coalesce(MediaAsset.ref_count, 0) + delta},
+            synchronize_session=False
+        )
+
+class CacheTag(db.Model):
+    """Version of an API cache tag, shared by every worker through the database (see api_cache.py)"""
+    __tablename__ = 'cache_tags'
+    
+    tag = db.Column(db.String(120), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)  # Time of the last bump, in nanoseconds
+
+class TimelineEntry(db.Model):
+    """A post in a user's home timeline, written when the post is fanned out (see timeline.py)"""
+    __tablename__ = 'timeline_entries'
+    
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    post_id = db.Column(db.String(36), db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    author_id = db.Column(db.String(36), nullable=False)
+    category = db.Column(db.Enum(PostCategory), nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False)  # The post's created_at
+    
+    # A page of a timeline is one range scan; unfollow prunes by author
+    __table_args__ = (
+        db.Index('ix_timeline_entries_user_created', 'user_id', 'created_at', 'post_id'),
+        db.Index('ix_timeline_entries_user_author', 'user_id', 'author_id'),
+    )
+
 class JobPost(db.Model):
     __tablename__ = 'job_posts'
     
@@ -513,6 +850,7 @@ class JobPost(db.Model):
     title = db.Column(db.String(200), nullable=False)
     company = db.Column(db.String(100), nullable=False)
     location = db.Column(db.String(100), nullable=False)
+    location_key = db.Column(db.String(100), index=True)  # normalize_location(location)
     description = db.Column(db.Text, nullable=False)
     requirements = db.Column(db.Text)
     salary_range = db.Column(db.String(50))
@@ -524,11 +862,22 @@ class JobPost(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     expires_at = db.Column(db.DateTime(timezone=True))
     
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), default=utcnow)
+    updated_at = db.Column(db.DateTime(timezone=True), default=utcnow, onupdate=utcnow)
     
     poster = db.relationship('User', backref='job_posts')
     
+    # Covers the facet aggregate in get_jobs, and the newest-first listing
+    __table_args__ = (
+        db.Index('ix_job_posts_facets', 'is_active', 'job_type', 'experience_level', 'location_key'),
+        db.Index('ix_job_posts_recent', 'is_active', 'created_at', 'id'),
+    )
+    
+    @db.validates('location')
+    def validate_location(self, key, location):
+        self.location_key = normalize_location(location)
+        return location
+    
     def to_dict(self):
         return {
             'id': self.id,
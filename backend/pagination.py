@@ -0,0 +1,97 @@
+"""
+Cursor (keyset) pagination for Astitva list endpoints
+
+A cursor is an opaque token holding the sort-key values of the last item on
+the previous page; the next page is fetched with a range condition on those
+keys instead of an OFFSET, so deep pages cost the same as the first one.
+Relevance-ranked search results use an offset cursor instead, since their
+ranking is computed per query.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from models import db
+
+class InvalidCursor(ValueError):
+    pass
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'d': value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'd' in value:
+        return datetime.fromisoformat(value['d'])
+    return value
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(payload, dict):
+            raise ValueError
+        return payload
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+def _cursor_keys(cursor, count):
+    if not cursor:
+        return None
+    keys = decode_cursor(cursor).get('k')
+    if not isinstance(keys, list) or len(keys) != count:
+        raise InvalidCursor('Invalid cursor')
+    return [_decode_value(value) for value in keys]
+
+def _after(order, values):
+    """Rows strictly after values in the given order, as an OR of prefix-equal comparisons.
+
+    The extra inclusive bound on the leading column lets the database seek into
+    its index instead of filtering rows from the start.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        comparison = column < values[i] if descending else column > values[i]
+        clauses.append(db.and_(*[order[j][0] == values[j] for j in range(i)], comparison))
+    leading, descending = order[0]
+    bound = leading <= values[0] if descending else leading >= values[0]
+    return db.and_(bound, db.or_(*clauses))
+
+def keyset_paginate(query, order, cursor, per_page, key_names=None):
+    """Fetch the page after cursor.
+
+    order is a list of (column, descending) that must end in a unique column.
+    Items may be ORM instances or rows; their attributes named like the order
+    columns (or key_names, when the columns belong to a joined table) provide
+    the next cursor. Returns (items, next_cursor).
+    """
+    values = _cursor_keys(cursor, len(order))
+    if values is not None:
+        query = query.filter(_after(order, values))
+    query = query.order_by(None).order_by(*[
+        column.desc() if descending else column.asc() for column, descending in order
+    ])
+
+    items = query.limit(per_page + 1).all()
+    if len(items) <= per_page:
+        return items, None
+    items = items[:per_page]
+    last = items[-1]
+    key_names = key_names or [column.key for column, _ in order]
+    return items, encode_cursor({'k': [_encode_value(getattr(last, name)) for name in key_names]})
+
+def offset_cursor_paginate(query, cursor, per_page):
+    """Cursor pagination for orderings without stable keys (e.g. search relevance)"""
+    offset = decode_cursor(cursor).get('o', 0) if cursor else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise InvalidCursor('Invalid cursor')
+    items = query.limit(per_page + 1).offset(offset).all()
+    if len(items) <= per_page:
+        return items, None
+    return items[:per_page], encode_cursor({'o': offset + per_page})
@@ -0,0 +1,116 @@
+"""
+Post ranking scores for Astitva
+
+hot_score is a time-decayed engagement score: weighted points divided by
+(age in hours + 2) ^ gravity, so new activity lifts a post and age sinks it.
+best_score is the lower bound of the Wilson score interval for the share of
+upvotes, which ranks by confidence rather than raw totals.
+quality_score is the engagement rate: upvotes and comments per view, as a
+percentage capped at 100; it is only defined once a post has been viewed.
+
+Both are stored on the post and indexed. They are updated in place when a post
+is voted on, commented on or awarded, by the same UPDATE that changes its
+counters (the *_sql variants build the expressions), and `python maintenance.py
+refresh-rankings` recomputes them in bulk so hot scores keep decaying for posts
+that receive no activity.
+"""
+
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import Float, case, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+HOT_GRAVITY = 1.8
+HOT_BASE_POINTS = 1.0  # The author's implicit vote, so new posts start above old ones
+HOT_COMMENT_WEIGHT = 0.5
+HOT_AWARD_WEIGHT = 2.0
+WILSON_Z = 1.281551565545  # 80% confidence
+
+def _age_hours(created_at, now):
+    if created_at is None:
+        return 0.0
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return max((now - created_at).total_seconds() / 3600, 0.0)
+
+def hot_score(upvotes, downvotes, comments_count, awards_count, created_at, now=None):
+    now = now or datetime.now(timezone.utc)
+    points = (
+        HOT_BASE_POINTS + (upvotes or 0) - (downvotes or 0)
+        + HOT_COMMENT_WEIGHT * (comments_count or 0) + HOT_AWARD_WEIGHT * (awards_count or 0)
+    )
+    return points / (_age_hours(created_at, now) + 2) ** HOT_GRAVITY
+
+def best_score(upvotes, downvotes):
+    upvotes, downvotes = upvotes or 0, downvotes or 0
+    n = upvotes + downvotes
+    if n == 0:
+        return 0.0
+    p = upvotes / n
+    z2 = WILSON_Z * WILSON_Z
+    return (p + z2 / (2 * n) - WILSON_Z * math.sqrt((p * (1 - p) + z2 / (4 * n)) / n)) / (1 + z2 / n)
+
+def quality_score(upvotes, comments_count, views_count):
+    return min(((upvotes or 0) + (comments_count or 0)) / views_count * 100, 100.0)
+
+def hot_scores(upvotes, downvotes, comments_count, awards_count, age_hours):
+    """Vectorized hot_score over numpy arrays (ages already in hours)"""
+    points = (
+        HOT_BASE_POINTS + upvotes - downvotes
+        + HOT_COMMENT_WEIGHT * comments_count + HOT_AWARD_WEIGHT * awards_count
+    )
+    return points / np.power(np.maximum(age_hours, 0.0) + 2, HOT_GRAVITY)
+
+def best_scores(upvotes, downvotes):
+    """Vectorized best_score over numpy arrays"""
+    n = upvotes + downvotes
+    safe_n = np.maximum(n, 1)
+    p = upvotes / safe_n
+    z2 = WILSON_Z * WILSON_Z
+    bound = (p + z2 / (2 * safe_n) - WILSON_Z * np.sqrt((p * (1 - p) + z2 / (4 * safe_n)) / safe_n)) / (1 + z2 / safe_n)
+    return np.where(n > 0, bound, 0.0)
+
+def quality_scores(upvotes, comments_count, views_count):
+    """Vectorized quality_score over numpy arrays (views_count must be positive)"""
+    return np.minimum((upvotes + comments_count) / views_count * 100, 100.0)
+
+class epoch_seconds(FunctionElement):
+    """Seconds since the Unix epoch of a timestamp, in SQL"""
+    type = Float()
+    inherit_cache = True
+
+@compiles(epoch_seconds)
+def _epoch_seconds(element, compiler, **kw):
+    return 'EXTRACT(EPOCH FROM %s)' % compiler.process(element.clauses, **kw)
+
+@compiles(epoch_seconds, 'sqlite')
+def _epoch_seconds_sqlite(element, compiler, **kw):
+    return '((julianday(%s) - 2440587.5) * 86400.0)' % compiler.process(element.clauses, **kw)
+
+def hot_score_sql(upvotes, downvotes, comments_count, awards_count, created_at, now=None):
+    """hot_score as a SQL expression over counter expressions, for the SET clause of an UPDATE"""
+    now = now or datetime.now(timezone.utc)
+    points = (
+        HOT_BASE_POINTS + upvotes - downvotes
+        + HOT_COMMENT_WEIGHT * comments_count + HOT_AWARD_WEIGHT * awards_count
+    )
+    age_hours = (now.timestamp() - epoch_seconds(created_at)) / 3600
+    age_hours = case((created_at.is_(None), 0.0), (age_hours < 0, 0.0), else_=age_hours)
+    return points / func.power(age_hours + 2, HOT_GRAVITY)
+
+def best_score_sql(upvotes, downvotes):
+    """best_score as a SQL expression over counter expressions"""
+    n = upvotes + downvotes
+    safe_n = case((n > 0, n), else_=1) * 1.0
+    p = upvotes / safe_n
+    z2 = WILSON_Z * WILSON_Z
+    bound = (p + z2 / (2 * safe_n) - WILSON_Z * func.sqrt((p * (1 - p) + z2 / (4 * safe_n)) / safe_n)) / (1 + z2 / safe_n)
+    return case((n > 0, bound), else_=0.0)
+
+def quality_score_sql(upvotes, comments_count, views_count):
+    """quality_score as a SQL expression over counter expressions (views_count must be positive)"""
+    rate = (upvotes + comments_count) * 100.0 / views_count
+    return case((rate > 100, 100.0), else_=rate)
@@ -0,0 +1,220 @@
+"""
+Full-text search for Astitva
+
+On SQLite every searchable model gets an FTS5 table that triggers keep in sync
+with inserts, edits and hiding. On PostgreSQL the model gets a generated
+tsvector column with a GIN index. Any other backend (or a SQLite build without
+FTS5) falls back to ILIKE matching.
+"""
+
+import html
+import re
+
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, Post, JobPost
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TSVECTOR_WEIGHTS = 'ABCD'
+
+def search_terms(query, max_terms=8):
+    """Split a user query into lowercase word tokens used for prefix matching"""
+    return [term.lower() for term in TOKEN_RE.findall(query or '')][:max_terms]
+
+def highlight(value, terms, width=200):
+    """HTML-escaped excerpt of value around the first match, with matched words wrapped in <mark>.
+
+    width=None returns the whole value highlighted.
+    """
+    if not value:
+        return value
+    if not terms:
+        return html.escape(value[:width] if width else value)
+
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE)
+    start, end, prefix, suffix = 0, len(value), '', ''
+    if width and len(value) > width:
+        match = pattern.search(value)
+        start = max((match.start() if match else 0) - width // 4, 0)
+        end = min(start + width, len(value))
+        prefix = '…' if start > 0 else ''
+        suffix = '…' if end < len(value) else ''
+
+    excerpt = value[start:end]
+    parts, last = [], 0
+    for match in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[last:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group(0))}</mark>')
+        last = match.end()
+    parts.append(html.escape(excerpt[last:]))
+    return prefix + ''.join(parts) + suffix
+
+class FullTextIndex:
+    """Full-text index over some text columns of a model"""
+
+    def __init__(self, model, columns, weights, sqlite_visible='1'):
+        self.model = model
+        self.table = model.__tablename__
+        self.fts_table = f'{self.table}_fts'
+        self.columns = columns
+        self.weights = weights
+        # SQL condition (with a {row} placeholder) for rows that belong in the index
+        self.sqlite_visible = sqlite_visible
+        self._backends = {}
+
+    # Schema
+
+    def install(self, connection):
+        """Create the index and its sync triggers if missing (idempotent)"""
+        if connection.dialect.name == 'sqlite':
+            self._install_sqlite(connection)
+        elif connection.dialect.name == 'postgresql':
+            self._install_postgresql(connection)
+        self._backends.clear()
+
+    def _install_sqlite(self, connection):
+        installed = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"),
+            {'name': f'{self.fts_table}_ai'}
+        ).first()
+        if installed:
+            return
+
+        try:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table} USING fts5("
+                f"doc_id UNINDEXED, {', '.join(self.columns)}, "
+                f"tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+        except OperationalError:
+            return  # SQLite built without FTS5; searches fall back to LIKE
+
+        # The source table may have been recreated, so start from a clean index
+        self.rebuild(connection)
+
+        columns = ', '.join(self.columns)
+        new_values = ', '.join(f'NEW.{column}' for column in self.columns)
+        new_visible = self.sqlite_visible.format(row='NEW')
+        old_visible = self.sqlite_visible.format(row='OLD')
+        # Deletes match on rowid *and* doc_id so a rowid reshuffled by VACUUM can never
+        # remove another row's entry (rebuild-search-index cleans up after a VACUUM)
+        delete_old = (
+            f"DELETE FROM {self.fts_table} WHERE rowid = OLD.rowid AND doc_id = OLD.id AND {old_visible};"
+        )
+        insert_new = (
+            f"INSERT INTO {self.fts_table} (rowid, doc_id, {columns}) "
+            f"SELECT NEW.rowid, NEW.id, {new_values} WHERE {new_visible};"
+        )
+        watched = ', '.join(self.columns + self._visibility_columns())
+
+        for statement in [
+            f"CREATE TRIGGER IF NOT EXISTS {self.fts_table}_ai AFTER INSERT ON {self.table} BEGIN {insert_new} END",
+            f"CREATE TRIGGER IF NOT EXISTS {self.fts_table}_ad AFTER DELETE ON {self.table} BEGIN {delete_old} END",
+            f"CREATE TRIGGER IF NOT EXISTS {self.fts_table}_au AFTER UPDATE OF {watched} ON {self.table} "
+            f"BEGIN {delete_old} {insert_new} END",
+        ]:
+            connection.execute(text(statement))
+
+    def _visibility_columns(self):
+        return [
+            column for column in self.model.__table__.columns.keys()
+            if f'{{row}}.{column}' in self.sqlite_visible and column not in self.columns
+        ]
+
+    def _install_postgresql(self, connection):
+        vector = ' || '.join(
+            f"setweight(to_tsvector('simple', coalesce({column}, '')), '{TSVECTOR_WEIGHTS[i]}')"
+            for i, column in enumerate(self.columns)
+        )
+        connection.execute(text(
+            f"ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({vector}) STORED"
+        ))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{self.table}_search_vector ON {self.table} USING GIN (search_vector)"
+        ))
+
+    def rebuild(self, connection):
+        """Repopulate the SQLite index from the source table (PostgreSQL maintains itself)"""
+        if connection.dialect.name != 'sqlite':
+            return
+        columns = ', '.join(self.columns)
+        connection.execute(text(f"DELETE FROM {self.fts_table}"))
+        connection.execute(text(
+            f"INSERT INTO {self.fts_table} (rowid, doc_id, {columns}) "
+            f"SELECT rowid, id, {columns} FROM {self.table} WHERE {self.sqlite_visible.format(row=self.table)}"
+        ))
+
+    # Queries
+
+    def backend(self, bind):
+        key = str(bind.url)
+        if key not in self._backends:
+            backend = 'like'
+            with bind.connect() as connection:
+                if bind.dialect.name == 'sqlite':
+                    if connection.execute(
+                        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': self.fts_table}
+                    ).first():
+                        backend = 'fts5'
+                elif bind.dialect.name == 'postgresql':
+                    if connection.execute(text(
+                        "SELECT 1 FROM information_schema.columns "
+                        "WHERE table_name = :table AND column_name = 'search_vector'"
+                    ), {'table': self.table}).first():
+                        backend = 'tsvector'
+            self._backends[key] = backend
+        return self._backends[key]
+
+    def apply(self, query, terms):
+        """Restrict a model query to rows matching every term (as a prefix).
+
+        Returns (query, rank) where rank is an expression that sorts best matches first
+        when ordered ascending.
+        """
+        if not terms:
+            return query.filter(db.false()), db.literal(0)
+
+        backend = self.backend(db.session.get_bind(mapper=self.model))
+
+        if backend == 'fts5':
+            fts = db.table(self.fts_table, db.column('doc_id'))
+            fts_ref = db.literal_column(self.fts_table)
+            match = ' '.join(f'"{term}"*' for term in terms)
+            matches = db.select(
+                fts.c.doc_id.label('doc_id'),
+                db.func.bm25(fts_ref, 0.0, *self.weights).label('rank')
+            ).select_from(fts).where(fts_ref.op('MATCH')(match)).subquery()
+            return query.join(matches, matches.c.doc_id == self.model.id), matches.c.rank
+
+        if backend == 'tsvector':
+            tsquery = db.func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+            vector = db.literal_column(f'{self.table}.search_vector')
+            return query.filter(vector.op('@@')(tsquery)), -db.func.ts_rank(vector, tsquery)
+
+        return query.filter(db.and_(*[
+            db.or_(*[getattr(self.model, column).ilike(f'%{term}%') for column in self.columns])
+            for term in terms
+        ])), db.literal(0)
+
+post_search = FullTextIndex(
+    Post,
+    columns=['title', 'content'],
+    weights=[10.0, 1.0],
+    sqlite_visible='NOT COALESCE({row}.is_hidden, 0)'
+)
+
+job_search = FullTextIndex(
+    JobPost,
+    columns=['title', 'company', 'description', 'requirements'],
+    weights=[10.0, 5.0, 1.0, 1.0],
+    sqlite_visible='COALESCE({row}.is_active, 1)'
+)
+
+SEARCH_INDEXES = [post_search, job_search]
+
+@event.listens_for(db.metadata, 'after_create')
+def install_search_indexes(target, connection, **kw):
+    for index in SEARCH_INDEXES:
+        index.install(connection)
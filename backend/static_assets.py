@@ -0,0 +1,104 @@
+"""
+Serving the built frontend (dist) for Astitva
+
+The dist tree is indexed once at startup, so resolving a request path, and the
+SPA fallback to index.html, never touches the filesystem. Pre-compressed .br and
+.gz siblings written by build.py are served when the client accepts them.
+Vite's content-hashed files under assets/ are cached as immutable; everything
+else, index.html included, must be revalidated (ETag / 304) on each use.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response, send_file
+
+HASHED_ASSET_RE = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8,}\.\w+$')
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]  # In order of preference
+IMMUTABLE_MAX_AGE = 31536000
+
+def accepted_encodings(header):
+    """Content codings from an Accept-Encoding header, ignoring those with q=0"""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+class StaticManifest:
+    """In-memory index of a dist directory"""
+
+    def __init__(self, root, index='index.html'):
+        self.root = root
+        self.index = index
+        self.files = {}
+        self.index_variants = {}
+        if os.path.isdir(root):
+            self._scan()
+
+    def _scan(self):
+        siblings = set()
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                siblings.add(os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, '/'))
+
+        for path in siblings:
+            if any(path.endswith(suffix) and path[:-len(suffix)] in siblings for _, suffix in ENCODINGS):
+                continue  # A compressed variant, served through its original
+            stat = os.stat(os.path.join(self.root, path))
+            self.files[path] = {
+                'mimetype': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                'immutable': bool(HASHED_ASSET_RE.match(path)),
+                'etag': f"{stat.st_size:x}-{stat.st_mtime_ns:x}",
+                'encodings': {coding: path + suffix for coding, suffix in ENCODINGS if path + suffix in siblings}
+            }
+
+        # index.html is small and answers every client-side route, so keep it in memory
+        if self.index in self.files:
+            for coding, variant in [(None, self.index)] + list(self.files[self.index]['encodings'].items()):
+                with open(os.path.join(self.root, variant), 'rb') as f:
+                    data = f.read()
+                self.index_variants[coding] = (data, hashlib.sha256(data).hexdigest()[:32])
+
+    def resolve(self, path):
+        """The manifest path to serve for a request path (SPA fallback included), or None"""
+        path = path.lstrip('/')
+        if path in self.files:
+            return path
+        return self.index if self.index in self.files else None
+
+    def response(self, path, request):
+        """Response for a resolved manifest path, honouring Accept-Encoding and conditional headers"""
+        entry = self.files[path]
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+        coding = next((coding for coding, _ in ENCODINGS if coding in accepted and coding in entry['encodings']), None)
+
+        if path == self.index:
+            data, etag = self.index_variants[coding]
+            response = Response(data, mimetype=entry['mimetype'])
+            response.set_etag(etag)
+            response.make_conditional(request)
+        else:
+            response = send_file(
+                os.path.join(self.root, entry['encodings'][coding] if coding else path),
+                mimetype=entry['mimetype'],
+                conditional=True,
+                etag=f"{entry['etag']}-{coding}" if coding else entry['etag'],
+                max_age=IMMUTABLE_MAX_AGE if entry['immutable'] else None
+            )
+
+        if coding:
+            response.headers['Content-Encoding'] = coding
+        if entry['encodings']:
+            response.vary.add('Accept-Encoding')
+        if entry['immutable']:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
@@ -0,0 +1,44 @@
+"""
+Shared fixtures for the backend tests
+
+Tests run against TestingConfig (in-memory SQLite) with the fake chat model,
+so no network access or API keys are needed:
+
+    cd backend && python -m pytest
+"""
+
+import os
+import sys
+
+os.environ.setdefault('CHAT_MODEL_BACKEND', 'fake')
+os.environ.setdefault('CHAT_FAKE_CHUNK_DELAY', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from config import TestingConfig
+from models import db
+
+@pytest.fixture
+def make_app(monkeypatch, tmp_path):
+    """Build an app from TestingConfig with some settings overridden, tables created"""
+    def make(**settings):
+        from app import create_app
+        monkeypatch.setattr(TestingConfig, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'), raising=False)
+        monkeypatch.setattr(TestingConfig, 'RATELIMIT_ENABLED', False, raising=False)
+        for name, value in settings.items():
+            monkeypatch.setattr(TestingConfig, name, value, raising=False)
+        app = create_app('testing')
+        with app.app_context():
+            db.create_all()
+        return app
+    return make
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,133 @@
+import time
+
+import pytest
+from sqlalchemy import event
+
+from api_cache import DatabaseTagVersions, api_cache_enabled
+from cache import FAKE_REDIS
+from models import db, Post, PostCategory
+
+@pytest.fixture(autouse=True)
+def empty_fake_redis():
+    FAKE_REDIS._data.clear()
+    yield
+    FAKE_REDIS._data.clear()
+
+@pytest.fixture
+def shared_app(make_app, tmp_path):
+    """Two apps standing in for two workers: one database file, one fake Redis"""
+    uri = f"sqlite:///{tmp_path / 'shared.db'}"
+    return lambda **settings: make_app(SQLALCHEMY_DATABASE_URI=uri, CACHE_BACKEND='fake', **settings)
+
+def sync_user(client, name):
+    response = client.post('/api/users/sync', json={
+        'clerk_id': name, 'username': name, 'email': f'{name}@example.com', 'first_name': 'Test', 'last_name': 'User'
+    })
+    return response.get_json()['user']['id']
+
+def create_post(client, user_id, title):
+    response = client.post('/api/posts', json={
+        'user_id': user_id, 'title': title, 'content': 'Cache test content', 'category': 'Career'
+    })
+    assert response.status_code == 201
+    return response.get_json()['post']['id']
+
+def titles(client):
+    return [post['title'] for post in client.get('/api/posts').get_json()['posts']]
+
+def count_queries(app):
+    counter = {'queries': 0}
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: counter.update(queries=counter['queries'] + 1))
+    return counter
+
+def test_repeated_read_is_served_without_queries(app, client):
+    user_id = sync_user(client, 'reader')
+    create_post(client, user_id, 'First post')
+    assert titles(client) == ['First post']
+
+    counter = count_queries(app)
+    assert titles(client) == ['First post']
+    assert counter['queries'] == 0
+
+def test_write_endpoint_invalidates_its_tags(client):
+    user_id = sync_user(client, 'writer')
+    create_post(client, user_id, 'First post')
+    assert titles(client) == ['First post']
+
+    create_post(client, user_id, 'Second post')
+    assert titles(client) == ['Second post', 'First post']
+
+def test_invalidation_reaches_other_workers_through_the_shared_tier(shared_app):
+    worker_a, worker_b = shared_app().test_client(), shared_app().test_client()
+    user_id = sync_user(worker_a, 'author')
+    create_post(worker_a, user_id, 'First post')
+    assert titles(worker_a) == titles(worker_b) == ['First post']
+
+    create_post(worker_a, user_id, 'Second post')
+    assert titles(worker_b) == ['Second post', 'First post']
+
+def test_entries_expire_after_their_ttl(make_app):
+    app = make_app(API_CACHE_TTLS={'posts': 1, 'comments': 1, 'user_posts': 1, 'user_profile': 1, 'jobs': 1})
+    client = app.test_client()
+    user_id = sync_user(client, 'ttl')
+    create_post(client, user_id, 'First post')
+    assert titles(client) == ['First post']
+
+    # A change no write endpoint announces is only picked up once the entry expires
+    with app.app_context():
+        db.session.add(Post(title='Imported post', content='Added directly', category=PostCategory.CAREER, user_id=user_id))
+        db.session.commit()
+    assert titles(client) == ['First post']
+
+    time.sleep(1.1)
+    assert titles(client) == ['Imported post', 'First post']
+
+@pytest.mark.parametrize('settings, enabled', [
+    ({'API_CACHE_ENABLED': 'auto', 'CACHE_BACKEND': 'memory', 'DEBUG': True}, True),
+    ({'API_CACHE_ENABLED': 'auto', 'CACHE_BACKEND': 'memory', 'DEBUG': False}, False),
+    ({'API_CACHE_ENABLED': 'auto', 'CACHE_BACKEND': 'redis', 'DEBUG': False, 'WEB_CONCURRENCY': 4}, True),
+    ({'API_CACHE_ENABLED': 'true', 'CACHE_BACKEND': 'memory', 'DEBUG': False, 'WEB_CONCURRENCY': 1}, True),
+    ({'API_CACHE_ENABLED': 'true', 'CACHE_BACKEND': 'memory', 'DEBUG': True, 'WEB_CONCURRENCY': 4}, False),
+    ({'API_CACHE_ENABLED': False, 'CACHE_BACKEND': 'redis'}, False),
+])
+def test_per_process_cache_needs_a_single_worker(settings, enabled):
+    assert api_cache_enabled(settings) is enabled
+
+def shared_tier_down(*args, **kwargs):
+    raise ConnectionError('Redis unreachable')
+
+@pytest.mark.parametrize('settings, tier_down', [
+    ({'API_CACHE_ENABLED': 'false'}, False),
+    ({'CACHE_BACKEND': 'fake'}, True),
+])
+def test_uncached_responses_revalidate_before_the_view_runs(make_app, monkeypatch, settings, tier_down):
+    if tier_down:
+        monkeypatch.setattr(FAKE_REDIS, 'mget', shared_tier_down)
+    app = make_app(**settings)
+    client = app.test_client()
+    user_id = sync_user(client, 'etag')
+    create_post(client, user_id, 'First post')
+
+    response = client.get('/api/posts')
+    assert response.status_code == 200 and response.headers['ETag'].startswith('W/')
+    etag, modified = response.headers['ETag'], response.headers['Last-Modified']
+
+    counter = count_queries(app)
+    assert client.get('/api/posts', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/posts', headers={'If-Modified-Since': modified}).status_code == 304
+    assert counter['queries'] == 2  # One tag version lookup each; the view never ran
+
+    create_post(client, user_id, 'Second post')
+    response = client.get('/api/posts', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [post['title'] for post in response.get_json()['posts']] == ['Second post', 'First post']
+
+def test_body_etag_is_the_last_resort(make_app, monkeypatch):
+    monkeypatch.setattr(DatabaseTagVersions, 'get', lambda self, tags: None)
+    client = make_app(API_CACHE_ENABLED='false').test_client()
+    create_post(client, sync_user(client, 'fallback'), 'First post')
+
+    response = client.get('/api/posts')
+    assert 'Last-Modified' not in response.headers
+    assert client.get('/api/posts', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
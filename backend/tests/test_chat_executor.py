@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from chat import FAKE_REPLY, ChatExecutor, ChatUnavailable, CircuitBreaker, FakeGenerativeModel
+
+class FailingModel(FakeGenerativeModel):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        raise RuntimeError('upstream down')
+
+def executor(breaker, **options):
+    options = {'max_workers': 2, 'max_queue': 0, 'timeout': 1, **options}
+    return ChatExecutor(breaker=breaker, **options)
+
+def test_closed_breaker_lets_calls_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    model = executor(breaker).wrap(FakeGenerativeModel())
+
+    assert model.generate_content('hi').text == FAKE_REPLY
+    assert breaker.state == 'closed'
+
+def test_breaker_opens_after_consecutive_failures_and_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    failing = FailingModel()
+    model = executor(breaker).wrap(failing)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            model.generate_content('hi')
+    assert breaker.state == 'open'
+
+    with pytest.raises(ChatUnavailable) as error:
+        model.generate_content('hi')
+    assert error.value.status == 503
+    assert error.value.retry_after >= 1
+    assert failing.calls == 2  # Rejected without reaching the model
+
+def test_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+    assert not breaker.allow()  # The trial is still running
+
+def test_successful_trial_closes_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    chat = executor(breaker)
+    with pytest.raises(RuntimeError):
+        chat.wrap(FailingModel()).generate_content('hi')
+    time.sleep(0.06)
+
+    assert chat.wrap(FakeGenerativeModel()).generate_content('hi').text == FAKE_REPLY
+    assert breaker.state == 'closed'
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    chat = executor(breaker)
+    with pytest.raises(RuntimeError):
+        chat.wrap(FailingModel()).generate_content('hi')
+    time.sleep(0.06)
+
+    with pytest.raises(RuntimeError):
+        chat.wrap(FailingModel()).generate_content('hi')
+    assert breaker.state == 'open'
+
+def test_full_pool_rejects_with_retry_after():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    chat = executor(breaker, max_workers=1, max_queue=0, timeout=2)
+    slow = threading.Thread(target=chat.wrap(FakeGenerativeModel(delay=0.3)).generate_content, args=('hi',))
+    slow.start()
+    time.sleep(0.05)
+
+    with pytest.raises(ChatUnavailable) as error:
+        chat.wrap(FakeGenerativeModel()).generate_content('hi')
+    slow.join()
+
+    assert error.value.status == 503
+    assert error.value.retry_after >= 1
+    assert chat.rejected == 1
+    assert breaker.state == 'closed'
+
+def test_busy_rejection_does_not_consume_the_half_open_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.5)
+    chat = executor(breaker, max_workers=1, max_queue=0, timeout=0.2)
+
+    # A timed-out call keeps its pool slot until the upstream call really ends
+    with pytest.raises(ChatUnavailable) as timeout:
+        chat.wrap(FakeGenerativeModel(delay=1.0)).generate_content('hi')
+    assert timeout.value.status == 504
+    assert breaker.state == 'open'
+
+    time.sleep(0.6)
+    assert breaker.state == 'half_open'
+    with pytest.raises(ChatUnavailable, match='busy'):
+        chat.wrap(FakeGenerativeModel()).generate_content('hi')
+
+    time.sleep(0.5)  # The slow call has finished and freed its slot
+    assert chat.wrap(FakeGenerativeModel()).generate_content('hi').text == FAKE_REPLY
+    assert breaker.state == 'closed'
@@ -0,0 +1,116 @@
+import json
+import time
+
+import pytest
+
+from chat import FAKE_REPLY, ChatExecutor, CircuitBreaker, FakeChunk, FakeGenerativeModel, stream_chat
+
+class RecordingModel(FakeGenerativeModel):
+    """Fake model that keeps the streams it hands out"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.streams = []
+
+    def generate_content(self, prompt, stream=False):
+        response = super().generate_content(prompt, stream=stream)
+        if stream:
+            self.streams.append(response)
+        return response
+
+class BrokenStream:
+    """Streams two chunks, then loses the upstream connection"""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def __iter__(self):
+        yield FakeChunk('Hello ')
+        yield FakeChunk('there')
+        raise ConnectionError('upstream reset')
+
+    def cancel(self):
+        self.cancelled = True
+
+class BrokenModel(FakeGenerativeModel):
+    def generate_content(self, prompt, stream=False):
+        return BrokenStream()
+
+def parse_events(body):
+    """(event, data) for each server-sent event; plain data events are named 'message'"""
+    events = []
+    for block in body.split('\n\n'):
+        if not block.strip():
+            continue
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields.get('event', 'message'), json.loads(fields['data'])))
+    return events
+
+@pytest.fixture
+def use_model(monkeypatch):
+    """Make the chat endpoints build the given model"""
+    def use(model):
+        monkeypatch.setattr('app.create_chat_model', lambda config: model)
+        return model
+    return use
+
+@pytest.fixture
+def chat_client(make_app):
+    return make_app(CHAT_CACHE_ENABLED=False).test_client()
+
+def test_stream_sends_tokens_then_done(chat_client):
+    response = chat_client.post('/api/chat/stream', json={'query': 'Where can I get help?'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    events = parse_events(response.get_data(as_text=True))
+    names = [name for name, _ in events]
+    assert names == ['message'] * (len(events) - 1) + ['done']
+
+    tokens = [data['token'] for name, data in events[:-1]]
+    assert ''.join(tokens) == FAKE_REPLY
+    done = events[-1][1]
+    assert done['response'] == FAKE_REPLY
+    assert done['chunks'] == len(tokens)
+    assert done['time_to_first_token_ms'] <= done['total_ms']
+
+def test_upstream_failure_ends_the_stream_with_an_error_event(chat_client, use_model):
+    use_model(BrokenModel())
+    response = chat_client.post('/api/chat/stream', json={'query': 'Where can I get help?'})
+
+    events = parse_events(response.get_data(as_text=True))
+    assert events[:2] == [('message', {'token': 'Hello '}), ('message', {'token': 'there'})]
+    name, data = events[-1]
+    assert name == 'error'
+    assert data['detail'] == 'upstream reset'
+    assert 'done' not in [name for name, _ in events]
+
+def test_client_disconnect_cancels_the_upstream_stream(make_app, use_model):
+    app = make_app(CHAT_CACHE_ENABLED=False)
+    model = use_model(RecordingModel(chunk_delay=0.02))
+    response = app.test_client().post('/api/chat/stream', json={'query': 'Where can I get help?'}, buffered=False)
+
+    chunks = iter(response.response)
+    assert 'token' in next(chunks).decode()
+    response.close()  # What the WSGI server does when the client goes away
+
+    upstream, = model.streams
+    deadline = time.monotonic() + 2
+    while not upstream.cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert upstream.cancelled
+
+def test_abandoned_stream_frees_its_pool_slot():
+    chat = ChatExecutor(max_workers=1, max_queue=0, timeout=1, breaker=CircuitBreaker(failure_threshold=1))
+    model = RecordingModel(chunk_delay=0.02)
+    stream = stream_chat(chat.wrap(model).generate_content('hi', stream=True))
+    assert 'token' in next(stream)
+    stream.close()
+
+    deadline = time.monotonic() + 2
+    while chat.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert chat.in_flight == 0
+    assert model.streams[0].cancelled
+    assert chat.breaker.state == 'closed'  # Not counted as an upstream failure
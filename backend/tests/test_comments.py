@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from models import db, User, Post, Comment, PostCategory
+
+@pytest.fixture
+def thread(app):
+    """A post with 2,500 top-level comments, newest first by index, and replies under the newest"""
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        user = User(clerk_id='commenter', username='commenter', email='commenter@example.com',
+                    first_name='Test', last_name='User')
+        db.session.add(user)
+        db.session.flush()
+        post = Post(title='Busy thread', content='Lots to say', category=PostCategory.CAREER, user_id=user.id)
+        db.session.add(post)
+        db.session.flush()
+
+        roots = [
+            Comment(content=f'Root {i}', post_id=post.id, user_id=user.id, created_at=now - timedelta(seconds=i))
+            for i in range(2500)
+        ]
+        db.session.add_all(roots)
+        db.session.flush()
+        replies = [
+            Comment(content=f'Reply {i}', post_id=post.id, user_id=user.id, parent_id=roots[0].id,
+                    score=i, created_at=now - timedelta(seconds=i))
+            for i in range(15)
+        ]
+        db.session.add_all(replies)
+        db.session.flush()
+        db.session.add(Comment(content='Nested', post_id=post.id, user_id=user.id, parent_id=replies[-1].id))
+        hidden = Comment(content='Hidden', post_id=post.id, user_id=user.id, parent_id=roots[0].id, score=100)
+        db.session.add(hidden)
+        roots[0].replies_count, replies[-1].replies_count = 16, 1  # As create_comment maintains them
+        db.session.flush()
+        hidden.set_hidden(True)
+        db.session.commit()
+        return post.id
+
+def contents(comments):
+    return [comment['content'] for comment in comments]
+
+def test_roots_past_the_old_thread_cap_are_reachable(client, thread):
+    body = client.get(f'/api/posts/{thread}/comments?page=125&per_page=20').get_json()
+    assert body['pagination']['total'] == 2500
+    assert body['pagination']['pages'] == 125
+    assert contents(body['comments']) == [f'Root {i}' for i in range(2480, 2500)]
+
+def test_cursor_pages_cover_every_root(client, thread):
+    seen, cursor = [], ''
+    while cursor is not None:
+        body = client.get(f'/api/posts/{thread}/comments?per_page=50&cursor={cursor}').get_json()
+        assert 'total' not in body['pagination']  # Cursor pages run no COUNT unless asked
+        seen += contents(body['comments'])
+        cursor = body['pagination']['next_cursor']
+    assert seen == [f'Root {i}' for i in range(2500)]
+
+def test_cursor_total_is_opt_in(client, thread):
+    body = client.get(f'/api/posts/{thread}/comments?cursor=&include_total=1').get_json()
+    assert body['pagination']['total'] == 2500
+
+def test_replies_are_ranked_by_score_and_limited(client, thread):
+    first = client.get(f'/api/posts/{thread}/comments?per_page=1&replies_limit=5').get_json()['comments'][0]
+    assert contents(first['replies']) == ['Reply 14', 'Reply 13', 'Reply 12', 'Reply 11', 'Reply 10']
+    assert first['more_replies']['count'] == 10  # The hidden reply is not counted
+
+    # Depth 2 stops at the replies; the nested comment is only announced
+    assert 'replies' not in first['replies'][0]
+    assert first['replies'][0]['more_replies']['count'] == 1
+
+def test_unhiding_a_reply_counts_it_again(app, client, thread):
+    with app.app_context():
+        Comment.query.filter_by(content='Hidden').one().set_hidden(False)
+        db.session.commit()
+    first = client.get(f'/api/posts/{thread}/comments?per_page=1&replies_limit=5').get_json()['comments'][0]
+    assert contents(first['replies'])[0] == 'Hidden'
+    assert first['more_replies']['count'] == 11
+
+def test_continuation_loads_the_next_replies(client, thread):
+    first = client.get(f'/api/posts/{thread}/comments?per_page=1&replies_limit=5').get_json()['comments'][0]
+    token = first['more_replies']['continuation']
+
+    body = client.get(f'/api/posts/{thread}/comments?replies_limit=5&continuation={token}').get_json()
+    assert contents(body['comments']) == ['Reply 9', 'Reply 8', 'Reply 7', 'Reply 6', 'Reply 5']
+
+    body = client.get(f"/api/posts/{thread}/comments?replies_limit=5&continuation={body['continuation']}").get_json()
+    assert contents(body['comments']) == ['Reply 4', 'Reply 3', 'Reply 2', 'Reply 1', 'Reply 0']
+    assert body['continuation'] is None
+
+    token = first['replies'][0]['more_replies']['continuation']
+    body = client.get(f'/api/posts/{thread}/comments?continuation={token}').get_json()
+    assert contents(body['comments']) == ['Nested']
+
+def test_reply_counts_need_no_count_queries(app, client, thread):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    client.get(f'/api/posts/{thread}/comments?per_page=20&depth=3&cursor=')
+    # Roots, then the replies of two levels; more_replies comes from replies_count
+    assert len(statements) == 3
+    assert not any('count(' in statement.lower() for statement in statements)
+
+    statements.clear()
+    first = client.get(f'/api/posts/{thread}/comments?per_page=1&replies_limit=5&cursor=').get_json()['comments'][0]
+    statements.clear()
+    client.get(f"/api/posts/{thread}/comments?replies_limit=5&continuation={first['more_replies']['continuation']}")
+    assert not any('count(' in statement.lower() for statement in statements)
+
+def test_repair_reply_counts_recounts_visible_replies(app, thread):
+    from maintenance import repair_reply_counts
+    with app.app_context():
+        db.session.execute(db.update(Comment).values(replies_count=7))
+        repair_reply_counts()
+        counts = dict(db.session.query(Comment.content, Comment.replies_count).filter(Comment.replies_count > 0))
+    assert counts == {'Root 0': 15, 'Reply 14': 1}
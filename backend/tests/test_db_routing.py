@@ -0,0 +1,92 @@
+import sqlite3
+import time
+
+import pytest
+
+from db_routing import REPLICA_BIND
+from models import db, Post
+
+@pytest.fixture
+def databases(tmp_path):
+    return tmp_path / 'primary.db', tmp_path / 'replica.db'
+
+@pytest.fixture
+def routed_app(make_app, databases):
+    primary, replica = databases
+    app = make_app(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{primary}',
+        REPLICA_DATABASE_URL=f'sqlite:///{replica}',
+        REPLICA_STICKY_SECONDS=1,
+        API_CACHE_ENABLED=False
+    )
+    with app.app_context():
+        db.metadata.create_all(db.engines[REPLICA_BIND])
+    yield app
+    # Registering the bind added an (empty) metadata to the shared db object; later apps have no such bind
+    db.metadatas.pop(REPLICA_BIND, None)
+
+def replicate(databases):
+    """Bring the replica up to date, as replication eventually would"""
+    primary, replica = databases
+    with sqlite3.connect(primary) as source, sqlite3.connect(replica) as target:
+        source.backup(target)
+
+def post_count(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+
+def client_at(app, address):
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = address
+    return client
+
+def write_post(client, databases, title):
+    """Create a user and a post through the API; the user is replicated, the post not yet"""
+    response = client.post('/api/users/sync', json={
+        'clerk_id': title, 'username': title, 'email': f'{title}@example.com', 'first_name': 'Test', 'last_name': 'User'
+    })
+    replicate(databases)
+    response = client.post('/api/posts', json={
+        'user_id': response.get_json()['user']['id'], 'title': title, 'content': 'Routing test', 'category': 'Career'
+    })
+    assert response.status_code == 201
+
+def titles(client):
+    return [post['title'] for post in client.get('/api/posts').get_json()['posts']]
+
+def test_writes_go_to_the_primary(routed_app, databases):
+    write_post(client_at(routed_app, '10.0.0.1'), databases, 'Written')
+    assert post_count(databases[0]) == 1
+    assert post_count(databases[1]) == 0
+
+def test_reads_go_to_the_replica(routed_app, databases):
+    write_post(client_at(routed_app, '10.0.0.1'), databases, 'Lagging')
+    reader = client_at(routed_app, '10.0.0.2')
+    assert titles(reader) == []
+
+    replicate(databases)
+    assert titles(reader) == ['Lagging']
+
+def test_locking_reads_and_writes_use_the_primary_during_get(routed_app):
+    with routed_app.test_request_context('/api/posts', method='GET'):
+        routed_app.preprocess_request()
+        replica, primary = db.engines[REPLICA_BIND], db.engine
+
+        assert db.session.get_bind(clause=db.select(Post)) is replica
+        assert db.session.get_bind(clause=db.select(Post).with_for_update()) is primary
+        assert db.session.get_bind(clause=db.update(Post).values(views_count=1)) is primary
+
+def test_non_get_requests_read_from_the_primary(routed_app):
+    with routed_app.test_request_context('/api/posts', method='POST'):
+        routed_app.preprocess_request()
+        assert db.session.get_bind(clause=db.select(Post)) is db.engine
+
+def test_writer_reads_its_own_writes_for_the_sticky_window(routed_app, databases):
+    writer = client_at(routed_app, '10.0.0.1')
+    write_post(writer, databases, 'Mine')
+
+    assert titles(writer) == ['Mine']
+    assert titles(client_at(routed_app, '10.0.0.2')) == []
+
+    time.sleep(1.1)
+    assert titles(writer) == []  # Back on the replica, which has not caught up
@@ -0,0 +1,55 @@
+import io
+import json
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from media import manifest_filename
+
+@pytest.fixture
+def media_app(make_app):
+    return make_app(MEDIA_PROCESSING='inline', MEDIA_PENDING_TIMEOUT=60)
+
+def png():
+    data = io.BytesIO()
+    Image.new('RGB', (32, 32), 'purple').save(data, 'PNG')
+    data.seek(0)
+    return data
+
+def upload(client):
+    response = client.post('/api/upload', data={'file': (png(), 'picture.png', 'image/png')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.get_json()
+
+def set_manifest(app, upload_id, status, age=0):
+    path = os.path.join(app.config['UPLOAD_FOLDER'], manifest_filename(upload_id))
+    with open(path) as f:
+        state = json.load(f)
+    with open(path, 'w') as f:
+        json.dump({'status': status, 'original': state['original']}, f)
+    written = time.time() - age
+    os.utime(path, (written, written))
+
+def test_upload_renders_once(media_app):
+    client = media_app.test_client()
+    first = upload(client)
+    assert first['manifest']['status'] == 'ready' and not first['duplicate']
+
+    repeat = upload(client)
+    assert repeat['duplicate'] and repeat['manifest'] == first['manifest']
+
+@pytest.mark.parametrize('status, age, requeued', [
+    ('failed', 0, True),
+    ('pending', 120, True),
+    ('pending', 5, False),
+])
+def test_duplicate_requeues_stuck_renditions(media_app, status, age, requeued):
+    client = media_app.test_client()
+    upload_id = upload(client)['manifest']['id']
+    set_manifest(media_app, upload_id, status, age)
+
+    manifest = upload(client)['manifest']
+    assert manifest['status'] == ('ready' if requeued else status)
@@ -0,0 +1,158 @@
+"""
+Statement counts of the read endpoints
+
+Listings must run the same statements whatever the page size: the viewer's
+votes come from one IN query per page, and serialization runs no SQL of its own.
+Each test records the statements of a request at a small and a large per_page
+and compares them.
+"""
+
+import pytest
+from sqlalchemy import event
+
+from models import db
+
+SMALL, LARGE = 2, 10
+
+def sync_user(client, name):
+    response = client.post('/api/users/sync', json={
+        'clerk_id': name, 'username': name, 'email': f'{name}@example.com', 'first_name': 'Test', 'last_name': 'User'
+    })
+    return response.get_json()['user']['id']
+
+@pytest.fixture
+def community(make_app):
+    """A viewer following three authors, with a dozen voted posts by the first and a voted discussion on the last"""
+    app = make_app(API_CACHE_ENABLED=False)
+    client = app.test_client()
+    viewer = sync_user(client, 'viewer')
+    authors = [sync_user(client, f'author{i}') for i in range(3)]
+    for author in authors:
+        assert client.post(f'/api/users/{author}/follow', json={'user_id': viewer}).status_code == 200
+
+    posts = []
+    for i in range(12):
+        response = client.post('/api/posts', json={
+            'user_id': authors[0], 'title': f'Post {i}', 'content': 'Counted', 'category': 'Career'
+        })
+        posts.append(response.get_json()['post']['id'])
+        client.post(f'/api/posts/{posts[-1]}/vote', json={'user_id': viewer, 'vote_type': 'upvote'})
+
+    def comment(content, parent_id=None):
+        response = client.post(f'/api/posts/{posts[-1]}/comments', json={
+            'user_id': authors[len(content) % 3], 'content': content, 'parent_id': parent_id
+        })
+        comment_id = response.get_json()['comment']['id']
+        client.post(f'/api/comments/{comment_id}/vote', json={'user_id': viewer, 'vote_type': 'downvote'})
+        return comment_id
+
+    for i in range(LARGE):
+        root = comment(f'Root {i}')
+        for j in range(2):
+            comment(f'Nested {i}', comment(f'Reply {i}.{j}', root))
+
+    return app, {'viewer': viewer, 'author': authors[0], 'others': authors[1:], 'post': posts[-1]}
+
+def statements_of(app, url):
+    """The statements a GET runs, and its JSON body"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = app.test_client().get(url)
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return statements, response.get_json()
+
+def assert_constant(app, url, items, **ids):
+    """Same statements at both page sizes (the pages really differ in size); returns the large page's"""
+    small, small_body = statements_of(app, url.format(per_page=SMALL, **ids))
+    large, large_body = statements_of(app, url.format(per_page=LARGE, **ids))
+    assert (len(small_body[items]), len(large_body[items])) == (SMALL, LARGE)
+    assert len(small) == len(large), '\n'.join(large)
+    return large, large_body
+
+def vote_queries(statements):
+    return [statement for statement in statements if 'FROM votes' in statement]
+
+@pytest.mark.parametrize('url', [
+    '/api/posts?per_page={per_page}&user_id={viewer}',
+    '/api/posts?per_page={per_page}&cursor=&user_id={viewer}',
+    '/api/users/{author}/posts?per_page={per_page}&requesting_user_id={viewer}',
+    '/api/users/{viewer}/feed?per_page={per_page}',
+])
+def test_post_votes_are_one_query_per_page(community, url):
+    app, ids = community
+    statements, body = assert_constant(app, url, 'posts', **ids)
+    assert len(vote_queries(statements)) == 1
+    assert {post['user_vote'] for post in body['posts']} == {'upvote'}
+
+def test_comment_votes_are_one_query_per_page(community):
+    app, ids = community
+    url = '/api/posts/{post}/comments?per_page={per_page}&user_id={viewer}'
+    statements, body = assert_constant(app, url, 'comments', **ids)
+    assert len(vote_queries(statements)) == 1
+    assert {comment['user_vote'] for comment in body['comments']} == {'downvote'}
+    assert {reply['user_vote'] for comment in body['comments'] for reply in comment['replies']} == {'downvote'}
+
+@pytest.mark.parametrize('url', [
+    '/api/posts?per_page={per_page}&user_id={viewer}',
+    '/api/posts?per_page={per_page}&sort_by=hot&cursor=',
+    '/api/users/{author}/posts?per_page={per_page}',
+    '/api/users/{viewer}/feed?per_page={per_page}&cursor=',
+])
+def test_post_listings_serialize_without_sql(community, url):
+    """After the page query only its COUNT and the vote lookup run: no author or other lazy loads"""
+    app, ids = community
+    statements, _ = assert_constant(app, url, 'posts', **ids)
+    page = next(i for i, statement in enumerate(statements) if 'FROM posts' in statement and 'count(' not in statement)
+    assert 'users.username' in statements[page]  # Authors come with the page
+    assert all('count(' in statement or 'FROM votes' in statement for statement in statements[page + 1:]), \
+        '\n'.join(statements[page + 1:])
+
+def test_comment_tree_queries_depend_on_depth_only(community):
+    """One query per tree level, whatever the page size and replies_limit"""
+    app, ids = community
+    url = '/api/posts/{post}/comments?per_page={per_page}&depth={depth}&replies_limit={limit}&user_id={viewer}'
+    counts = {}
+    for depth in (1, 2, 3):
+        small, _ = statements_of(app, url.format(per_page=SMALL, depth=depth, limit=1, **ids))
+        large, body = statements_of(app, url.format(per_page=LARGE, depth=depth, limit=2, **ids))
+        assert len(small) == len(large), '\n'.join(large)
+        counts[depth] = len(large)
+    assert counts[2] - counts[1] == counts[3] - counts[2] == 1
+    assert [len(comment['replies']) for comment in body['comments']] == [2] * LARGE
+    assert all(len(reply['replies']) == 1 for comment in body['comments'] for reply in comment['replies'])
+
+def test_profile_is_one_primary_key_lookup(community):
+    """Profile counters are columns on the user row, not COUNT queries"""
+    app, ids = community
+    statements, body = statements_of(app, f"/api/users/{ids['author']}")
+    users = [statement for statement in statements if 'cache_tags' not in statement]  # Minus the validator lookup
+    assert len(users) == 1 and 'FROM users' in users[0] and 'count(' not in users[0].lower()
+    counts = {name: body['user'][name] for name in ('followers_count', 'following_count', 'posts_count', 'comments_count')}
+    assert counts == {'followers_count': 1, 'following_count': 0, 'posts_count': 12, 'comments_count': 30}
+
+@pytest.mark.parametrize('cursor', ['', '&cursor='])
+def test_feed_is_one_timeline_range_read(community, cursor):
+    """The page comes from the viewer's timeline entries; posts by more of the followed authors add no statements"""
+    app, ids = community
+    url = '/api/users/{viewer}/feed?per_page={per_page}' + cursor
+    statements, _ = assert_constant(app, url, 'posts', **ids)
+    page, = [statement for statement in statements if 'FROM posts' in statement and 'count(' not in statement]
+    assert 'JOIN timeline_entries' in page and 'user_followers' not in page
+
+    client = app.test_client()
+    for author in ids['others']:
+        assert client.post('/api/posts', json={
+            'user_id': author, 'title': 'Fanned out', 'content': 'Counted', 'category': 'Career'
+        }).status_code == 201
+    more, body = statements_of(app, url.format(per_page=LARGE, **ids))
+    assert len(more) == len(statements)
+    assert [post['title'] for post in body['posts'][:2]] == ['Fanned out'] * 2
@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import event
+
+from models import db, User, Post, Comment, Vote, PostCategory
+from ranking import hot_score, best_score, quality_score
+
+@pytest.fixture
+def voting(make_app):
+    """An app with a post and comment by an author, and a separate voter"""
+    app = make_app(API_CACHE_ENABLED=False)
+    with app.app_context():
+        author, voter = [
+            User(clerk_id=name, username=name, email=f'{name}@example.com', first_name='Test', last_name='User')
+            for name in ('author', 'voter')
+        ]
+        db.session.add_all([author, voter])
+        db.session.flush()
+        post = Post(title='Voted post', content='Counters', category=PostCategory.CAREER, user_id=author.id, views_count=4)
+        db.session.add(post)
+        db.session.flush()
+        comment = Comment(content='Voted comment', post_id=post.id, user_id=author.id)
+        db.session.add(comment)
+        db.session.commit()
+        return app, {'author': author.id, 'voter': voter.id, 'post': post.id, 'comment': comment.id}
+
+def vote(client, url, user_id, vote_type):
+    response = client.post(url, json={'user_id': user_id, 'vote_type': vote_type})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+def test_toggles_keep_counters_votes_and_karma_in_step(voting):
+    app, ids = voting
+    client = app.test_client()
+    url = f"/api/posts/{ids['post']}/vote"
+
+    assert vote(client, url, ids['voter'], 'upvote') == {'user_vote': 'upvote', 'upvotes': 1, 'downvotes': 0, 'score': 1}
+    assert vote(client, url, ids['voter'], 'downvote') == {'user_vote': 'downvote', 'upvotes': 0, 'downvotes': 1, 'score': -1}
+    assert vote(client, url, ids['voter'], 'downvote') == {'user_vote': None, 'upvotes': 0, 'downvotes': 0, 'score': 0}
+    assert vote(client, url, ids['voter'], 'remove')['score'] == 0
+    assert vote(client, url, ids['author'], 'upvote')['score'] == 1
+
+    with app.app_context():
+        assert Vote.query.count() == 1
+        assert db.session.get(User, ids['author']).post_karma == 1
+
+def test_a_vote_is_undone_only_once(voting):
+    """Two toggles that both saw the vote: only the DELETE that removed it reports a delta"""
+    app, ids = voting
+    with app.app_context():
+        Vote.record(ids['voter'], 'upvote', comment_id=ids['comment'])
+        assert Vote.record(ids['voter'], 'remove', comment_id=ids['comment']) == (None, {'upvotes': -1})
+        assert Vote.record(ids['voter'], 'remove', comment_id=ids['comment']) == (None, {})
+        assert Vote.record('nobody', 'upvote', comment_id=ids['comment']) is None
+        assert Vote.record('nobody', 'remove', comment_id=ids['comment']) is None
+
+def test_changed_vote_keeps_its_row(voting):
+    app, ids = voting
+    with app.app_context():
+        Vote.record(ids['voter'], 'upvote', post_id=ids['post'])
+        first = db.session.execute(db.select(Vote.id, Vote.created_at)).one()
+        assert Vote.record(ids['voter'], 'downvote', post_id=ids['post']) == ('downvote', {'upvotes': -1, 'downvotes': 1})
+        assert db.session.execute(db.select(Vote.id, Vote.created_at)).one() == first
+
+def test_vote_rankings_match_the_python_scores(voting):
+    app, ids = voting
+    client = app.test_client()
+    for name in ('a', 'b', 'c'):
+        voter = client.post('/api/users/sync', json={
+            'clerk_id': name, 'username': name, 'email': f'{name}@example.com', 'first_name': 'Test', 'last_name': 'User'
+        }).get_json()['user']['id']
+        vote(client, f"/api/posts/{ids['post']}/vote", voter, 'downvote' if name == 'c' else 'upvote')
+
+    with app.app_context():
+        post = db.session.get(Post, ids['post'])
+        assert (post.upvotes, post.downvotes) == (2, 1)
+        assert post.best_score == pytest.approx(best_score(2, 1))
+        assert post.quality_score == pytest.approx(quality_score(2, 0, 4))
+        expected = hot_score(2, 1, 0, 0, post.created_at)
+        assert post.hot_score == pytest.approx(expected, rel=1e-3)
+
+def test_a_vote_takes_a_constant_handful_of_statements(voting):
+    app, ids = voting
+    client = app.test_client()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'cache_tags' not in statement:  # Validator bumps run after the vote has committed
+            statements.append(statement.split()[0].upper())
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    vote(client, f"/api/posts/{ids['post']}/vote", ids['voter'], 'upvote')
+    # Vote row: DELETE ... RETURNING and INSERT; counters and rankings in one UPDATE; the author's karma
+    assert statements == ['DELETE', 'INSERT', 'UPDATE', 'UPDATE']
+
+    statements.clear()
+    vote(client, f"/api/comments/{ids['comment']}/vote", ids['voter'], 'upvote')
+    vote(client, f"/api/comments/{ids['comment']}/vote", ids['voter'], 'upvote')
+    assert statements == ['DELETE', 'INSERT', 'UPDATE', 'UPDATE', 'DELETE', 'UPDATE', 'UPDATE']
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from models import db, User, Post, Comment, Vote, PostCategory
+from ranking import best_score, quality_scores
+from write_behind import ViewCounter, WriteBehindBuffer, apply_view_deltas, apply_vote_deltas
+
+class Recorder:
+    """apply() stand-in that keeps every batch and can be told to fail"""
+
+    def __init__(self):
+        self.batches = []
+        self.failures = 0
+        self.applied = threading.Event()
+
+    def __call__(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('database unavailable')
+        self.batches.append({key: dict(deltas) for key, deltas in batch.items()})
+        self.applied.set()
+
+def test_deltas_are_summed_per_item():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, interval=60, max_pending=100)
+    buffer.add(('post', 'a'), {'upvotes': 1})
+    buffer.add(('post', 'a'), {'upvotes': 1, 'downvotes': 1})
+    buffer.add(('post', 'a'), {'upvotes': -1, 'downvotes': 0})
+    buffer.add(('comment', 'b'), {'downvotes': 1})
+
+    assert buffer.pending(('post', 'a')) == Counter(upvotes=1, downvotes=1)
+    assert buffer.flush() == 2
+    assert recorder.batches == [{('post', 'a'): {'upvotes': 1, 'downvotes': 1}, ('comment', 'b'): {'downvotes': 1}}]
+    assert buffer.pending(('post', 'a')) == Counter()
+
+def test_negative_deltas_are_kept():
+    buffer = WriteBehindBuffer(Recorder(), interval=60, max_pending=100)
+    buffer.add(('post', 'a'), {'upvotes': -1})
+    assert buffer.pending(('post', 'a')) == Counter(upvotes=-1)
+
+def test_background_flush_runs_every_interval():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, interval=0.1, max_pending=100)
+    buffer.add(('post', 'a'), {'upvotes': 1})
+
+    assert recorder.applied.wait(2)
+    assert recorder.batches == [{('post', 'a'): {'upvotes': 1}}]
+
+def test_max_pending_flushes_before_the_interval():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, interval=60, max_pending=3)
+    buffer.add(('post', 'a'), {'upvotes': 1})
+    buffer.add(('post', 'b'), {'upvotes': 1})
+    time.sleep(0.1)
+    assert recorder.batches == []
+
+    buffer.add(('post', 'c'), {'upvotes': 1})
+    assert recorder.applied.wait(2)
+    assert set(recorder.batches[0]) == {('post', 'a'), ('post', 'b'), ('post', 'c')}
+
+def test_failed_flush_is_retried_with_later_deltas():
+    recorder = Recorder()
+    recorder.failures = 1
+    buffer = WriteBehindBuffer(recorder, interval=60, max_pending=100)
+    buffer.add(('post', 'a'), {'upvotes': 2})
+
+    assert buffer.flush() == 0
+    assert buffer.pending(('post', 'a')) == Counter(upvotes=2)
+
+    buffer.add(('post', 'a'), {'upvotes': 1})
+    assert buffer.flush() == 1
+    assert recorder.batches == [{('post', 'a'): {'upvotes': 3}}]
+
+@pytest.fixture
+def voted_post(app):
+    with app.app_context():
+        author = User(clerk_id='author', username='author', email='author@example.com', first_name='Test', last_name='User')
+        db.session.add(author)
+        db.session.flush()
+        post = Post(title='Voted post', content='Counters', category=PostCategory.CAREER, user_id=author.id)
+        db.session.add(post)
+        db.session.flush()
+        comment = Comment(content='Voted comment', post_id=post.id, user_id=author.id)
+        db.session.add(comment)
+        db.session.commit()
+        return author.id, post.id, comment.id
+
+def test_vote_deltas_update_counters_and_karma(app, voted_post):
+    author_id, post_id, comment_id = voted_post
+    with app.app_context():
+        updated = apply_vote_deltas({
+            ('post', post_id): Counter(upvotes=3, downvotes=1),
+            ('comment', comment_id): Counter(downvotes=2),
+            ('post', 'deleted'): Counter(upvotes=1)
+        })
+        assert sorted(kind for kind, _ in updated) == ['comment', 'post']
+
+        post, comment, author = db.session.get(Post, post_id), db.session.get(Comment, comment_id), db.session.get(User, author_id)
+        assert (post.upvotes, post.downvotes) == (3, 1)
+        assert (comment.upvotes, comment.downvotes) == (0, 2)
+        assert (author.post_karma, author.comment_karma) == (2, -2)
+
+def test_views_are_counted_once_per_viewer_within_the_window():
+    buffer = WriteBehindBuffer(Recorder(), interval=60, max_pending=100)
+    views = ViewCounter(buffer, window=0.2, max_viewers=100)
+
+    assert views.record('a', 'viewer-1')
+    assert not views.record('a', 'viewer-1')
+    assert views.record('a', 'viewer-2')
+    assert views.record('b', 'viewer-1')
+    assert buffer.pending('a') == Counter(views_count=2)
+
+    time.sleep(0.25)
+    assert views.record('a', 'viewer-1')
+    assert buffer.pending('a') == Counter(views_count=3)
+
+def test_view_deltas_add_views_and_rescore(app, voted_post):
+    _, post_id, _ = voted_post
+    with app.app_context():
+        post = db.session.get(Post, post_id)
+        post.upvotes, post.comments_count = 4, 2
+        db.session.commit()
+        updated_at = post.updated_at
+
+        apply_view_deltas({post_id: Counter(views_count=5), 'deleted': Counter(views_count=1)})
+        db.session.expire_all()
+        post = db.session.get(Post, post_id)
+        assert post.views_count == 5
+        assert post.quality_score == pytest.approx(quality_scores(np.array([4.0]), np.array([2.0]), np.array([5.0]))[0])
+        assert post.updated_at == updated_at  # A view is not an edit
+
+def test_reconcile_votes_recounts_lost_deltas(app, voted_post, capsys):
+    from maintenance import reconcile_vote_counts
+    author_id, post_id, comment_id = voted_post
+    with app.app_context():
+        voter = User(clerk_id='voter', username='voter', email='voter@example.com', first_name='Test', last_name='User')
+        db.session.add(voter)
+        db.session.flush()
+        # Stored votes whose buffered deltas died with the worker, and a comment count that drifted too far
+        Vote.record(voter.id, 'upvote', post_id=post_id)
+        Vote.record(voter.id, 'downvote', comment_id=comment_id)
+        db.session.get(Comment, comment_id).upvotes = 3
+        db.session.commit()
+        updated_at = db.session.get(Post, post_id).updated_at
+
+        reconcile_vote_counts()
+        db.session.expire_all()
+        post, comment, author = db.session.get(Post, post_id), db.session.get(Comment, comment_id), db.session.get(User, author_id)
+        assert (post.upvotes, post.downvotes, post.score) == (1, 0, 1)
+        assert (comment.upvotes, comment.downvotes, comment.score) == (0, 1, -1)
+        assert post.best_score == pytest.approx(best_score(1, 0))
+        assert post.updated_at == updated_at
+        assert (author.post_karma, author.comment_karma) == (1, -1)
+    assert 'Recounted votes for 1 posts and 1 comments' in capsys.readouterr().out
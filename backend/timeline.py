@@ -0,0 +1,137 @@
+"""
+Home timelines for Astitva
+
+Every user has a bounded list of timeline_entries (post, author, category and
+the post's created_at). A new post is fanned out on write: one INSERT ... SELECT
+copies it into the timeline of each follower and of the author. Authors with
+more than FEED_FANOUT_MAX_FOLLOWERS followers are skipped on write, and their
+posts are merged in when a follower reads the feed instead.
+
+Following someone backfills their recent posts, unfollowing prunes them, and
+`python maintenance.py prune-timelines` trims every timeline to
+FEED_TIMELINE_MAX_ENTRIES entries.
+"""
+
+from models import db, Post, PostCategory, TimelineEntry, User, user_followers
+
+ENTRY_COLUMNS = ['user_id', 'post_id', 'author_id', 'category', 'created_at']
+
+def fan_out_post(post, max_followers):
+    """Copy a new post into its author's timeline and, unless the author is widely followed, every follower's"""
+    db.session.flush()  # Assigns post.id and post.created_at
+    db.session.add(TimelineEntry(
+        user_id=post.user_id,
+        post_id=post.id,
+        author_id=post.user_id,
+        category=post.category,
+        created_at=post.created_at
+    ))
+
+    followers_count = db.session.query(User.followers_count).filter_by(id=post.user_id).scalar()
+    if (followers_count or 0) > max_followers:
+        return
+
+    db.session.execute(db.insert(TimelineEntry).from_select(
+        ENTRY_COLUMNS,
+        db.select(
+            user_followers.c.follower_id,
+            db.literal(post.id),
+            db.literal(post.user_id),
+            db.literal(post.category, TimelineEntry.category.type),
+            db.literal(post.created_at, TimelineEntry.created_at.type)
+        ).where(user_followers.c.followed_id == post.user_id)
+    ))
+
+def backfill(follower_id, author_id, max_followers, limit):
+    """Copy an author's most recent posts into a new follower's timeline"""
+    followers_count = db.session.query(User.followers_count).filter_by(id=author_id).scalar()
+    if (followers_count or 0) > max_followers:
+        return  # Merged at read time
+
+    db.session.execute(db.insert(TimelineEntry).from_select(
+        ENTRY_COLUMNS,
+        db.select(
+            db.literal(follower_id), Post.id, Post.user_id, Post.category, Post.created_at
+        ).where(Post.user_id == author_id).order_by(Post.created_at.desc()).limit(limit)
+    ))
+
+def prune(follower_id, author_id):
+    """Remove an author's posts from a former follower's timeline"""
+    db.session.execute(db.delete(TimelineEntry).where(
+        TimelineEntry.user_id == follower_id,
+        TimelineEntry.author_id == author_id
+    ))
+
+def widely_followed(user_id, max_followers):
+    """Ids of the accounts user_id follows whose posts are not fanned out on write"""
+    return db.session.execute(
+        db.select(User.id).join(user_followers, user_followers.c.followed_id == User.id).where(
+            user_followers.c.follower_id == user_id,
+            User.followers_count > max_followers
+        )
+    ).scalars().all()
+
+def feed_query(user, max_followers):
+    """Post query for a user's home feed, with its keyset ordering.
+
+    Returns (query, order). Without widely followed accounts the feed is a
+    single range scan over the user's timeline entries, already filtered by
+    preferred_categories; otherwise their posts are merged in.
+    """
+    categories = [PostCategory(category) for category in user.preferred_categories or []]
+    merged = widely_followed(user.id, max_followers)
+
+    if not merged:
+        query = Post.query.join(TimelineEntry, TimelineEntry.post_id == Post.id).filter(
+            TimelineEntry.user_id == user.id,
+            Post.is_hidden == False
+        )
+        if categories:
+            query = query.filter(TimelineEntry.category.in_(categories))
+        return query, [(TimelineEntry.created_at, True), (TimelineEntry.post_id, True)]
+
+    entries = db.select(TimelineEntry.post_id).where(
+        TimelineEntry.user_id == user.id,
+        TimelineEntry.author_id.notin_(merged)
+    )
+    read_time = db.select(Post.id).where(Post.user_id.in_(merged))
+    if categories:
+        entries = entries.where(TimelineEntry.category.in_(categories))
+        read_time = read_time.where(Post.category.in_(categories))
+    sources = db.union_all(entries, read_time).subquery()
+
+    query = Post.query.join(sources, sources.c.post_id == Post.id).filter(Post.is_hidden == False)
+    return query, [(Post.created_at, True), (Post.id, True)]
+
+def trim_timelines(max_entries):
+    """Keep only the newest max_entries entries of every timeline"""
+    ranked = db.select(
+        TimelineEntry.user_id,
+        TimelineEntry.post_id,
+        db.func.row_number().over(
+            partition_by=TimelineEntry.user_id,
+            order_by=(TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc())
+        ).label('position')
+    ).subquery()
+    result = db.session.execute(db.delete(TimelineEntry).where(
+        db.tuple_(TimelineEntry.user_id, TimelineEntry.post_id).in_(
+            db.select(ranked.c.user_id, ranked.c.post_id).where(ranked.c.position > max_entries)
+        )
+    ))
+    return result.rowcount
+
+def rebuild_timelines(max_followers, max_entries):
+    """Recreate every timeline from follows and posts"""
+    db.session.execute(db.delete(TimelineEntry))
+    db.session.execute(db.insert(TimelineEntry).from_select(
+        ENTRY_COLUMNS,
+        db.select(Post.user_id, Post.id, Post.user_id, Post.category, Post.created_at)
+    ))
+    db.session.execute(db.insert(TimelineEntry).from_select(
+        ENTRY_COLUMNS,
+        db.select(user_followers.c.follower_id, Post.id, Post.user_id, Post.category, Post.created_at)
+        .join(Post, Post.user_id == user_followers.c.followed_id)
+        .join(User, User.id == user_followers.c.followed_id)
+        .where(db.func.coalesce(User.followers_count, 0) <= max_followers)
+    ))
+    trim_timelines(max_entries)
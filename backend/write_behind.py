@@ -0,0 +1,177 @@
+"""
+Write-behind counters for Astitva
+
+With VOTE_INGESTION='buffered', a vote still writes its Vote row (which keeps
+one vote per user) but the post or comment counters, score and author karma
+are not touched in the request. The upvote/downvote deltas are summed in a
+WriteBehindBuffer and written every VOTE_FLUSH_INTERVAL seconds, or as soon as
+VOTE_FLUSH_MAX_PENDING posts and comments are waiting. A flush is one
+UPDATE ... RETURNING per voted item plus one karma update per author, however
+many votes arrived, so hot rows are no longer locked once per vote.
+
+Responses add the pending deltas to the stored counts. Each worker process
+buffers and flushes its own deltas, so counts seen through another worker lag
+by at most one flush interval.
+
+Post views always go through a buffer: ViewCounter counts each viewer once per
+VIEW_DEDUPE_WINDOW in memory, and every VIEW_FLUSH_INTERVAL seconds the summed
+views are added with one UPDATE per batch of posts, after which quality_score
+is recomputed for those posts in one vectorized pass.
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter
+
+import numpy as np
+
+from cache import LRUCache
+from models import db, Comment, Post, User
+from ranking import quality_scores
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindBuffer:
+    """Sums counter deltas per key in memory and hands them to apply() in batches.
+
+    apply(batch) gets {key: Counter(column=delta)} and must write it in a single
+    transaction. It runs on a background thread every `interval` seconds, or
+    sooner once `max_pending` keys are waiting. If it raises, the batch is merged
+    back into the buffer and retried with the next flush.
+    """
+
+    def __init__(self, apply, interval, max_pending):
+        self.apply = apply
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, key, deltas):
+        deltas = {column: delta for column, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        with self._lock:
+            self._pending.setdefault(key, Counter()).update(deltas)
+            full = len(self._pending) >= self.max_pending
+            if self._thread is None:
+                self._start()
+        if full:
+            self._wake.set()
+
+    def pending(self, key):
+        """Deltas for key not yet committed, including a batch being flushed right now"""
+        totals = Counter()
+        with self._lock:
+            # update() rather than +, which would drop negative deltas
+            totals.update(self._pending.get(key, {}))
+            totals.update(self._in_flight.get(key, {}))
+        return totals
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of keys written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+            if not batch:
+                return 0
+            try:
+                self.apply(batch)
+            except Exception:
+                logger.exception("Write-behind flush of %d keys failed; retrying later", len(batch))
+                with self._lock:
+                    for key, deltas in batch.items():
+                        self._pending.setdefault(key, Counter()).update(deltas)
+                    self._in_flight = {}
+                return 0
+            with self._lock:
+                self._in_flight = {}
+            return len(batch)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+def apply_vote_deltas(batch):
+    """Write summed vote deltas keyed by ('post' | 'comment', id), with the authors' karma, and commit.
+
+    Returns [(kind, updated counters)] for the posts and comments that still exist.
+    """
+    karma = {}
+    updated = []
+    try:
+        for (kind, target_id), deltas in batch.items():
+            model = Post if kind == 'post' else Comment
+            counters = model.adjust_counters(target_id, **deltas)
+            if counters is None:
+                continue  # Deleted since the vote
+            updated.append((kind, counters))
+            author = karma.setdefault(counters.user_id, Counter())
+            author[f'{kind}_delta'] += deltas.get('upvotes', 0) - deltas.get('downvotes', 0)
+        for user_id, deltas in karma.items():
+            User.apply_karma_delta(user_id, **deltas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return updated
+
+class ViewCounter:
+    """Counts post views into a WriteBehindBuffer, once per viewer and post within `window` seconds"""
+
+    def __init__(self, buffer, window, max_viewers):
+        self.buffer = buffer
+        self.seen = LRUCache(max_entries=max_viewers, default_ttl=window)
+
+    def record(self, post_id, viewer):
+        """Count a view unless this viewer was already counted recently; returns whether it counted"""
+        if not self.seen.add((post_id, viewer), True):
+            return False
+        self.buffer.add(post_id, {'views_count': 1})
+        return True
+
+def apply_view_deltas(batch, chunk_size=500):
+    """Add summed views keyed by post id and recompute the touched posts' quality_score, then commit"""
+    post_ids = list(batch)
+    try:
+        for start in range(0, len(post_ids), chunk_size):
+            chunk = {post_id: batch[post_id]['views_count'] for post_id in post_ids[start:start + chunk_size]}
+
+            # One statement for the whole chunk; updated_at is passed through so a view is not an edit
+            rows = db.session.execute(
+                db.update(Post).where(Post.id.in_(chunk)).values(
+                    views_count=db.func.coalesce(Post.views_count, 0) + db.case(chunk, value=Post.id, else_=0),
+                    updated_at=Post.updated_at
+                ).returning(Post.id, Post.upvotes, Post.comments_count, Post.views_count, Post.updated_at)
+                .execution_options(synchronize_session=False)
+            ).all()
+            if not rows:
+                continue  # Deleted posts
+
+            ids, upvotes, comments, views, updated = zip(*rows)
+
+            def counts(values):
+                return np.array([value or 0 for value in values], dtype=float)
+
+            quality = quality_scores(counts(upvotes), counts(comments), counts(views))
+            db.session.execute(db.update(Post), [
+                {'id': ids[i], 'quality_score': float(quality[i]), 'updated_at': updated[i]}
+                for i in range(len(ids))
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
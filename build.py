@@ -3,10 +3,19 @@
 Build script for Astitva - Merges frontend and backend
 """
 import os
+import gzip
 import subprocess
 import sys
 import shutil
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.html', '.svg', '.json', '.txt', '.xml', '.map', '.ico', '.webmanifest')
+MIN_COMPRESS_SIZE = 1024
+
 def run_command(command, cwd=None):
     """Run a command and return success status"""
     try:
@@ -19,6 +28,29 @@ def run_command(command, cwd=None):
         print(f"Error: {e.stderr}")
         return False
 
+def compress_dist(dist='dist'):
+    """Write .gz (and .br, if brotli is installed) next to each compressible file in dist"""
+    written = 0
+    for directory, _, filenames in os.walk(dist):
+        for filename in filenames:
+            if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(directory, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+
+            variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['.br'] = brotli.compress(data, quality=11)
+            for suffix, compressed in variants.items():
+                if len(compressed) < len(data):  # Otherwise the server just sends the original
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    written += 1
+    return written
+
 def main():
     print("🚀 Building Astitva Application")
     print("=" * 50)
@@ -51,6 +83,11 @@ def main():
         print("❌ Frontend build failed - dist directory not found")
         sys.exit(1)
     
+    # Step 5: Precompress static assets
+    print("🗜️  Precompressing static assets...")
+    written = compress_dist()
+    print(f"✅ Wrote {written} compressed files{'' if brotli else ' (gzip only; pip install brotli for .br)'}")
+    
     print("\n" + "=" * 50)
     print("🎉 Build completed successfully!")
     print("📁 Frontend built in: ./dist")
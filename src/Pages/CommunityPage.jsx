@@ -329,6 +329,7 @@ const CommunityPage = () => {
     
     if (!isShowing) {
       loadComments(postId);
+      apiService.recordView(postId, backendUser?.id).catch(() => {});
     }
   };
 
@@ -124,6 +124,11 @@ class ApiService {
     });
   }
 
+  // Views are counted once per viewer in a time window; failures are ignored
+  async recordView(postId, userId) {
+    return this.post(`/posts/${postId}/view`, userId ? { user_id: userId } : {});
+  }
+
   async getComments(postId) {
     return this.request(`/posts/${postId}/comments`);
   }